@@ -4,6 +4,10 @@ public class Constants {
 
     public static final String TYPE = "type";
 
+    // Appended to a name prefix to get an upper bound for the names that
+    // start with it, so that a prefix match can be run as a range query
+    public static final String NAME_PREFIX_END = "\ufffd";
+
     public class Project {
         public static final String PROJECT_ID = "project_id";
         public static final String NAME = "name";
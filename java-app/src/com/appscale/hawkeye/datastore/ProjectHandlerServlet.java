@@ -64,6 +64,17 @@ public class ProjectHandlerServlet extends HttpServlet {
 
         DatastoreService datastore = DatastoreServiceFactory.getDatastoreService();
         Query q = new Query(Constants.Project.class.getSimpleName());
+        String namePrefix = req.getParameter("name_prefix");
+        if (namePrefix != null && !"".equals(namePrefix)) {
+            List<Query.Filter> filters = new ArrayList<Query.Filter>();
+            filters.add(new Query.FilterPredicate(Constants.Project.NAME,
+                    Query.FilterOperator.GREATER_THAN_OR_EQUAL, namePrefix));
+            filters.add(new Query.FilterPredicate(Constants.Project.NAME,
+                    Query.FilterOperator.LESS_THAN,
+                    namePrefix + Constants.NAME_PREFIX_END));
+            q.setFilter(new Query.CompositeFilter(
+                    Query.CompositeFilterOperator.AND, filters));
+        }
         PreparedQuery preparedQuery = datastore.prepare(q);
         for (Entity result : preparedQuery.asIterable()) {
             datastore.delete(result.getKey());
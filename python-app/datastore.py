@@ -4,10 +4,23 @@ except ImportError:
   import simplejson as json
 
 from google.appengine.ext import webapp, db
+import threading
+import time
+import utils
 import uuid
 import webapp2
 import wsgiref
 
+# Maximum number of entities the datastore accepts in a single put
+MAX_BATCH_SIZE = 500
+
+# Number of seconds a bulk delete may run before it hands a cursor back
+# to the client, well within the request deadline
+DELETE_TIME_BUDGET = 20
+
+# Maximum number of distinct GQL queries cached by each thread
+MAX_CACHED_QUERIES = 100
+
 class Project(db.Model):
   project_id = db.StringProperty(required=True)
   name = db.StringProperty(required=True)
@@ -37,24 +50,232 @@ def serialize(entity):
     dict['type'] = 'unknown'
   return dict
 
+class GqlQueryCache:
+  """
+  Caches db.GqlQuery objects by their GQL string, so that each query
+  shape is parsed once rather than on every request. The values are
+  bound to the cached query (GqlQuery.bind) on each use, which also
+  takes care of quoting them. A bound query can only serve one request
+  at a time, so every thread keeps a cache of its own. The hit and
+  parse time statistics are shared by all the threads of the instance.
+  """
+
+  def __init__(self, max_size=MAX_CACHED_QUERIES):
+    self.max_size = max_size
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.reset()
+
+  def get(self, gql, *args):
+    """
+    Look up the query for the given GQL string, parsing and caching it
+    if this thread has not seen it before, and bind it to the given
+    positional parameter values (:1, :2, ...).
+
+    Returns:
+      A db.GqlQuery instance
+    """
+    queries = getattr(self.local, 'queries', None)
+    if queries is None:
+      queries = self.local.queries = {}
+    query = queries.get(gql)
+    if query is not None:
+      query.bind(*args)
+      # Clear the cursor a paged listing may have left behind
+      query.with_cursor(None)
+      self.__update(hits=1)
+      return query
+
+    start = time.time()
+    query = db.GqlQuery(gql, *args)
+    elapsed = time.time() - start
+    if len(queries) < self.max_size:
+      queries[gql] = query
+    self.__update(misses=1, parse_time=elapsed)
+    return query
+
+  def get_stats(self):
+    """
+    Returns:
+      A dictionary containing the number of cache hits and misses, the
+      hit rate, the time spent parsing GQL on misses and the estimated
+      parse time saved by the hits (in seconds)
+    """
+    self.lock.acquire()
+    try:
+      lookups = self.hits + self.misses
+      hit_rate = 0.0
+      if lookups > 0:
+        hit_rate = float(self.hits) / lookups
+      saved = 0.0
+      if self.misses > 0:
+        saved = self.hits * self.parse_time / self.misses
+      return {
+        'hits' : self.hits,
+        'misses' : self.misses,
+        'hit_rate' : hit_rate,
+        'parse_time' : self.parse_time,
+        'saved_parse_time' : saved,
+      }
+    finally:
+      self.lock.release()
+
+  def reset(self):
+    self.lock.acquire()
+    try:
+      self.hits = 0
+      self.misses = 0
+      self.parse_time = 0.0
+    finally:
+      self.lock.release()
+
+  def __update(self, hits=0, misses=0, parse_time=0.0):
+    self.lock.acquire()
+    try:
+      self.hits += hits
+      self.misses += misses
+      self.parse_time += parse_time
+    finally:
+      self.lock.release()
+
+QUERY_CACHE = GqlQueryCache()
+
+def delete_all(handler, model):
+  """
+  Delete all the entities of a model in response to a DELETE request.
+  Only keys are fetched, in pages of batch_size keys (a request parameter
+  defaulting to MAX_BATCH_SIZE), and each page is deleted asynchronously
+  while the next one is fetched. If the deletion runs out of its time
+  budget, the response carries a cursor that the client passes back in
+  the cursor parameter to resume. If the name_prefix parameter is set,
+  only the entities whose name starts with it are deleted.
+
+  Args:
+    handler A webapp2.RequestHandler serving a DELETE request
+    model   A db.Model subclass
+  """
+  batch_size = utils.get_batch_size(handler.request, MAX_BATCH_SIZE,
+    MAX_BATCH_SIZE)
+  cursor = handler.request.get('cursor')
+  name_prefix = handler.request.get('name_prefix')
+
+  start = time.time()
+  deleted = 0
+  rpc = None
+  query = model.all(keys_only=True)
+  if name_prefix:
+    query.filter('name >=', name_prefix)
+    query.filter('name <', name_prefix + utils.NAME_PREFIX_END)
+  while True:
+    if cursor:
+      query.with_cursor(cursor)
+    keys = query.fetch(batch_size)
+    if rpc is not None:
+      rpc.get_result()
+      rpc = None
+    if len(keys) == 0:
+      cursor = None
+      break
+    rpc = db.delete_async(keys)
+    deleted += len(keys)
+    cursor = query.cursor()
+    if len(keys) < batch_size:
+      cursor = None
+      break
+    if time.time() - start > DELETE_TIME_BUDGET:
+      break
+  if rpc is not None:
+    rpc.get_result()
+
+  handler.response.headers['Content-Type'] = "application/json"
+  handler.response.out.write(json.dumps(
+    { 'success' : True, 'deleted' : deleted, 'cursor' : cursor }))
+
+def write_results(handler, query):
+  """
+  Write the results of a query in response to a list request. If the
+  page_size request parameter is set, only the page that starts at the
+  cursor request parameter is written (see utils.write_json_page). The
+  next cursor is omitted once a page comes back short, so a client may
+  fetch one empty page at the end. Otherwise all the results are
+  streamed as a JSON array.
+
+  Args:
+    handler A webapp2.RequestHandler serving a GET request
+    query   A db.Query or db.GqlQuery instance
+  """
+  page_size = utils.get_page_size(handler.request)
+  if page_size is None:
+    utils.write_json_list(handler.response,
+      query.run(batch_size=utils.get_batch_size(handler.request)), serialize)
+    return
+
+  cursor = handler.request.get('cursor')
+  if cursor:
+    query.with_cursor(cursor)
+  entities = query.fetch(page_size)
+  next = None
+  if len(entities) == page_size:
+    next = query.cursor()
+  utils.write_json_page(handler.response, entities, next, serialize)
+
+def scan_with_cursors(model, page_size):
+  """
+  Scan all the entities of a model page by page, encoding the end cursor
+  of each page into its web safe form and decoding it to start the next
+  page, as it happens when a client pages through a listing. The db API
+  encodes in Query.cursor and decodes in Query.with_cursor, so those
+  calls are what the cursor times measure.
+
+  Args:
+    model     A db.Model subclass
+    page_size Number of entities fetched per page
+
+  Returns:
+    A scan summary (see utils.summarize_scan)
+  """
+  latencies = []
+  encode_times = []
+  decode_times = []
+  entities = 0
+  complete = True
+  cursor = None
+  start = time.time()
+  while True:
+    query = model.all()
+    if cursor is not None:
+      decode_start = time.time()
+      query.with_cursor(cursor)
+      decode_times.append(time.time() - decode_start)
+    page_start = time.time()
+    results = query.fetch(page_size)
+    latencies.append(time.time() - page_start)
+    entities += len(results)
+    if len(results) < page_size:
+      break
+    if time.time() - start > utils.SCAN_TIME_BUDGET:
+      complete = False
+      break
+    encode_start = time.time()
+    cursor = query.cursor()
+    encode_times.append(time.time() - encode_start)
+  return utils.summarize_scan(page_size, entities, time.time() - start,
+    latencies, encode_times, decode_times, complete)
+
 class ProjectHandler(webapp2.RequestHandler):
     def get(self):
       id = self.request.get('id')
       name = self.request.get('name')
       if id is None or id.strip() == '':
         if name is not None and len(name) > 0:
-          query = db.GqlQuery("SELECT * FROM Project WHERE name = '%s'" % name)
+          query = QUERY_CACHE.get("SELECT * FROM Project WHERE name = :1",
+                                  name)
         else:
-          query = db.GqlQuery("SELECT * FROM Project")
+          query = QUERY_CACHE.get("SELECT * FROM Project")
       else:
-        query = db.GqlQuery("SELECT * FROM Project WHERE "
-                            "project_id = '%s'" % str(id))
-
-      data = []
-      for result in query:
-        data.append(result)
-      self.response.headers['Content-Type'] = "application/json"
-      self.response.out.write(json.dumps(data, default=serialize))
+        query = QUERY_CACHE.get("SELECT * FROM Project WHERE "
+                                "project_id = :1", str(id))
+      write_results(self, query)
 
     def post(self):
       project_id = str(uuid.uuid1())
@@ -72,27 +293,22 @@ class ProjectHandler(webapp2.RequestHandler):
         json.dumps({ 'success' : True, 'project_id' : project_id }))
 
     def delete(self):
-      db.delete(Project.all())
+      delete_all(self, Project)
 
 class ModuleHandler(webapp2.RequestHandler):
   def get(self):
     id = self.request.get('id')
     if id is None or id.strip() == '':
-      query = db.GqlQuery("SELECT * FROM Module")
+      query = QUERY_CACHE.get("SELECT * FROM Module")
     else:
-      query = db.GqlQuery("SELECT * FROM Module WHERE "
-                          "module_id = '%s'" % str(id))
-
-    data = []
-    for result in query:
-      data.append(result)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      query = QUERY_CACHE.get("SELECT * FROM Module WHERE "
+                              "module_id = :1", str(id))
+    write_results(self, query)
 
   def post(self):
     project_id = self.request.get('project_id')
-    query = db.GqlQuery("SELECT * FROM Project WHERE "
-                        "project_id = '%s'" % str(project_id))
+    query = QUERY_CACHE.get("SELECT * FROM Project WHERE "
+                            "project_id = :1", str(project_id))
     module_id = str(uuid.uuid1())
     module_name = self.request.get('name')
     module = Module(module_id=module_id,
@@ -107,27 +323,84 @@ class ModuleHandler(webapp2.RequestHandler):
       json.dumps({ 'success' : True, 'module_id' : module_id }))
 
   def delete(self):
-    db.delete(Module.all())
+    delete_all(self, Module)
+
+class BatchHandler(webapp2.RequestHandler):
+  """
+  Creates the projects and modules listed in a JSON array with batched
+  db.put calls of up to batch_size entities (one datastore RPC each).
+  Modules name their parent with either project_name (the key name of
+  a project in the same batch or in the datastore) or project_id.
+  Responds with the generated ids in request order.
+  """
+
+  def post(self):
+    batch_size = utils.get_batch_size(self.request, MAX_BATCH_SIZE,
+      MAX_BATCH_SIZE)
+
+    projects = []
+    modules = []
+    parents = {}
+    ids = []
+    for item in json.loads(self.request.body):
+      type = item.get('type', 'project')
+      if type == 'project':
+        project_id = str(uuid.uuid1())
+        projects.append(Project(project_id=project_id,
+          name=item['name'],
+          rating=int(item['rating']),
+          description=item['description'],
+          license=item['license'],
+          key_name=item['name']))
+        ids.append(project_id)
+      elif type == 'module':
+        if item.get('project_name'):
+          parent = db.Key.from_path('Project', item['project_name'])
+        else:
+          project_id = str(item['project_id'])
+          if not parents.has_key(project_id):
+            query = QUERY_CACHE.get("SELECT __key__ FROM Project WHERE "
+                                    "project_id = :1", project_id)
+            parents[project_id] = query[0]
+          parent = parents[project_id]
+        module_id = str(uuid.uuid1())
+        modules.append(Module(module_id=module_id,
+          name=item['name'],
+          description=item['description'],
+          parent=parent,
+          key_name=item['name']))
+        ids.append(module_id)
+      else:
+        raise Exception('Unsupported entity type: %s' % type)
+
+    # Projects go first, so that the modules never refer to a parent
+    # that does not exist yet
+    entities = projects + modules
+    puts = 0
+    for start in range(0, len(entities), batch_size):
+      db.put(entities[start:start + batch_size])
+      puts += 1
+    self.response.headers['Content-Type'] = "application/json"
+    self.response.set_status(201)
+    self.response.out.write(
+      json.dumps({ 'success' : True, 'ids' : ids, 'puts' : puts }))
 
 class ProjectModuleHandler(webapp2.RequestHandler):
   def get(self):
     project_id = self.request.get('project_id')
-    project_query = db.GqlQuery("SELECT * FROM Project WHERE "
-                                "project_id = '%s'" % project_id)
+    project_query = QUERY_CACHE.get("SELECT * FROM Project WHERE "
+                                    "project_id = :1", project_id)
     q = db.Query()
     q.ancestor(project_query[0])
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    utils.write_json_list(self.response,
+      q.run(batch_size=utils.get_batch_size(self.request)), serialize)
 
 class ProjectKeyHandler(webapp2.RequestHandler):
   def get(self):
     project_id = self.request.get('project_id')
     ancestor = self.request.get('ancestor')
-    project_query = db.GqlQuery("SELECT * FROM Project WHERE "
-                                "project_id = '%s'" % project_id)
+    project_query = QUERY_CACHE.get("SELECT * FROM Project WHERE "
+                                    "project_id = :1", project_id)
     q = db.Query()
     if ancestor is not None and ancestor == 'true':
       q.ancestor(project_query[0])
@@ -138,12 +411,10 @@ class ProjectKeyHandler(webapp2.RequestHandler):
     else:
       raise Exception('Unsupported comparator')
 
-    data = []
-    for entity in q:
-      if isinstance(entity, Project) or isinstance(entity, Module):
-        data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    entities = q.run(batch_size=utils.get_batch_size(self.request))
+    utils.write_json_list(self.response, (entity for entity in entities
+      if isinstance(entity, Project) or isinstance(entity, Module)),
+      serialize)
 
 class EntityNameHandler(webapp2.RequestHandler):
   def get(self):
@@ -151,8 +422,8 @@ class EntityNameHandler(webapp2.RequestHandler):
     module_name = self.request.get('module_name')
     if project_name is not None and len(project_name) > 0:
       if module_name is not None and len(module_name) > 0:
-        project_query = db.GqlQuery("SELECT * FROM Project WHERE "
-                                    "name = '%s'" % project_name)
+        project_query = QUERY_CACHE.get("SELECT * FROM Project WHERE "
+                                        "name = :1", project_name)
         entity = Module.get_by_key_name(module_name, parent=project_query[0])
       else:
         entity = Project.get_by_key_name(project_name, parent=None)
@@ -186,14 +457,12 @@ class ProjectRatingHandler(webapp2.RequestHandler):
     if desc is not None and desc == 'true':
       q.order('-rating')
 
+    batch_size = utils.get_batch_size(self.request)
     if limit is not None and len(limit) > 0:
-      q = q.fetch(int(limit))
-
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      entities = q.run(limit=int(limit), batch_size=batch_size)
+    else:
+      entities = q.run(batch_size=batch_size)
+    utils.write_json_list(self.response, entities, serialize)
 
 class ProjectFieldHandler(webapp2.RequestHandler):
   def get(self):
@@ -201,18 +470,15 @@ class ProjectFieldHandler(webapp2.RequestHandler):
     gql = self.request.get('gql')
     rate_limit = self.request.get('rate_limit')
     if gql is not None and gql == 'true':
-      q = db.GqlQuery("SELECT %s FROM Project" % fields)
+      q = QUERY_CACHE.get("SELECT %s FROM Project" % fields)
     else:
       field_tuple = tuple(fields.split(','))
       q = db.Query(Project, projection=field_tuple)
       if rate_limit is not None and len(rate_limit) > 0 and 'rating' in field_tuple:
         q.filter('rating >= ', int(rate_limit))
 
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    utils.write_json_list(self.response,
+      q.run(batch_size=utils.get_batch_size(self.request)), serialize)
 
 class ProjectBrowserHandler(webapp2.RequestHandler):
   def get(self):
@@ -235,13 +501,31 @@ class ProjectFilterHandler(webapp2.RequestHandler):
   def get(self):
     license = self.request.get('license')
     rate_limit = self.request.get('rate_limit')
-    q = db.GqlQuery("SELECT * FROM Project WHERE license = '%s' " \
-                    "AND rating >= %s" % (license, rate_limit))
+    q = QUERY_CACHE.get("SELECT * FROM Project WHERE license = :1 "
+                        "AND rating >= :2", license, int(rate_limit))
+    utils.write_json_list(self.response,
+      q.run(batch_size=utils.get_batch_size(self.request)), serialize)
+
+class CursorScanHandler(webapp2.RequestHandler):
+  def get(self):
+    kind = self.request.get('kind')
+    if kind is None or kind == '':
+      kind = 'Project'
+    if not SCAN_MODELS.has_key(kind):
+      raise Exception('Unsupported kind: %s' % kind)
     data = []
-    for entity in q:
-      data.append(entity)
+    for page_size in utils.get_scan_page_sizes(self.request):
+      data.append(scan_with_cursors(SCAN_MODELS[kind], page_size))
+    self.response.headers['Content-Type'] = "application/json"
+    self.response.out.write(json.dumps(data))
+
+class QueryStatsHandler(webapp2.RequestHandler):
+  def get(self):
     self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    self.response.out.write(json.dumps(QUERY_CACHE.get_stats()))
+
+  def delete(self):
+    QUERY_CACHE.reset()
 
 class TransactionHandler(webapp2.RequestHandler):
   def increment_counter(self, key, amount):
@@ -307,7 +591,7 @@ class TransactionHandler(webapp2.RequestHandler):
     self.response.out.write(json.dumps(status))
 
   def delete(self):
-    db.delete(Counter.all())
+    delete_all(self, Counter)
 
 """
   This test will create Company, Employee and PhoneNumber
@@ -373,9 +657,9 @@ class ComplexCursorHandler(webapp2.RequestHandler):
     pn4.put()
     
   def clean_up_data(self):
-    db.delete(Company.all())
-    db.delete(Employee.all())
-    db.delete(PhoneNumber.all())
+    db.delete(Company.all(keys_only=True))
+    db.delete(Employee.all(keys_only=True))
+    db.delete(PhoneNumber.all(keys_only=True))
 
 class Employee(db.Model):
   name = db.StringProperty(required=True)
@@ -386,9 +670,16 @@ class Company(db.Model):
 class PhoneNumber(db.Model):
   work = db.StringProperty(required=True)
 
+# Kinds the cursor scan benchmark can scan
+SCAN_MODELS = {
+  'Project' : Project,
+  'Module' : Module,
+}
+
 application = webapp.WSGIApplication([
   ('/python/datastore/project', ProjectHandler),
   ('/python/datastore/module', ModuleHandler),
+  ('/python/datastore/batch', BatchHandler),
   ('/python/datastore/project_modules', ProjectModuleHandler),
   ('/python/datastore/project_keys', ProjectKeyHandler),
   ('/python/datastore/entity_names', EntityNameHandler),
@@ -396,8 +687,10 @@ application = webapp.WSGIApplication([
   ('/python/datastore/project_fields', ProjectFieldHandler),
   ('/python/datastore/project_filter', ProjectFilterHandler),
   ('/python/datastore/project_cursor', ProjectBrowserHandler),
+  ('/python/datastore/cursor_scan', CursorScanHandler),
   ('/python/datastore/complex_cursor', ComplexCursorHandler),
   ('/python/datastore/transactions', TransactionHandler),
+  ('/python/datastore/query_stats', QueryStatsHandler),
 ], debug=True)
 
 if __name__ == '__main__':
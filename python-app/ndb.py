@@ -4,11 +4,20 @@ except ImportError:
   import simplejson as json
 
 from google.appengine.ext import ndb, webapp
+import time
+import utils
 import webapp2
 import wsgiref
 
 __author__ = 'hiranya'
 
+# Maximum number of keys fetched and deleted at a time by a bulk delete
+MAX_BATCH_SIZE = 500
+
+# Number of seconds a bulk delete may run before it hands a cursor back
+# to the client, well within the request deadline
+DELETE_TIME_BUDGET = 20
+
 class NDBProject(ndb.Model):
   name = ndb.StringProperty(required=True)
   description = ndb.StringProperty(required=True)
@@ -55,20 +64,136 @@ def serialize(entity):
     dict['type'] = 'unknown'
   return dict
 
+def delete_all(handler, model):
+  """
+  Delete all the entities of a model in response to a DELETE request.
+  Keys are fetched in pages of batch_size keys (a request parameter
+  defaulting to MAX_BATCH_SIZE) and each page is deleted with
+  delete_multi_async while the next one is fetched. If the deletion runs
+  out of its time budget, the response carries a cursor that the client
+  passes back in the cursor parameter to resume. If the name_prefix
+  parameter is set, only the entities whose name starts with it are
+  deleted.
+
+  Args:
+    handler A webapp2.RequestHandler serving a DELETE request
+    model   An ndb.Model subclass
+  """
+  batch_size = utils.get_batch_size(handler.request, MAX_BATCH_SIZE,
+    MAX_BATCH_SIZE)
+  cursor = handler.request.get('cursor')
+  if cursor:
+    cursor = ndb.Cursor(urlsafe=cursor)
+  else:
+    cursor = None
+  name_prefix = handler.request.get('name_prefix')
+
+  start = time.time()
+  deleted = 0
+  futures = []
+  if name_prefix:
+    query = model.query(model.name >= name_prefix,
+      model.name < name_prefix + utils.NAME_PREFIX_END)
+  else:
+    query = model.query()
+  while True:
+    keys, cursor, more = query.fetch_page(batch_size, keys_only=True,
+      start_cursor=cursor)
+    ndb.Future.wait_all(futures)
+    futures = ndb.delete_multi_async(keys)
+    deleted += len(keys)
+    if not more or cursor is None:
+      cursor = None
+      break
+    if time.time() - start > DELETE_TIME_BUDGET:
+      break
+  ndb.Future.wait_all(futures)
+
+  if cursor is not None:
+    cursor = cursor.urlsafe()
+  handler.response.headers['Content-Type'] = "application/json"
+  handler.response.out.write(json.dumps(
+    { 'success' : True, 'deleted' : deleted, 'cursor' : cursor }))
+
+def write_results(handler, query):
+  """
+  Write the results of a query in response to a list request. If the
+  page_size request parameter is set, only the page that starts at the
+  cursor request parameter is fetched with fetch_page and written (see
+  utils.write_json_page). As in the db handlers, the next cursor is
+  omitted once a page comes back short, so a client may fetch one empty
+  page at the end. Otherwise all the results are streamed as a JSON
+  array.
+
+  Args:
+    handler A webapp2.RequestHandler serving a GET request
+    query   An ndb.Query instance
+  """
+  page_size = utils.get_page_size(handler.request)
+  if page_size is None:
+    utils.write_json_list(handler.response,
+      query.iter(batch_size=utils.get_batch_size(handler.request)), serialize)
+    return
+
+  cursor = handler.request.get('cursor')
+  if cursor:
+    cursor = ndb.Cursor(urlsafe=cursor)
+  else:
+    cursor = None
+  entities, cursor, more = query.fetch_page(page_size, start_cursor=cursor)
+  next = None
+  if len(entities) == page_size and cursor is not None:
+    next = cursor.urlsafe()
+  utils.write_json_page(handler.response, entities, next, serialize)
+
+def scan_with_cursors(model, page_size):
+  """
+  Scan all the entities of a model with fetch_page, encoding the end
+  cursor of each page into its web safe form and decoding it to start
+  the next page, as it happens when a client pages through a listing.
+
+  Args:
+    model     An ndb.Model subclass
+    page_size Number of entities fetched per page
+
+  Returns:
+    A scan summary (see utils.summarize_scan)
+  """
+  latencies = []
+  encode_times = []
+  decode_times = []
+  entities = 0
+  complete = True
+  cursor = None
+  query = model.query()
+  start = time.time()
+  while True:
+    page_start = time.time()
+    results, cursor, more = query.fetch_page(page_size, start_cursor=cursor)
+    latencies.append(time.time() - page_start)
+    entities += len(results)
+    if not more or cursor is None:
+      break
+    if time.time() - start > utils.SCAN_TIME_BUDGET:
+      complete = False
+      break
+    encode_start = time.time()
+    value = cursor.urlsafe()
+    encode_times.append(time.time() - encode_start)
+    decode_start = time.time()
+    cursor = ndb.Cursor(urlsafe=value)
+    decode_times.append(time.time() - decode_start)
+  return utils.summarize_scan(page_size, entities, time.time() - start,
+    latencies, encode_times, decode_times, complete)
+
 class NDBProjectHandler(webapp2.RequestHandler):
   def get(self):
     id = self.request.get('id')
     if id is None or id.strip() == '':
-      entities = NDBProject.query()
+      write_results(self, NDBProject.query())
     else:
       key = ndb.Key(urlsafe=id)
-      entities = [ key.get() ]
-
-    data = []
-    for result in entities:
-      data.append(result)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      utils.write_json_list(self.response, [ key.get() ], serialize)
 
   def post(self):
     project_name = self.request.get('name')
@@ -80,23 +205,16 @@ class NDBProjectHandler(webapp2.RequestHandler):
     self.response.out.write(json.dumps({ 'success' : True, 'project_id' : project_key.urlsafe() }))
 
   def delete(self):
-    q = NDBProject.query()
-    for entity in q:
-      entity.key.delete()
+    delete_all(self, NDBProject)
 
 class NDBModuleHandler(webapp2.RequestHandler):
   def get(self):
     id = self.request.get('id')
     if id is None or id.strip() == '':
-      query = NDBModule.query()
+      write_results(self, NDBModule.query())
     else:
-      query = [ ndb.Key(urlsafe=id).get() ]
-
-    data = []
-    for result in query:
-      data.append(result)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      utils.write_json_list(self.response, [ ndb.Key(urlsafe=id).get() ],
+        serialize)
 
   def post(self):
     project_id = self.request.get('project_id')
@@ -113,19 +231,14 @@ class NDBModuleHandler(webapp2.RequestHandler):
       json.dumps({ 'success' : True, 'module_id' : module_id.urlsafe() }))
 
   def delete(self):
-    q = NDBModule.query()
-    for entity in q:
-      entity.key.delete()
+    delete_all(self, NDBModule)
 
 class NDBProjectModuleHandler(webapp2.RequestHandler):
   def get(self):
     project_id = self.request.get('project_id')
     q = NDBModule.query(ancestor=ndb.Key(urlsafe=project_id))
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    utils.write_json_list(self.response,
+      q.iter(batch_size=utils.get_batch_size(self.request)), serialize)
 
 class NDBProjectRatingHandler(webapp2.RequestHandler):
   def get(self):
@@ -151,14 +264,12 @@ class NDBProjectRatingHandler(webapp2.RequestHandler):
     if desc is not None and desc == 'true':
       q = q.order(-NDBProject.rating)
 
+    batch_size = utils.get_batch_size(self.request)
     if limit is not None and len(limit) > 0:
-      q = q.fetch(int(limit))
-
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      entities = q.iter(limit=int(limit), batch_size=batch_size)
+    else:
+      entities = q.iter(batch_size=batch_size)
+    utils.write_json_list(self.response, entities, serialize)
 
 class NDBProjectFieldHandler(webapp2.RequestHandler):
   def get(self):
@@ -166,16 +277,11 @@ class NDBProjectFieldHandler(webapp2.RequestHandler):
     rate_limit = self.request.get('rate_limit')
     field_tuple = fields.split(',')
     if rate_limit is not None and len(rate_limit) > 0 and 'rating' in field_tuple:
-      q = NDBProject.query(
-        NDBProject.rating >= int(rate_limit)).fetch(projection=field_tuple)
+      q = NDBProject.query(NDBProject.rating >= int(rate_limit))
     else:
-      q = NDBProject.query().fetch(projection=field_tuple)
-
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+      q = NDBProject.query()
+    utils.write_json_list(self.response, q.iter(projection=field_tuple,
+      batch_size=utils.get_batch_size(self.request)), serialize)
 
 class NDBProjectFilterHandler(webapp2.RequestHandler):
   def get(self):
@@ -189,21 +295,15 @@ class NDBProjectFilterHandler(webapp2.RequestHandler):
       q = NDBProject.query(ndb.AND(NDBProject.license == license,
         NDBProject.rating >= int(rate_limit)))
 
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    utils.write_json_list(self.response,
+      q.iter(batch_size=utils.get_batch_size(self.request)), serialize)
 
 class NDBProjectLicenseFilterHandler(webapp2.RequestHandler):
   def get(self):
     licenses = self.request.get('licenses')
     q = NDBProject.query(NDBProject.license.IN(licenses.split(',')))
-    data = []
-    for entity in q:
-      data.append(entity)
-    self.response.headers['Content-Type'] = "application/json"
-    self.response.out.write(json.dumps(data, default=serialize))
+    utils.write_json_list(self.response,
+      q.iter(batch_size=utils.get_batch_size(self.request)), serialize)
 
 class NDBTransactionHandler(webapp2.RequestHandler):
   @ndb.transactional
@@ -269,9 +369,7 @@ class NDBTransactionHandler(webapp2.RequestHandler):
     self.response.out.write(json.dumps(status))
 
   def delete(self):
-    q = NDBCounter.query()
-    for entity in q:
-      entity.key.delete()
+    delete_all(self, NDBCounter)
 
 class NDBProjectCursorHandler(webapp2.RequestHandler):
   def get(self):
@@ -285,6 +383,25 @@ class NDBProjectCursorHandler(webapp2.RequestHandler):
     self.response.headers['Content-Type'] = "application/json"
     self.response.out.write(json.dumps(output))
 
+class NDBCursorScanHandler(webapp2.RequestHandler):
+  def get(self):
+    kind = self.request.get('kind')
+    if kind is None or kind == '':
+      kind = 'NDBProject'
+    if not SCAN_MODELS.has_key(kind):
+      raise Exception('Unsupported kind: %s' % kind)
+    data = []
+    for page_size in utils.get_scan_page_sizes(self.request):
+      data.append(scan_with_cursors(SCAN_MODELS[kind], page_size))
+    self.response.headers['Content-Type'] = "application/json"
+    self.response.out.write(json.dumps(data))
+
+# Kinds the cursor scan benchmark can scan
+SCAN_MODELS = {
+  'NDBProject' : NDBProject,
+  'NDBModule' : NDBModule,
+}
+
 application = webapp.WSGIApplication([
   ('/python/ndb/project', NDBProjectHandler),
   ('/python/ndb/module', NDBModuleHandler),
@@ -295,6 +412,7 @@ application = webapp.WSGIApplication([
   ('/python/ndb/project_license_filter', NDBProjectLicenseFilterHandler),
   ('/python/ndb/transactions', NDBTransactionHandler),
   ('/python/ndb/project_cursor', NDBProjectCursorHandler),
+  ('/python/ndb/cursor_scan', NDBCursorScanHandler),
 ], debug=True)
 
 if __name__ == '__main__':
@@ -1,7 +1,27 @@
+try:
+  import json
+except ImportError:
+  import simplejson as json
+
 from google.appengine.ext import db
 
 __author__ = 'hiranya'
 
+# Default number of entities fetched per datastore round trip by the
+# list endpoints
+DEFAULT_BATCH_SIZE = 100
+
+# Page sizes scanned by the cursor scan endpoints by default
+DEFAULT_SCAN_PAGE_SIZES = [ 1, 10, 100, 1000 ]
+
+# Number of seconds a cursor scan may spend on a single page size, to
+# keep a scan over all the default page sizes within the request deadline
+SCAN_TIME_BUDGET = 10
+
+# Appended to a name prefix to get an upper bound for the names that
+# start with it, so that a prefix match can be run as a range query
+NAME_PREFIX_END = u'\ufffd'
+
 class TaskCounter(db.Model):
   count = db.IntegerProperty(indexed=False)
 
@@ -11,4 +31,154 @@ def process(key):
     counter = TaskCounter(key_name=key, count=1)
   else:
     counter.count += 1
-  counter.put()
\ No newline at end of file
+  counter.put()
+
+def get_batch_size(request, default=DEFAULT_BATCH_SIZE, maximum=None):
+  """
+  Args:
+    request A webapp2.Request
+    default Batch size to use if the batch_size parameter is not set
+    maximum If not None, larger batch sizes are capped to this value
+
+  Returns:
+    The value of the batch_size request parameter, or the default if it
+    is not set
+  """
+  batch_size = request.get('batch_size')
+  if batch_size is not None and len(batch_size) > 0:
+    batch_size = int(batch_size)
+    if batch_size < 1:
+      raise Exception('Invalid batch size')
+    if maximum is not None:
+      batch_size = min(batch_size, maximum)
+    return batch_size
+  return default
+
+def get_page_size(request):
+  """
+  Returns:
+    The value of the page_size request parameter, or None if it is not
+    set (in which case the list endpoints return all their results)
+  """
+  page_size = request.get('page_size')
+  if page_size is not None and len(page_size) > 0:
+    page_size = int(page_size)
+    if page_size < 1:
+      raise Exception('Invalid page size')
+    return page_size
+  return None
+
+def get_scan_page_sizes(request):
+  """
+  Returns:
+    The list of page sizes given by the comma separated page_sizes
+    request parameter, or DEFAULT_SCAN_PAGE_SIZES if it is not set
+  """
+  page_sizes = request.get('page_sizes')
+  if page_sizes is None or len(page_sizes) == 0:
+    return DEFAULT_SCAN_PAGE_SIZES
+  page_sizes = [ int(page_size) for page_size in page_sizes.split(',') ]
+  for page_size in page_sizes:
+    if page_size < 1:
+      raise Exception('Invalid page size')
+  return page_sizes
+
+def get_percentile(values, percentile):
+  """
+  Returns:
+    The given percentile (0-100) of a sorted list of values, or 0 if
+    the list is empty
+  """
+  if len(values) == 0:
+    return 0
+  index = int(round(percentile / 100.0 * (len(values) - 1)))
+  return values[index]
+
+def summarize_scan(page_size, entities, elapsed, latencies, encode_times,
+                   decode_times, complete):
+  """
+  Summarize a scan over a kind with cursors at a single page size.
+
+  Args:
+    page_size     Number of entities requested per page
+    entities      Number of entities scanned
+    elapsed       Wall clock time of the scan in seconds
+    latencies     List of page fetch latencies in seconds
+    encode_times  List of the times taken to encode each cursor into
+                  its web safe form in seconds
+    decode_times  List of the times taken to decode each cursor in
+                  seconds
+    complete      False if the scan ran out of its time budget before
+                  reaching the end of the kind
+
+  Returns:
+    A dictionary containing the page size, the number of entities and
+    pages, the entities scanned per second, the page latency summary in
+    milliseconds and the mean cursor encode and decode times in
+    microseconds
+  """
+  latencies = sorted(latencies)
+  mean = lambda values: sum(values) / max(len(values), 1)
+  throughput = 0.0
+  if elapsed > 0:
+    throughput = entities / elapsed
+  return {
+    'page_size' : page_size,
+    'entities' : entities,
+    'pages' : len(latencies),
+    'elapsed' : elapsed,
+    'complete' : complete,
+    'entities_per_second' : throughput,
+    'page_latency' : {
+      'mean' : mean(latencies) * 1000,
+      'p50' : get_percentile(latencies, 50) * 1000,
+      'p90' : get_percentile(latencies, 90) * 1000,
+      'p99' : get_percentile(latencies, 99) * 1000,
+      'max' : get_percentile(latencies, 100) * 1000,
+    },
+    'cursors' : len(encode_times),
+    'cursor_encode_us' : mean(encode_times) * 1000000,
+    'cursor_decode_us' : mean(decode_times) * 1000000,
+  }
+
+def write_json_page(response, entities, next, serialize):
+  """
+  Write a page of entities to a response as a JSON object of the form
+  { 'results' : [...], 'next' : cursor }.
+
+  Args:
+    response  A webapp2 response
+    entities  A list of entities
+    next      Web safe cursor of the next page, or None if this is the
+              last page
+    serialize A function that converts an entity into a JSON
+              serializable object
+  """
+  response.headers['Content-Type'] = "application/json"
+  response.out.write(json.dumps({ 'results' : entities, 'next' : next },
+    default=serialize))
+
+def write_json_list(response, entities, serialize):
+  """
+  Write a JSON array of entities to a response, encoding and writing one
+  element at a time as the entities arrive. Together with a query that
+  fetches its results in batches (db.Query.run or ndb.Query.iter with a
+  batch_size), only one batch of entities is held in memory at a time.
+  The runtime still buffers the encoded response until the handler
+  returns.
+
+  Args:
+    response  A webapp2 response
+    entities  An iterable of entities
+    serialize A function that converts an entity into a JSON
+              serializable object
+  """
+  response.headers['Content-Type'] = "application/json"
+  response.out.write('[')
+  first = True
+  for entity in entities:
+    if not first:
+      response.out.write(', ')
+    response.out.write(json.dumps(entity, default=serialize))
+    first = False
+  response.out.write(']')
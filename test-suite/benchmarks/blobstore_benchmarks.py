@@ -0,0 +1,57 @@
+import json
+import urlparse
+from hawkeye_utils import HawkeyeBenchmark, HawkeyeTestSuite
+import hawkeye_utils
+
+BLOB_SIZES = [ 1024, 100 * 1024, 1024 * 1024 ]
+
+class BlobstoreBenchmark(HawkeyeBenchmark):
+  sweep = { 'size' : BLOB_SIZES }
+  warmup_iterations = 2
+  iterations = 20
+
+  def __init__(self):
+    HawkeyeBenchmark.__init__(self)
+    self.blob_keys = []
+
+  def upload_blob(self, size):
+    response = self.http_get('/blobstore/url')
+    self.assertEquals(response.status, 200)
+    url = json.loads(response.payload)['url']
+    body = hawkeye_utils.MultipartBody()
+    body.add_file('bench.bin', 'x' * size)
+    headers = { 'Content-Type': body.get_content_type() }
+    response = self.file_upload(urlparse.urlparse(url).path, body, headers)
+    self.assertEquals(response.status, 200)
+    blob_key = json.loads(response.payload)['key']
+    self.blob_keys.append(blob_key)
+    return blob_key
+
+  def tear_down_benchmark(self, params):
+    for blob_key in self.blob_keys:
+      self.http_delete('/blobstore/query?key={0}'.format(blob_key))
+    self.blob_keys = []
+
+class BlobUploadBenchmark(BlobstoreBenchmark):
+  benchmark_name = 'blobstore.upload'
+
+  def run_iteration(self, params):
+    self.upload_blob(params['size'])
+
+class BlobDownloadBenchmark(BlobstoreBenchmark):
+  benchmark_name = 'blobstore.download'
+
+  def set_up_benchmark(self, params):
+    self.blob_key = self.upload_blob(params['size'])
+
+  def run_iteration(self, params):
+    response = self.http_get('/blobstore/download/{0}'.format(self.blob_key),
+      stream=True)
+    self.assertEquals(response.status, 200)
+    self.assertEquals(response.content_length, params['size'])
+
+def suite(lang):
+  suite = HawkeyeTestSuite('Blobstore Benchmarks', 'blobstore-bench')
+  suite.addTest(BlobUploadBenchmark())
+  suite.addTest(BlobDownloadBenchmark())
+  return suite
@@ -0,0 +1,175 @@
+import json
+import random
+import uuid
+from hawkeye_utils import HawkeyeBenchmark, HawkeyeTestSuite
+import hawkeye_utils
+
+# Number of projects stored before running the query benchmarks
+QUERY_DATA_SIZE = 100
+
+# Number of projects stored by each iteration of the batch put benchmark
+BATCH_PUT_SIZE = 500
+
+# Number of projects stored before running the cursor scan benchmark
+CURSOR_SCAN_DATA_SIZE = 1000
+
+class DatastoreBenchmark(HawkeyeBenchmark):
+  """
+  Base class for the benchmarks of the datastore API. The prefix
+  attribute selects the API variant under test (/datastore for the db
+  API and /ndb for the NDB API). When a fixture dataset is loaded for
+  that API (see --fixtures), the benchmarks only delete the bench-*
+  projects they stored themselves, and the query benchmarks run against
+  the fixture dataset instead of storing their own projects.
+  """
+
+  prefix = '/datastore'
+
+  def has_fixtures(self):
+    return hawkeye_utils.FIXTURES.has_key(self.prefix[1:])
+
+  def put_project(self, rating=None):
+    if rating is None:
+      rating = random.randint(1, 10)
+    response = self.http_post(self.prefix + '/project',
+      'name=bench-{0}&description=Benchmark&rating={1}&license=L1'.format(
+        uuid.uuid1(), rating))
+    self.assertEquals(response.status, 201)
+    return json.loads(response.payload)['project_id']
+
+  def new_projects(self, count):
+    return [ { 'name' : 'bench-{0}'.format(uuid.uuid1()),
+               'description' : 'Benchmark',
+               'rating' : random.randint(1, 10),
+               'license' : 'L1' } for _ in range(count) ]
+
+  def put_projects(self, count):
+    """
+    Store the given number of projects through the batch endpoint.
+    """
+    for start in range(0, count, BATCH_PUT_SIZE):
+      response = self.http_post(self.prefix + '/batch', json.dumps(
+        self.new_projects(min(BATCH_PUT_SIZE, count - start))),
+        { 'Content-Type' : 'application/json' })
+      self.assertEquals(response.status, 201)
+
+  def delete_projects(self):
+    if self.has_fixtures():
+      self.assert_delete_all(self.prefix + '/project?name_prefix=bench-')
+    else:
+      self.assert_delete_all(self.prefix + '/project')
+
+class DatastorePutBenchmark(DatastoreBenchmark):
+  benchmark_name = 'datastore.put'
+
+  def set_up_benchmark(self, params):
+    self.delete_projects()
+
+  def run_iteration(self, params):
+    self.put_project()
+
+  def tear_down_benchmark(self, params):
+    self.delete_projects()
+
+class DatastoreGetBenchmark(DatastoreBenchmark):
+  benchmark_name = 'datastore.get'
+
+  def set_up_benchmark(self, params):
+    self.delete_projects()
+    self.project_id = self.put_project()
+
+  def run_iteration(self, params):
+    response = self.http_get(self.prefix + '/project?id={0}'.format(
+      self.project_id))
+    self.assertEquals(response.status, 200)
+
+  def tear_down_benchmark(self, params):
+    self.delete_projects()
+
+class DatastoreQueryBenchmark(DatastoreBenchmark):
+  benchmark_name = 'datastore.query'
+  sweep = { 'limit' : [ 1, 10, 100 ] }
+
+  def set_up_benchmark(self, params):
+    self.delete_projects()
+    if not self.has_fixtures():
+      for index in range(QUERY_DATA_SIZE):
+        self.put_project(index % 10 + 1)
+
+  def run_iteration(self, params):
+    response = self.http_get(self.prefix + '/project_ratings?rating=1&'
+      'comparator=ge&limit={0}'.format(params['limit']))
+    self.assertEquals(response.status, 200)
+    return len(json.loads(response.payload))
+
+  def tear_down_benchmark(self, params):
+    self.delete_projects()
+
+class DatastoreBatchPutBenchmark(DatastoreBenchmark):
+  benchmark_name = 'datastore.batch_put'
+  warmup_iterations = 1
+  iterations = 5
+  sweep = { 'batch_size' : [ 1, 10, 100, 500 ] }
+
+  def set_up_benchmark(self, params):
+    self.delete_projects()
+
+  def run_iteration(self, params):
+    projects = self.new_projects(BATCH_PUT_SIZE)
+    response = self.http_post(self.prefix + '/batch?batch_size={0}'.format(
+      params['batch_size']), json.dumps(projects),
+      { 'Content-Type' : 'application/json' })
+    self.assertEquals(response.status, 201)
+    self.assertEquals(len(json.loads(response.payload)['ids']), len(projects))
+    return len(projects)
+
+  def tear_down_benchmark(self, params):
+    self.delete_projects()
+
+class DatastoreCursorScanBenchmark(DatastoreBenchmark):
+  """
+  Scans CURSOR_SCAN_DATA_SIZE projects (or the fixture dataset) with
+  cursors on the server, one full scan per iteration. The page latencies and cursor costs the
+  server reports for the last iteration are added to the result as
+  'scan' (see utils.summarize_scan in the Python app). The server stops
+  a scan once it exceeds its time budget, which small page sizes may do
+  on a real backend. The throughput is then that of the partial scan,
+  and the 'complete' flag of 'scan' is False.
+  """
+
+  benchmark_name = 'datastore.cursor_scan'
+  warmup_iterations = 1
+  iterations = 5
+  sweep = { 'page_size' : [ 1, 10, 100, 1000 ] }
+
+  def set_up_benchmark(self, params):
+    self.delete_projects()
+    if not self.has_fixtures():
+      self.put_projects(CURSOR_SCAN_DATA_SIZE)
+    self.scan = None
+
+  def run_iteration(self, params):
+    response = self.http_get(self.prefix + '/cursor_scan?page_sizes={0}'.format(
+      params['page_size']))
+    self.assertEquals(response.status, 200)
+    self.scan = json.loads(response.payload)[0]
+    return self.scan['entities']
+
+  def tear_down_benchmark(self, params):
+    self.delete_projects()
+
+  def get_result(self, params, warmup, histogram, operations, elapsed):
+    result = DatastoreBenchmark.get_result(self, params, warmup, histogram,
+      operations, elapsed)
+    result['scan'] = self.scan
+    return result
+
+def suite(lang):
+  suite = HawkeyeTestSuite('Datastore Benchmarks', 'datastore-bench')
+  suite.addTest(DatastorePutBenchmark())
+  suite.addTest(DatastoreGetBenchmark())
+  suite.addTest(DatastoreQueryBenchmark())
+  if lang == 'python':
+    suite.addTest(DatastoreBatchPutBenchmark())
+    suite.addTest(DatastoreCursorScanBenchmark())
+  return suite
@@ -0,0 +1,42 @@
+import json
+from hawkeye_utils import HawkeyeBenchmark, HawkeyeTestSuite
+import hawkeye_utils
+
+TRANSFORMS = {
+  'none' : '',
+  'resize' : 'resize=50&',
+  'rotate' : 'rotate=true&',
+  'resize_rotate' : 'resize=50&rotate=true&',
+}
+
+class ImageTransformBenchmark(HawkeyeBenchmark):
+  benchmark_name = 'images.transform'
+  sweep = { 'transform' : sorted(TRANSFORMS.keys()) }
+  warmup_iterations = 2
+  iterations = 20
+
+  def set_up_benchmark(self, params):
+    response = self.http_delete('/images/logo')
+    self.assertEquals(response.status, 200)
+    content_type, body = hawkeye_utils.encode_file('resources/logo.png')
+    headers = { 'Content-Type': content_type }
+    response = self.file_upload('/images/logo', body, headers,
+      prepend_lang=True)
+    self.assertEquals(response.status, 201)
+    self.project_id = json.loads(response.payload)['project_id']
+    self.wait_until(lambda: self.http_get('/images/logo?project_id=' +
+      self.project_id).status == 200, 5, 'images.logo')
+
+  def run_iteration(self, params):
+    response = self.http_get('/images/logo?{0}metadata=true&'
+      'project_id={1}'.format(TRANSFORMS[params['transform']],
+      self.project_id))
+    self.assertEquals(response.status, 200)
+
+  def tear_down_benchmark(self, params):
+    self.http_delete('/images/logo')
+
+def suite(lang):
+  suite = HawkeyeTestSuite('Images Benchmarks', 'images-bench')
+  suite.addTest(ImageTransformBenchmark())
+  return suite
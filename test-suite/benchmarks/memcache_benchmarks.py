@@ -0,0 +1,77 @@
+import json
+import uuid
+from hawkeye_utils import HawkeyeBenchmark, HawkeyeTestSuite
+
+VALUE_SIZES = [ 16, 1024, 32 * 1024 ]
+
+def make_value(size):
+  return 'x' * size
+
+class MemcacheSetBenchmark(HawkeyeBenchmark):
+  benchmark_name = 'memcache.set'
+  sweep = { 'value_size' : VALUE_SIZES }
+
+  def set_up_benchmark(self, params):
+    self.key = 'bench-{0}'.format(uuid.uuid1())
+    self.value = make_value(params['value_size'])
+
+  def run_iteration(self, params):
+    response = self.http_post('/memcache',
+      'key={0}&value={1}&update=true'.format(self.key, self.value))
+    self.assertEquals(response.status, 200)
+    self.assertTrue(json.loads(response.payload)['success'])
+
+  def tear_down_benchmark(self, params):
+    self.http_delete('/memcache?key={0}'.format(self.key))
+
+class MemcacheGetBenchmark(MemcacheSetBenchmark):
+  benchmark_name = 'memcache.get'
+
+  def set_up_benchmark(self, params):
+    MemcacheSetBenchmark.set_up_benchmark(self, params)
+    MemcacheSetBenchmark.run_iteration(self, params)
+
+  def run_iteration(self, params):
+    response = self.http_get('/memcache?key={0}'.format(self.key))
+    self.assertEquals(response.status, 200)
+
+class MemcacheMultiSetBenchmark(HawkeyeBenchmark):
+  benchmark_name = 'memcache.multi_set'
+  sweep = { 'keys' : [ 1, 10, 100 ] }
+
+  def set_up_benchmark(self, params):
+    prefix = 'bench-{0}'.format(uuid.uuid1())
+    self.keys = ','.join('{0}-{1}'.format(prefix, index)
+      for index in range(params['keys']))
+    self.values = ','.join(make_value(16) for _ in range(params['keys']))
+
+  def run_iteration(self, params):
+    response = self.http_post('/memcache/multi',
+      'keys={0}&values={1}&update=true'.format(self.keys, self.values))
+    self.assertEquals(response.status, 200)
+    self.assertTrue(json.loads(response.payload)['success'])
+    return params['keys']
+
+  def tear_down_benchmark(self, params):
+    self.http_delete('/memcache/multi?keys={0}'.format(self.keys))
+
+class MemcacheMultiGetBenchmark(MemcacheMultiSetBenchmark):
+  benchmark_name = 'memcache.multi_get'
+
+  def set_up_benchmark(self, params):
+    MemcacheMultiSetBenchmark.set_up_benchmark(self, params)
+    MemcacheMultiSetBenchmark.run_iteration(self, params)
+
+  def run_iteration(self, params):
+    response = self.http_get('/memcache/multi?keys={0}'.format(self.keys))
+    self.assertEquals(response.status, 200)
+    self.assertEquals(len(json.loads(response.payload)), params['keys'])
+    return params['keys']
+
+def suite(lang):
+  suite = HawkeyeTestSuite('Memcache Benchmarks', 'memcache-bench')
+  suite.addTest(MemcacheSetBenchmark())
+  suite.addTest(MemcacheGetBenchmark())
+  suite.addTest(MemcacheMultiSetBenchmark())
+  suite.addTest(MemcacheMultiGetBenchmark())
+  return suite
@@ -0,0 +1,32 @@
+from benchmarks import datastore_benchmarks
+from hawkeye_utils import HawkeyeTestSuite
+
+class NDBPutBenchmark(datastore_benchmarks.DatastorePutBenchmark):
+  benchmark_name = 'ndb.put'
+  prefix = '/ndb'
+
+class NDBGetBenchmark(datastore_benchmarks.DatastoreGetBenchmark):
+  benchmark_name = 'ndb.get'
+  prefix = '/ndb'
+
+class NDBQueryBenchmark(datastore_benchmarks.DatastoreQueryBenchmark):
+  benchmark_name = 'ndb.query'
+  prefix = '/ndb'
+
+class NDBCursorScanBenchmark(datastore_benchmarks.DatastoreCursorScanBenchmark):
+  benchmark_name = 'ndb.cursor_scan'
+  prefix = '/ndb'
+
+  def put_projects(self, count):
+    # The NDB app has no batch endpoint
+    for _ in range(count):
+      self.put_project()
+
+def suite(lang):
+  suite = HawkeyeTestSuite('NDB Benchmarks', 'ndb-bench')
+  if lang == 'python':
+    suite.addTest(NDBPutBenchmark())
+    suite.addTest(NDBGetBenchmark())
+    suite.addTest(NDBQueryBenchmark())
+    suite.addTest(NDBCursorScanBenchmark())
+  return suite
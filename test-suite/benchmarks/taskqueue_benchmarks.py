@@ -0,0 +1,49 @@
+import json
+import uuid
+from hawkeye_utils import HawkeyeBenchmark, HawkeyeTestSuite
+
+# Maximum number of seconds to wait for a batch of tasks to be executed
+DRAIN_TIMEOUT = 120
+
+class TaskEnqueueBenchmark(HawkeyeBenchmark):
+  benchmark_name = 'taskqueue.enqueue'
+
+  def set_up_benchmark(self, params):
+    self.key = 'bench-{0}'.format(uuid.uuid1())
+
+  def run_iteration(self, params):
+    response = self.http_post('/taskqueue/counter', 'key={0}'.format(self.key))
+    self.assertEquals(response.status, 200)
+    self.assertTrue(json.loads(response.payload)['status'])
+
+class TaskDrainBenchmark(HawkeyeBenchmark):
+  """
+  Measures the time it takes to enqueue a batch of push tasks and for
+  all of them to be executed.
+  """
+
+  benchmark_name = 'taskqueue.drain'
+  warmup_iterations = 1
+  iterations = 5
+  sweep = { 'tasks' : [ 10, 50 ] }
+
+  def run_iteration(self, params):
+    key = 'bench-{0}'.format(uuid.uuid1())
+    for _ in range(params['tasks']):
+      response = self.http_post('/taskqueue/counter', 'key={0}'.format(key))
+      self.assertEquals(response.status, 200)
+
+    def drained():
+      response = self.http_get('/taskqueue/counter?key={0}'.format(key))
+      if response.status != 200:
+        return False
+      return json.loads(response.payload)[key] >= params['tasks']
+
+    self.wait_until(drained, DRAIN_TIMEOUT, 'taskqueue.drain')
+    return params['tasks']
+
+def suite(lang):
+  suite = HawkeyeTestSuite('Task Queue Benchmarks', 'taskqueue-bench')
+  suite.addTest(TaskEnqueueBenchmark())
+  suite.addTest(TaskDrainBenchmark())
+  return suite
@@ -0,0 +1,514 @@
+#!/usr/bin/python
+
+import hawkeye_utils
+import json
+import optparse
+import Queue
+import random
+import sys
+import threading
+import time
+import urllib
+
+FORM_HEADERS = { 'Content-Type' : 'application/x-www-form-urlencoded' }
+JSON_HEADERS = { 'Content-Type' : 'application/json' }
+
+# Named dataset sizes (number of projects)
+DATASET_SIZES = {
+  '10k' : 10000,
+  '100k' : 100000,
+  '1m' : 1000000,
+}
+
+MIN_RATING = 1
+MAX_RATING = 10
+
+DEFAULT_RATINGS = 'uniform'
+DEFAULT_LICENSES = 'L1=1,L2=1'
+DEFAULT_MODULES = 2
+DEFAULT_CONCURRENCY = 16
+DEFAULT_MANIFEST = 'fixtures.json'
+
+# Fixture API -> (URL prefix, languages, languages with a batch endpoint)
+FIXTURE_APIS = {
+  'datastore' : ('/datastore', [ 'java', 'python' ], [ 'python' ]),
+  'ndb' : ('/ndb', [ 'python' ], []),
+}
+
+# Maximum number of seconds to wait for a newly created project to
+# become visible to the module creation handler (which looks the
+# project up with a query)
+PROJECT_VISIBILITY_TIMEOUT = 10
+
+# Number of seconds between two progress reports
+PROGRESS_INTERVAL = 5
+
+def parse_size(spec):
+  """
+  Parse a dataset size, given either as one of the DATASET_SIZES names
+  or as a plain number with an optional k or m suffix.
+
+  Args:
+    spec  A dataset size string (eg: 100k, 2500)
+
+  Returns:
+    The number of projects
+
+  Raises:
+    ValueError  If the size is malformed or not positive
+  """
+  spec = spec.strip().lower()
+  if DATASET_SIZES.has_key(spec):
+    return DATASET_SIZES[spec]
+  multiplier = 1
+  if spec.endswith('k'):
+    multiplier, spec = 1000, spec[:-1]
+  elif spec.endswith('m'):
+    multiplier, spec = 1000000, spec[:-1]
+  if not spec.isdigit() or int(spec) * multiplier < 1:
+    raise ValueError('Invalid dataset size: {0}'.format(spec))
+  return int(spec) * multiplier
+
+def parse_weights(spec):
+  """
+  Parse a weighted choice specification of the form value1=weight1,...
+  A value without a weight gets a weight of 1.
+
+  Args:
+    spec  A weighted choice specification string
+
+  Returns:
+    A list of (value, weight) tuples
+
+  Raises:
+    ValueError  If the specification is malformed
+  """
+  result = []
+  for entry in spec.split(','):
+    entry = entry.strip()
+    if '=' in entry:
+      value, weight = entry.split('=', 1)
+      weight = float(weight)
+    else:
+      value, weight = entry, 1.0
+    if not value or weight <= 0:
+      raise ValueError('Invalid weighted value: {0}'.format(entry))
+    result.append((value, weight))
+  return result
+
+def parse_ratings(spec):
+  """
+  Parse a rating distribution. Supported distributions are:
+
+    uniform             Every rating is equally likely
+    normal:MEAN:STDDEV  A normal distribution, rounded and clipped to
+                        the valid rating range
+    zipf:S              Rating r has a weight of 1 / r^S, so low ratings
+                        are the most common
+    R1=W1,R2=W2,...     Explicit weights (ratings not listed never occur)
+
+  Args:
+    spec  A rating distribution specification string
+
+  Returns:
+    A function that takes an instance of random.Random and returns a
+    rating
+
+  Raises:
+    ValueError  If the specification is malformed
+  """
+  parts = spec.strip().split(':')
+  if parts[0] == 'uniform' and len(parts) == 1:
+    return lambda rand: rand.randint(MIN_RATING, MAX_RATING)
+  elif parts[0] == 'normal' and len(parts) == 3:
+    mean, stddev = float(parts[1]), float(parts[2])
+    return lambda rand: min(max(int(round(rand.gauss(mean, stddev))),
+      MIN_RATING), MAX_RATING)
+  elif parts[0] == 'zipf' and len(parts) == 2:
+    exponent = float(parts[1])
+    weights = [ (rating, 1.0 / rating ** exponent)
+                for rating in range(MIN_RATING, MAX_RATING + 1) ]
+  else:
+    weights = []
+    for rating, weight in parse_weights(spec):
+      if not rating.isdigit() or not MIN_RATING <= int(rating) <= MAX_RATING:
+        raise ValueError('Invalid rating: {0}'.format(rating))
+      weights.append((int(rating), weight))
+  return WeightedChoice(weights).choose
+
+class WeightedChoice:
+  """
+  Chooses values at random according to their weights.
+  """
+
+  def __init__(self, weights):
+    """
+    Args:
+      weights A list of (value, weight) tuples
+    """
+    self.weights = weights
+    self.total_weight = sum(weight for _, weight in weights)
+
+  def choose(self, rand):
+    point = rand.uniform(0, self.total_weight)
+    for value, weight in self.weights:
+      point -= weight
+      if point <= 0:
+        return value
+    return self.weights[-1][0]
+
+class FixtureGenerator:
+  """
+  Bulk-loads a generated dataset of projects and their child modules
+  through the Project/Module (or NDBProject/NDBModule) endpoints of the
+  Hawkeye apps. All the project attributes are drawn from a single
+  random.Random seeded with the given seed, in index order, before the
+  projects are handed to the worker threads that create them. The same
+  seed and distributions therefore always produce the same dataset, no
+  matter how many workers are used or in which order the requests
+  complete. Project i is named fixture-{seed}-{i} and its modules are
+  named module-{j}, so a partially loaded dataset can be completed by
+  starting again from the first missing index. When a batch size is
+  set, each request creates that many projects along with their modules
+  through the batch endpoint instead.
+  """
+
+  def __init__(self, api, size, seed=0, modules=DEFAULT_MODULES,
+               ratings=DEFAULT_RATINGS, licenses=DEFAULT_LICENSES,
+               concurrency=DEFAULT_CONCURRENCY, start=0, batch_size=0):
+    """
+    Create a new instance of FixtureGenerator.
+
+    Args:
+      api         Fixture API to load the dataset through (see
+                  FIXTURE_APIS)
+      size        Number of projects in the dataset
+      seed        Seed of the dataset
+      modules     Number of modules created under each project
+      ratings     Rating distribution (see parse_ratings)
+      licenses    Weighted license choice (see parse_weights)
+      concurrency Number of worker threads creating entities
+      start       Index of the first project to create. The projects
+                  before it are generated (to keep the dataset
+                  deterministic) but not created.
+      batch_size  Number of projects created per request through the
+                  batch endpoint (0 creates one entity per request)
+    """
+    self.api = api
+    self.prefix = FIXTURE_APIS[api][0]
+    self.size = size
+    self.seed = seed
+    self.modules = modules
+    self.ratings = ratings
+    self.licenses = licenses
+    self.concurrency = concurrency
+    self.start = start
+    self.batch_size = batch_size
+    self.choose_rating = parse_ratings(ratings)
+    self.choose_license = WeightedChoice(parse_weights(licenses)).choose
+    self.lock = threading.Lock()
+    self.projects = 0
+    self.module_count = 0
+    self.errors = 0
+
+  def iter_projects(self):
+    """
+    Generate the projects of the dataset in index order.
+
+    Returns:
+      A generator of dictionaries containing the index, name,
+      description, rating and license of each project
+    """
+    rand = random.Random(self.seed)
+    for index in range(self.size):
+      yield {
+        'index' : index,
+        'name' : 'fixture-{0}-{1}'.format(self.seed, index),
+        'description' : 'Fixture Project {0}'.format(index),
+        'rating' : self.choose_rating(rand),
+        'license' : self.choose_license(rand),
+      }
+
+  def run(self):
+    """
+    Create the dataset and wait for all the outstanding requests to
+    complete.
+
+    Returns:
+      A report dictionary (see FixtureGenerator.get_report)
+    """
+    queue = Queue.Queue(self.concurrency * 4)
+    workers = []
+    for _ in range(self.concurrency):
+      worker = threading.Thread(target=self.__create_projects, args=(queue,))
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+    ratings = {}
+    licenses = {}
+    license_ratings = {}
+    batch = []
+    start = time.time()
+    last_progress = start
+    for project in self.iter_projects():
+      ratings[project['rating']] = ratings.get(project['rating'], 0) + 1
+      licenses[project['license']] = licenses.get(project['license'], 0) + 1
+      counts = license_ratings.setdefault(project['license'], {})
+      counts[project['rating']] = counts.get(project['rating'], 0) + 1
+      if project['index'] < self.start:
+        continue
+      if self.batch_size:
+        batch.append(project)
+        if len(batch) == self.batch_size:
+          queue.put(batch)
+          batch = []
+      else:
+        queue.put(project)
+      if time.time() - last_progress >= PROGRESS_INTERVAL:
+        last_progress = time.time()
+        self.__print_progress(last_progress - start)
+    if batch:
+      queue.put(batch)
+    for _ in workers:
+      queue.put(None)
+    for worker in workers:
+      worker.join()
+    return self.get_report(time.time() - start, ratings, licenses,
+      license_ratings)
+
+  def get_report(self, elapsed, ratings, licenses, license_ratings):
+    """
+    Summarize the dataset and the load.
+
+    Args:
+      elapsed         Wall clock time of the load in seconds
+      ratings         Number of projects with each rating in the dataset
+      licenses        Number of projects with each license in the dataset
+      license_ratings Number of projects with each rating, by license
+
+    Returns:
+      A dictionary describing the dataset (api, size, seed, modules,
+      distributions and the resulting rating and license counts) and
+      the number of projects and modules created, errors and throughput
+    """
+    return {
+      'api' : self.api,
+      'lang' : hawkeye_utils.LANG,
+      'size' : self.size,
+      'seed' : self.seed,
+      'start' : self.start,
+      'batch_size' : self.batch_size,
+      'modules_per_project' : self.modules,
+      'rating_distribution' : self.ratings,
+      'license_distribution' : self.licenses,
+      'ratings' : dict((str(rating), count)
+                       for rating, count in ratings.items()),
+      'licenses' : licenses,
+      'license_ratings' : dict((license, dict((str(rating), count)
+        for rating, count in counts.items()))
+        for license, counts in license_ratings.items()),
+      'created_projects' : self.projects,
+      'created_modules' : self.module_count,
+      'errors' : self.errors,
+      'duration' : elapsed,
+      'throughput' : (self.projects + self.module_count) / max(elapsed, 0.001),
+    }
+
+  def __print_progress(self, elapsed):
+    with self.lock:
+      created = self.projects
+    print '{0:.0f}s: {1} of {2} projects created ({3:.1f}/s)'.format(elapsed,
+      created, self.size - self.start, created / elapsed)
+    sys.stdout.flush()
+
+  def __create_projects(self, queue):
+    if self.batch_size:
+      create = self.__create_batch
+    else:
+      create = self.__create_project
+    try:
+      while True:
+        project = queue.get()
+        if project is None:
+          break
+        create(project)
+    finally:
+      hawkeye_utils.CONNECTION_POOL.close_all()
+
+  def __post(self, path, params):
+    response = hawkeye_utils.make_request('POST', self.prefix + path,
+      urllib.urlencode(params), dict(FORM_HEADERS), source='fixtures')
+    if response.status != 201:
+      return None
+    return response.get_json()
+
+  def __create_project(self, project):
+    try:
+      result = self.__post('/project', [ ('name', project['name']),
+        ('description', project['description']),
+        ('rating', project['rating']), ('license', project['license']) ])
+    except Exception:
+      result = None
+    if result is None:
+      with self.lock:
+        self.errors += 1
+      return
+    with self.lock:
+      self.projects += 1
+
+    for module in range(self.modules):
+      params = [ ('project_id', result['project_id']),
+                 ('name', 'module-{0}'.format(module)),
+                 ('description', 'Fixture Module {0}'.format(module)) ]
+      def create_module():
+        try:
+          return self.__post('/module', params)
+        except Exception:
+          return None
+      if hawkeye_utils.wait_for(create_module, PROJECT_VISIBILITY_TIMEOUT,
+                                'fixtures.module'):
+        with self.lock:
+          self.module_count += 1
+      else:
+        with self.lock:
+          self.errors += 1
+
+  def __create_batch(self, projects):
+    entities = []
+    for project in projects:
+      entities.append({ 'type' : 'project', 'name' : project['name'],
+        'description' : project['description'], 'rating' : project['rating'],
+        'license' : project['license'] })
+      for module in range(self.modules):
+        entities.append({ 'type' : 'module', 'project_name' : project['name'],
+          'name' : 'module-{0}'.format(module),
+          'description' : 'Fixture Module {0}'.format(module) })
+    try:
+      response = hawkeye_utils.make_request('POST', self.prefix + '/batch',
+        json.dumps(entities), dict(JSON_HEADERS), source='fixtures')
+      created = response.status == 201
+    except Exception:
+      created = False
+    with self.lock:
+      if created:
+        self.projects += len(projects)
+        self.module_count += len(projects) * self.modules
+      else:
+        self.errors += len(entities)
+
+def print_fixture_report(report):
+  print '\nFixtures ({0}, {1} projects, seed {2})'.format(report['api'],
+    report['size'], report['seed'])
+  print '=' * 50
+  print 'Created {0} projects and {1} modules in {2:.1f}s ({3:.1f} ' \
+        'entities/s), {4} errors'.format(report['created_projects'],
+    report['created_modules'], report['duration'], report['throughput'],
+    report['errors'])
+  print 'Ratings:  ' + ', '.join('{0}={1}'.format(rating,
+    report['ratings'][rating]) for rating in sorted(report['ratings'].keys(),
+                                                     key=int))
+  print 'Licenses: ' + ', '.join('{0}={1}'.format(license,
+    report['licenses'][license]) for license in sorted(
+      report['licenses'].keys()))
+
+def print_usage_and_exit(msg, parser):
+  print msg
+  parser.print_help()
+  exit(1)
+
+if __name__ == '__main__':
+  parser = optparse.OptionParser()
+  parser.add_option('-s', '--server', action='store',
+    type='string', dest='server', help='Hostname of the target AppEngine server')
+  parser.add_option('-p', '--port', action='store',
+    type='int', dest='port', help='Port of the target AppEngine server')
+  parser.add_option('-l', '--lang', action='store', type='string',
+    dest='lang', default='python',
+    help='Language binding to load the fixtures into (defaults to python)')
+  parser.add_option('--api', action='store', type='string', dest='api',
+    default='datastore', help='Comma separated list of the APIs to load ' \
+                              'the fixtures through: datastore, ndb ' \
+                              '(defaults to datastore)')
+  parser.add_option('--size', action='store', type='string', dest='size',
+    default='10k', help='Number of projects: 10k, 100k, 1m or any number ' \
+                        '(defaults to 10k)')
+  parser.add_option('--seed', action='store', type='int', dest='seed',
+    default=0, help='Seed of the generated dataset (defaults to 0)')
+  parser.add_option('--modules', action='store', type='int', dest='modules',
+    default=DEFAULT_MODULES, help='Number of modules per project ' \
+                                  '(defaults to {0})'.format(DEFAULT_MODULES))
+  parser.add_option('--ratings', action='store', type='string',
+    dest='ratings', default=DEFAULT_RATINGS,
+    help='Rating distribution: uniform, normal:MEAN:STDDEV, zipf:S or ' \
+         'explicit weights such as 10=1,5=4 (defaults to uniform)')
+  parser.add_option('--licenses', action='store', type='string',
+    dest='licenses', default=DEFAULT_LICENSES,
+    help='Weighted license choice (defaults to {0})'.format(DEFAULT_LICENSES))
+  parser.add_option('--concurrency', action='store', type='int',
+    dest='concurrency', default=DEFAULT_CONCURRENCY,
+    help='Number of concurrent requests (defaults to {0})'.format(
+      DEFAULT_CONCURRENCY))
+  parser.add_option('--start', action='store', type='int', dest='start',
+    default=0, help='Index of the first project to create, to complete ' \
+                    'a partially loaded dataset (defaults to 0)')
+  parser.add_option('--batch-size', action='store', type='int',
+    dest='batch_size', default=0,
+    help='Number of projects (with their modules) created per request ' \
+         'through the batch endpoint (defaults to 0, one entity per request)')
+  parser.add_option('--manifest', action='store', type='string',
+    dest='manifest', default=DEFAULT_MANIFEST,
+    help='File the description of the loaded dataset is written to ' \
+         '(defaults to {0})'.format(DEFAULT_MANIFEST))
+  (options, args) = parser.parse_args(sys.argv[1:])
+
+  if options.server is None:
+    print_usage_and_exit('Target server name not specified', parser)
+  elif options.port is None:
+    print_usage_and_exit('Target port name not specified', parser)
+  elif options.modules < 0:
+    print_usage_and_exit('Number of modules must not be negative', parser)
+  elif options.concurrency < 1:
+    print_usage_and_exit('Concurrency must be positive', parser)
+  elif options.start < 0:
+    print_usage_and_exit('Start index must not be negative', parser)
+  elif options.batch_size < 0:
+    print_usage_and_exit('Batch size must not be negative', parser)
+
+  apis = [ api.strip() for api in options.api.split(',') ]
+  for api in apis:
+    if not FIXTURE_APIS.has_key(api):
+      print_usage_and_exit('Unsupported fixture API: {0}'.format(api), parser)
+    elif options.lang not in FIXTURE_APIS[api][1]:
+      print_usage_and_exit('Fixture API {0} is not supported for {1}'.format(
+        api, options.lang), parser)
+    elif options.batch_size and options.lang not in FIXTURE_APIS[api][2]:
+      print_usage_and_exit('Fixture API {0} has no batch endpoint for ' \
+                           '{1}'.format(api, options.lang), parser)
+
+  try:
+    size = parse_size(options.size)
+    parse_ratings(options.ratings)
+    parse_weights(options.licenses)
+  except ValueError as exception:
+    print_usage_and_exit(str(exception), parser)
+
+  hawkeye_utils.HOST = options.server
+  hawkeye_utils.PORT = options.port
+  hawkeye_utils.LANG = options.lang
+  hawkeye_utils.TRACE_LEVEL = hawkeye_utils.TRACE_OFF
+
+  reports = []
+  for api in apis:
+    generator = FixtureGenerator(api, size, options.seed, options.modules,
+      options.ratings, options.licenses, options.concurrency, options.start,
+      options.batch_size)
+    report = generator.run()
+    print_fixture_report(report)
+    reports.append(report)
+
+  manifest = open(options.manifest, 'w')
+  json.dump(reports, manifest, indent=2, sort_keys=True)
+  manifest.close()
+  if sum(report['errors'] for report in reports):
+    exit(1)
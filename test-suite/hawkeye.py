@@ -1,27 +1,884 @@
 #!/usr/bin/python
 
+import time
+
+# Recorded before any other module is imported, so that the startup
+# time reported in the summary covers the imports as well.
+START_TIME = time.time()
+
 import hawkeye_utils
+import importlib
+import json
 import optparse
 import os
 import sys
-from tests import datastore_tests, ndb_tests, memcache_tests, taskqueue_tests, blobstore_tests, user_tests, images_tests, secure_url_tests
 
 __author__ = 'hiranya'
 
 SUPPORTED_LANGUAGES = [ 'java', 'python' ]
 
-def init_test_suites(lang):
+DEFAULT_LOCAL_PORT = 8080
+
+DEFAULT_PROFILE_TOP = 25
+
+DEFAULT_LOAD_MIX = 'datastore_query=4,datastore_put=1,memcache_get=4,' \
+                   'memcache_set=2,taskqueue_add=1'
+
+DEFAULT_SOAK_THRESHOLD = 20.0
+
+# Default location of the results database. This must not be under
+# logs/ since it is cleared at startup.
+DEFAULT_RESULTS_DB = 'results/hawkeye.db'
+
+DEFAULT_THRESHOLD = 10.0
+
+# Suite name -> module defining the suite. Modules are only imported
+# (and their suites only built) when the suite is selected for a run.
+TEST_SUITES = {
+  'blobstore' : 'tests.blobstore_tests',
+  'datastore' : 'tests.datastore_tests',
+  'images' : 'tests.images_tests',
+  'memcache' : 'tests.memcache_tests',
+  'ndb' : 'tests.ndb_tests',
+  'secure_url' : 'tests.secure_url_tests',
+  'taskqueue' : 'tests.taskqueue_tests',
+  'users' : 'tests.user_tests',
+}
+
+BENCHMARK_SUITES = {
+  'blobstore' : 'benchmarks.blobstore_benchmarks',
+  'datastore' : 'benchmarks.datastore_benchmarks',
+  'images' : 'benchmarks.images_benchmarks',
+  'memcache' : 'benchmarks.memcache_benchmarks',
+  'ndb' : 'benchmarks.ndb_benchmarks',
+  'taskqueue' : 'benchmarks.taskqueue_benchmarks',
+}
+
+def load_suite(module_name, lang):
+  """
+  Import the specified suite module and build its suite.
+
+  Args:
+    module_name Name of the module defining the suite (see TEST_SUITES
+                and BENCHMARK_SUITES)
+    lang        Language binding to test
+
+  Returns:
+    An instance of HawkeyeTestSuite
+  """
+  return importlib.import_module(module_name).suite(lang)
+
+def parse_shard(spec):
+  """
+  Parse a shard specification of the form i/n.
+
+  Args:
+    spec  A shard specification string (eg: 2/3)
+
+  Returns:
+    A tuple of the form (index, count) where index is 1-based
+
+  Raises:
+    ValueError  If the specification is malformed or out of range
+  """
+  try:
+    index, count = [ int(part) for part in spec.split('/') ]
+  except ValueError:
+    raise ValueError('Shard must be of the form i/n: {0}'.format(spec))
+  if count < 1 or index < 1 or index > count:
+    raise ValueError('Shard index must be between 1 and the number of ' \
+                     'shards: {0}'.format(spec))
+  return index, count
+
+def assign_shards(suites, count):
+  """
+  Split the test cases of the given suites into the specified number of
+  shards. Test cases that depend on each other (see
+  hawkeye_utils.get_test_components) are always assigned to the same
+  shard, and keep their suite order. The groups of dependent test cases
+  are assigned largest first to the shard with the fewest test cases so
+  far, so every invocation that selects the same suites for the same
+  language arrives at the same split.
+
+  Args:
+    suites  A dictionary mapping suite names to HawkeyeTestSuite instances
+    count   Number of shards
+
+  Returns:
+    A list with one dictionary per shard, mapping the names of the
+    suites that have test cases in the shard to the sorted indices of
+    those test cases
+  """
+  components = []
+  for suite_name in sorted(suites.keys()):
+    for component in hawkeye_utils.get_test_components(list(
+        suites[suite_name])):
+      components.append((suite_name, component))
+  components.sort(key=lambda entry: (-len(entry[1]), entry[0], entry[1][0]))
+
+  shards = [ {} for _ in range(count) ]
+  sizes = [ 0 ] * count
+  for suite_name, component in components:
+    shard = min(range(count), key=lambda index: (sizes[index], index))
+    shards[shard].setdefault(suite_name, []).extend(component)
+    sizes[shard] += len(component)
+  for shard in shards:
+    for indices in shard.values():
+      indices.sort()
+  return shards
+
+def select_tests(suite, indices):
+  """
+  Create a copy of the given suite that only contains the test cases at
+  the specified indices.
+
+  Args:
+    suite   An instance of HawkeyeTestSuite
+    indices A sorted list of test case indices
+
+  Returns:
+    A new HawkeyeTestSuite instance
+  """
+  tests = list(suite)
+  selected = hawkeye_utils.HawkeyeTestSuite(suite.name, suite.short_name)
+  selected.addTests([ tests[index] for index in indices ])
+  return selected
+
+def run_test_suite(suite, stream=None):
+  """
+  Run the given test suite and summarize the outcome.
+
+  Args:
+    suite   An instance of HawkeyeTestSuite
+    stream  Stream to write the console output to (defaults to sys.stderr)
+
+  Returns:
+    A dictionary containing the suite name, test counts and wall time
+  """
+  start = time.time()
+  runner = hawkeye_utils.HawkeyeTestRunner(suite, stream)
+  result = runner.run_suite()
+  summary = {
+    'suite' : suite.short_name,
+    'tests' : 0,
+    'failures' : 0,
+    'errors' : 0,
+  }
+  if result is not None:
+    summary['tests'] = result.testsRun
+    summary['failures'] = len(result.failures)
+    summary['errors'] = len(result.errors)
+  summary['time'] = time.time() - start
+  return summary
+
+def run_test_suite_in_worker(args):
+  """
+  Run a single test suite in a worker process of the parallel mode.
+  HTTP traces are written to logs/{suite}-http.log (and recorded
+  requests to logs/{suite}-session.jsonl) and the console output is
+  captured and written to logs/{suite}-console.log, so that the output
+  of concurrently running suites does not get mixed up.
+
+  Args:
+    args  A tuple of the form (suite_name, lang, indices) where indices
+          lists the test cases of the suite to run (None runs all of
+          them)
+
+  Returns:
+    A suite summary as returned by run_test_suite, with the captured
+    console output and the run stats of this task added
+  """
+  import StringIO
+  suite_name, lang, indices = args
+  # Pool workers are reused, so drop what the previous task recorded
+  hawkeye_utils.reset_run_stats()
+  hawkeye_utils.TRACE_FILE = 'logs/{0}-http.log'.format(suite_name)
+  if hawkeye_utils.RECORD_FILE is not None:
+    hawkeye_utils.RECORD_FILE = 'logs/{0}-session.jsonl'.format(suite_name)
+  stream = StringIO.StringIO()
+  suite = load_suite(TEST_SUITES[suite_name], lang)
+  if indices is not None:
+    suite = select_tests(suite, indices)
+  summary = run_test_suite(suite, stream)
+  hawkeye_utils.CONNECTION_POOL.close_all()
+  hawkeye_utils.TRACER.close()
+  hawkeye_utils.RECORDER.close()
+
+  summary['output'] = stream.getvalue()
+  console_log = open('logs/{0}-console.log'.format(suite_name), 'w')
+  console_log.write(summary['output'])
+  console_log.close()
+  summary['stats'] = hawkeye_utils.get_run_stats()
+  return summary
+
+def run_test_suites_in_parallel(suite_names, lang, processes, shard=None):
+  """
+  Run the specified test suites in a pool of worker processes. The
+  console output of each suite is printed as a single block as soon
+  as the suite completes.
+
+  Args:
+    suite_names A list of suite names to execute
+    lang        Language binding to test
+    processes   Number of worker processes
+    shard       A dictionary mapping suite names to the indices of the
+                test cases to run (see assign_shards), or None to run
+                all the test cases
+
+  Returns:
+    A tuple of the form (summaries, stats) where stats are the run
+    stats merged from all the workers
+  """
+  import multiprocessing
+  pool = multiprocessing.Pool(processes)
+  summaries = []
+  stats = hawkeye_utils.get_run_stats()
+  try:
+    for summary in pool.imap_unordered(run_test_suite_in_worker,
+        [(suite_name, lang, (shard or {}).get(suite_name))
+         for suite_name in suite_names]):
+      sys.stderr.write(summary.pop('output'))
+      hawkeye_utils.merge_run_stats(stats, summary.pop('stats'))
+      summaries.append(summary)
+  finally:
+    pool.close()
+    pool.join()
+  return summaries, stats
+
+def print_summary(summaries, wall_time, startup_time):
+  print '\nSummary'
+  print '======='
+  print '{0:<16} {1:>6} {2:>9} {3:>7} {4:>10}'.format('Suite', 'Tests',
+    'Failures', 'Errors', 'Time (s)')
+  for summary in sorted(summaries, key=lambda s: s['suite']):
+    print '{0:<16} {1:>6} {2:>9} {3:>7} {4:>10.2f}'.format(summary['suite'],
+      summary['tests'], summary['failures'], summary['errors'],
+      summary['time'])
+  print 'Startup time: {0:.3f}s'.format(startup_time)
+  print 'Total wall time: {0:.2f}s'.format(wall_time)
+
+def write_shard_results(options, shard, suite_names, summaries, stats,
+                        wall_time, startup_time):
+  """
+  Write the results of a shard to logs/shard-{i}-of-{n}.json, so that
+  the results of all the shards can later be merged with
+  --merge-shards.
+
+  Args:
+    options       Parsed command line options
+    shard         A dictionary mapping suite names to the indices of the
+                  test cases run by this shard
+    suite_names   Sorted names of all the suites selected for the run
+    summaries     Suite summaries as returned by run_test_suite
+    stats         Run stats as returned by hawkeye_utils.get_run_stats
+    wall_time     Wall time of the shard in seconds
+    startup_time  Startup time of the shard in seconds
+  """
+  index, count = parse_shard(options.shard)
+  path = 'logs/shard-{0}-of-{1}.json'.format(index, count)
+  shard_log = open(path, 'w')
+  json.dump({
+    'shard' : index,
+    'shards' : count,
+    'server' : options.server,
+    'port' : options.port,
+    'lang' : options.lang,
+    'suites' : suite_names,
+    'tests' : shard,
+    'summaries' : summaries,
+    'stats' : stats,
+    'wall_time' : wall_time,
+    'startup_time' : startup_time,
+  }, shard_log, indent=2, sort_keys=True)
+  shard_log.close()
+  print '\nShard {0} of {1} results written to {2}'.format(index, count, path)
+
+def merge_shard_results(paths):
+  """
+  Merge the results written by the shards of a run. Suite summaries of
+  the same suite are combined by adding up the test counts and taking
+  the longest time, since the shards ran concurrently. Likewise the
+  wall and startup times of the merged run are those of the slowest
+  shard.
+
+  Args:
+    paths A list of paths to shard result files
+
+  Returns:
+    A dictionary containing the server, port, lang, summaries, stats,
+    wall_time and startup_time of the merged run, and the indices of
+    the shards that were missing
+
+  Raises:
+    ValueError  If the shard results do not belong to the same run
+  """
+  shards = []
+  for path in paths:
+    shard_log = open(path.strip())
+    shards.append(json.load(shard_log))
+    shard_log.close()
+
+  first = shards[0]
+  seen = set()
+  for shard in shards:
+    for key in ('shards', 'lang', 'suites'):
+      if shard[key] != first[key]:
+        raise ValueError('Shard results do not belong to the same run: ' \
+                         'mismatching {0}'.format(key))
+    if shard['shard'] in seen:
+      raise ValueError('Duplicate results for shard {0}'.format(
+        shard['shard']))
+    seen.add(shard['shard'])
+
+  summaries = {}
+  stats = None
+  for shard in shards:
+    for summary in shard['summaries']:
+      merged = summaries.get(summary['suite'])
+      if merged is None:
+        summaries[summary['suite']] = dict(summary)
+        continue
+      for key in ('tests', 'failures', 'errors'):
+        merged[key] += summary[key]
+      merged['time'] = max(merged['time'], summary['time'])
+    if stats is None:
+      stats = shard['stats']
+    else:
+      hawkeye_utils.merge_run_stats(stats, shard['stats'])
+
   return {
-    'blobstore' : blobstore_tests.suite(lang),
-    'datastore' : datastore_tests.suite(lang),
-    'images' : images_tests.suite(lang),
-    'memcache' : memcache_tests.suite(lang),
-    'ndb' : ndb_tests.suite(lang),
-    'secure_url' : secure_url_tests.suite(lang),
-    'taskqueue' : taskqueue_tests.suite(lang),
-    'users' : user_tests.suite(lang),
+    'server' : first['server'],
+    'port' : first['port'],
+    'lang' : first['lang'],
+    'summaries' : summaries.values(),
+    'stats' : stats,
+    'wall_time' : max(shard['wall_time'] for shard in shards),
+    'startup_time' : max(shard['startup_time'] for shard in shards),
+    'missing' : sorted(set(range(1, first['shards'] + 1)) - seen),
   }
 
+def print_connection_stats(stats):
+  total = stats['hits'] + stats['misses']
+  print '\nHTTP connection pool: {0} requests, {1} hits, {2} misses, ' \
+        '{3} reconnects'.format(total, stats['hits'], stats['misses'],
+    stats['reconnects'])
+
+def print_wait_stats(waits):
+  if not waits:
+    return
+  print '\nWaits'
+  print '====='
+  print '{0:<24} {1:>6} {2:>9} {3:>9} {4:>9} {5:>9}'.format('Name', 'Count',
+    'Attempts', 'Mean (s)', 'Max (s)', 'Timeouts')
+  for name in sorted(waits.keys()):
+    wait = waits[name]
+    print '{0:<24} {1:>6} {2:>9} {3:>9.3f} {4:>9.3f} {5:>9}'.format(name,
+      wait['count'], wait['attempts'], wait['total'] / wait['count'],
+      wait['max'], wait['timeouts'])
+
+def summarize_latency_stats(latency):
+  """
+  Convert the endpoint latency stats gathered during a run into a report
+  containing the count, mean, p50, p90, p99 and max of each phase (in
+  milliseconds) for each endpoint.
+
+  Args:
+    latency A list of endpoint latency stats (see hawkeye_utils.LatencyStats)
+
+  Returns:
+    A list of dictionaries sorted by path and method
+  """
+  report = []
+  for entry in latency:
+    endpoint = { 'method' : entry['method'], 'path' : entry['path'],
+                 'lang' : entry['lang'] }
+    for phase in hawkeye_utils.LatencyStats.PHASES:
+      endpoint[phase] = hawkeye_utils.LatencyHistogram.from_dict(
+        entry[phase]).summary()
+    report.append(endpoint)
+  return sorted(report, key=lambda e: (e['path'], e['method']))
+
+def write_latency_report(report):
+  latency_log = open('logs/latency.json', 'w')
+  json.dump(report, latency_log, indent=2, sort_keys=True)
+  latency_log.close()
+
+def print_latency_report(report):
+  if not report:
+    return
+  print '\nLatency (ms)'
+  print '============'
+  print '{0:<7} {1:<44} {2:>6} {3:>8} {4:>8} {5:>8} {6:>8}'.format('Method',
+    'Path', 'Count', 'p50', 'p90', 'p99', 'Max')
+  for endpoint in report:
+    total = endpoint['total']
+    print '{0:<7} {1:<44} {2:>6} {3:>8.1f} {4:>8.1f} {5:>8.1f} {6:>8.1f}'.\
+      format(endpoint['method'], endpoint['path'], total['count'],
+      total['p50'], total['p90'], total['p99'], total['max'])
+
+def write_profile_report(tests, top):
+  """
+  Merge the profiles of the given test cases and write the top hot
+  functions, by own time and by cumulative time, to logs/profile.txt.
+  The per test case timings are written to logs/profile.json.
+
+  Args:
+    tests A list of profiled test case timings (see TestProfiler)
+    top   Number of functions to include in each listing
+  """
+  import pstats
+  profile_log = open('logs/profile.json', 'w')
+  json.dump(tests, profile_log, indent=2, sort_keys=True)
+  profile_log.close()
+  if not tests:
+    return
+
+  report = open('logs/profile.txt', 'w')
+  stats = pstats.Stats(*[ test['profile_file'] for test in tests ],
+    stream=report)
+  stats.strip_dirs()
+  stats.sort_stats('time').print_stats(top)
+  stats.sort_stats('cumulative').print_stats(top)
+  report.close()
+
+def print_profile_report(tests, top):
+  if not tests:
+    return
+  print '\nProfile (slowest {0} test cases, times in s)'.format(
+    min(top, len(tests)))
+  print '============================================'
+  print '{0:<56} {1:>8} {2:>8} {3:>8} {4:>8}'.format('Test', 'Wall',
+    'Network', 'Wait', 'Local')
+  for test in sorted(tests, key=lambda t: t['wall'], reverse=True)[:top]:
+    print '{0:<56} {1:>8.3f} {2:>8.3f} {3:>8.3f} {4:>8.3f}'.format(
+      test['test'], test['wall'], test['network'], test['wait'],
+      test['local'])
+  network = sum(test['network'] for test in tests)
+  wait = sum(test['wait'] for test in tests)
+  local = sum(test['local'] for test in tests)
+  print 'Total: {0:.3f}s network, {1:.3f}s wait, {2:.3f}s local ' \
+        '(hot functions in logs/profile.txt)'.format(network, wait, local)
+
+def report_profile(tests, top):
+  write_profile_report(tests, top)
+  print_profile_report(tests, top)
+
+def run_load(mix, options):
+  """
+  Generate load on the target server as specified by the command line
+  options, then print the load report and write it to logs/load.json.
+
+  Args:
+    mix     A list of (operation name, weight) tuples
+    options Parsed command line options
+
+  Returns:
+    The load report (see LoadGenerator.get_report)
+  """
+  import load_generator
+  generator = load_generator.LoadGenerator(mix, options.load_duration,
+    options.load_rate, options.load_concurrency, options.load_seed)
+  report = generator.run()
+  hawkeye_utils.TRACER.close()
+  hawkeye_utils.RECORDER.close()
+
+  load_log = open('logs/load.json', 'w')
+  json.dump(report, load_log, indent=2, sort_keys=True)
+  load_log.close()
+  load_generator.print_load_report(report)
+  print_connection_stats(hawkeye_utils.CONNECTION_POOL.get_stats())
+  return report
+
+def parse_targets(spec):
+  """
+  Parse a target specification of the form host1:port1,host2:port2.
+
+  Args:
+    spec  A target specification string
+
+  Returns:
+    A list of (host, port) tuples
+
+  Raises:
+    ValueError  If the specification is malformed or lists a target
+                more than once
+  """
+  targets = []
+  for entry in spec.split(','):
+    host, separator, port = entry.strip().rpartition(':')
+    if not separator or not host or not port.isdigit():
+      raise ValueError('Target must be of the form host:port: {0}'.format(
+        entry))
+    if (host, int(port)) in targets:
+      raise ValueError('Duplicate target: {0}'.format(entry))
+    targets.append((host, int(port)))
+  return targets
+
+def run_target_in_worker(args):
+  """
+  Run the workload of a fan-out run against a single target in a worker
+  process. HTTP traces are written to logs/{host}_{port}-http.log,
+  recorded requests to logs/{host}_{port}-session.jsonl and the console
+  output to logs/{host}_{port}-console.log.
+
+  Args:
+    args  A tuple of the form (target, suite_names, lang, load) where
+          target is a (host, port) tuple and load holds the arguments
+          of a LoadGenerator, or is None to run the suites instead
+
+  Returns:
+    A dictionary containing the target, the wall time of the workload,
+    the suite summaries or the load report, and the run stats of the
+    worker
+  """
+  import load_generator
+  import StringIO
+  (host, port), suite_names, lang, load = args
+  # Pool workers are reused, so drop what the previous task recorded
+  hawkeye_utils.reset_run_stats()
+  hawkeye_utils.HOST = host
+  hawkeye_utils.PORT = port
+  name = '{0}_{1}'.format(host, port)
+  hawkeye_utils.TRACE_FILE = 'logs/{0}-http.log'.format(name)
+  if hawkeye_utils.RECORD_FILE is not None:
+    hawkeye_utils.RECORD_FILE = 'logs/{0}-session.jsonl'.format(name)
+  stream = StringIO.StringIO()
+  summaries = []
+  report = None
+  start = time.time()
+  if load is not None:
+    report = load_generator.LoadGenerator(*load).run()
+  else:
+    for suite_name in suite_names:
+      summaries.append(run_test_suite(load_suite(TEST_SUITES[suite_name],
+        lang), stream))
+  elapsed = time.time() - start
+  hawkeye_utils.CONNECTION_POOL.close_all()
+  hawkeye_utils.TRACER.close()
+  hawkeye_utils.RECORDER.close()
+
+  console_log = open('logs/{0}-console.log'.format(name), 'w')
+  console_log.write(stream.getvalue())
+  console_log.close()
+  return {
+    'target' : '{0}:{1}'.format(host, port),
+    'elapsed' : elapsed,
+    'summaries' : summaries,
+    'load' : report,
+    'stats' : hawkeye_utils.get_run_stats(),
+  }
+
+def run_targets(targets, suite_names, load_mix, options):
+  """
+  Run the same workload against each of the given targets at the same
+  time, one worker process per target, then print the per target
+  results side by side and write them to logs/targets.json. The results
+  of each target are saved to the results store as a separate run, and
+  compared against a baseline run against that same target.
+
+  Args:
+    targets     A list of (host, port) tuples
+    suite_names A list of suite names to execute against each target
+    load_mix    A list of (operation name, weight) tuples if load should
+                be generated instead of running the suites, or None
+    options     Parsed command line options
+
+  Returns:
+    Exit status of the run (see save_and_compare)
+  """
+  import copy
+  import multiprocessing
+  import results_store
+  load = None
+  mode = 'tests'
+  if load_mix is not None:
+    load = (load_mix, options.load_duration, options.load_rate,
+            options.load_concurrency, options.load_seed)
+    mode = 'load'
+
+  pool = multiprocessing.Pool(len(targets))
+  try:
+    results = pool.map(run_target_in_worker, [ (target, suite_names,
+      options.lang, load) for target in targets ])
+  finally:
+    pool.close()
+    pool.join()
+
+  for result in results:
+    stats = result.pop('stats')
+    result['latency'] = hawkeye_utils.get_total_latency(
+      stats['latency']).summary()
+    result['endpoints'] = summarize_latency_stats(stats['latency'])
+    result['throughput'] = result['latency']['count'] / result['elapsed']
+    if result['load'] is not None:
+      result['failed'] = result['load']['errors']
+    else:
+      result['failed'] = sum(summary['failures'] + summary['errors']
+                             for summary in result['summaries'])
+
+  targets_log = open('logs/targets.json', 'w')
+  json.dump(results, targets_log, indent=2, sort_keys=True)
+  targets_log.close()
+  print_target_report(results)
+
+  status = 0
+  for (host, port), result in zip(targets, results):
+    target_options = copy.copy(options)
+    target_options.server = host
+    target_options.port = port
+    if result['load'] is not None:
+      rows = results_store.get_load_rows(result['load'])
+    else:
+      rows = results_store.get_endpoint_rows(result['endpoints'])
+    status = max(status, save_and_compare(rows, mode, target_options))
+  return status
+
+def print_target_report(results):
+  print '\nTargets (latency of all HTTP calls in ms)'
+  print '========================================='
+  print '{0:<28} {1:>8} {2:>6} {3:>9} {4:>8} {5:>8} {6:>8} {7:>8}'.format(
+    'Target', 'Requests', 'Failed', 'Req/s', 'p50', 'p90', 'p99', 'Max')
+  for result in results:
+    latency = result['latency']
+    print '{0:<28} {1:>8} {2:>6} {3:>9.1f} {4:>8.1f} {5:>8.1f} {6:>8.1f} ' \
+          '{7:>8.1f}'.format(result['target'], latency['count'],
+      result['failed'], result['throughput'], latency['p50'], latency['p90'],
+      latency['p99'], latency['max'])
+
+  endpoints = {}
+  for result in results:
+    for endpoint in result['endpoints']:
+      key = (endpoint['path'], endpoint['method'])
+      endpoints.setdefault(key, {})[result['target']] = endpoint['total']
+  print '\nEndpoint p50/p99 by target (ms)'
+  print '==============================='
+  print '{0:<7} {1:<44} '.format('Method', 'Path') + ' '.join(
+    '{0:>15}'.format(result['target'][-15:]) for result in results)
+  for path, method in sorted(endpoints.keys()):
+    columns = []
+    for result in results:
+      total = endpoints[(path, method)].get(result['target'])
+      if total is None:
+        columns.append('{0:>15}'.format('-'))
+      else:
+        columns.append('{0:>15}'.format('{0:.1f}/{1:.1f}'.format(
+          total['p50'], total['p99'])))
+    print '{0:<7} {1:<44} '.format(method, path) + ' '.join(columns)
+
+  slowest = max(results, key=lambda result: result['latency']['p99'])
+  fastest = min(results, key=lambda result: result['latency']['p99'])
+  if len(results) > 1 and fastest['latency']['p99'] > 0:
+    print 'Slowest target by p99: {0} ({1:.1f}x {2})'.format(
+      slowest['target'], slowest['latency']['p99'] /
+      fastest['latency']['p99'], fastest['target'])
+
+def run_replay(requests, skipped, options):
+  """
+  Replay a recorded session against the target server as specified by
+  the command line options, then print the replay report and write it
+  to logs/replay.json.
+
+  Args:
+    requests  A list of recorded requests (see load_generator.load_session)
+    skipped   Number of recorded requests that cannot be replayed
+    options   Parsed command line options
+
+  Returns:
+    The replay report (see LoadGenerator.get_report)
+  """
+  import load_generator
+  replayer = load_generator.SessionReplayer(requests, options.replay_speed,
+    options.replay_concurrency)
+  report = replayer.run()
+  report['skipped'] = skipped
+  hawkeye_utils.TRACER.close()
+  hawkeye_utils.RECORDER.close()
+
+  replay_log = open('logs/replay.json', 'w')
+  json.dump(report, replay_log, indent=2, sort_keys=True)
+  replay_log.close()
+  load_generator.print_load_report(report)
+  if skipped:
+    print 'Skipped {0} recorded requests with streamed payloads'.format(
+      skipped)
+  print_connection_stats(hawkeye_utils.CONNECTION_POOL.get_stats())
+  return report
+
+def run_benchmarks(suite_names, lang):
+  """
+  Run the specified benchmark suites one after the other, so that
+  benchmarks do not compete with each other for server resources. The
+  results are printed and written to logs/benchmarks.json.
+
+  Args:
+    suite_names A list of benchmark suite names to execute
+    lang        Language binding to benchmark
+
+  Returns:
+    A tuple of the form (summaries, results) where summaries are the
+    suite summaries as returned by run_test_suite
+  """
+  summaries = []
+  results = []
+  for suite_name in suite_names:
+    suite = load_suite(BENCHMARK_SUITES[suite_name], lang)
+    summaries.append(run_test_suite(suite))
+    results.extend(hawkeye_utils.get_benchmark_results(suite))
+  hawkeye_utils.CONNECTION_POOL.close_all()
+  hawkeye_utils.TRACER.close()
+  hawkeye_utils.RECORDER.close()
+
+  report = {
+    'schema_version' : hawkeye_utils.BENCHMARK_SCHEMA_VERSION,
+    'server' : '{0}:{1}'.format(hawkeye_utils.HOST, hawkeye_utils.PORT),
+    'lang' : lang,
+    'time' : time.time(),
+    'results' : results,
+  }
+  bench_log = open('logs/benchmarks.json', 'w')
+  json.dump(report, bench_log, indent=2, sort_keys=True)
+  bench_log.close()
+  print_benchmark_results(results)
+  return summaries, results
+
+def run_soak(suite_names, options):
+  """
+  Run the specified test suites in a loop as specified by the command
+  line options, then print the drift report and write it to
+  logs/soak.json.
+
+  Args:
+    suite_names A list of suite names to execute in each iteration
+    options     Parsed command line options
+
+  Returns:
+    Exit status of the run: 1 if any metric drifted upwards or the
+    comparison against a baseline found regressions, and 0 otherwise
+  """
+  import results_store
+  import soak
+
+  def run_suites(stream):
+    return [ run_test_suite(load_suite(TEST_SUITES[suite_name],
+      options.lang), stream) for suite_name in suite_names ]
+
+  runner = soak.SoakRunner(run_suites, options.soak_iterations,
+    options.soak_duration, options.soak_interval, options.soak_threshold)
+  soak.print_soak_header()
+  report = runner.run()
+  soak.print_soak_report(report)
+  latency_report = summarize_latency_stats(runner.get_latency_stats())
+  write_latency_report(latency_report)
+  print_latency_report(latency_report)
+  status = save_and_compare(results_store.get_endpoint_rows(latency_report),
+    'soak', options)
+  if report['drifting']:
+    return 1
+  return status
+
+def format_params(params):
+  return ','.join('{0}={1}'.format(name, params[name])
+    for name in sorted(params.keys()))
+
+def print_benchmark_results(results):
+  if not results:
+    return
+  print '\nBenchmarks (latency of an iteration in ms)'
+  print '=========================================='
+  print '{0:<22} {1:<24} {2:>6} {3:>10} {4:>8} {5:>8} {6:>8} {7:>8}'.format(
+    'Benchmark', 'Params', 'Iters', 'Ops/s', 'p50', 'p90', 'p99', 'Max')
+  for result in results:
+    latency = result['latency']
+    print '{0:<22} {1:<24} {2:>6} {3:>10.1f} {4:>8.1f} {5:>8.1f} {6:>8.1f} ' \
+          '{7:>8.1f}'.format(result['benchmark'],
+      format_params(result['params']), result['iterations'],
+      result['throughput'], latency['p50'], latency['p90'], latency['p99'],
+      latency['max'])
+
+  scans = [ result for result in results if result.get('scan') ]
+  if scans:
+    print '\nCursor Scans (as measured by the server, page latency in ms)'
+    print '=' * 60
+    print '{0:<22} {1:>9} {2:>8} {3:>6} {4:>10} {5:>8} {6:>8} {7:>10} ' \
+          '{8:>10}'.format('Benchmark', 'Page size', 'Entities', 'Pages',
+      'Entities/s', 'p50', 'p99', 'Encode us', 'Decode us')
+    for result in scans:
+      scan = result['scan']
+      print '{0:<22} {1:>9} {2:>8} {3:>6} {4:>10.1f} {5:>8.2f} {6:>8.2f} ' \
+            '{7:>10.1f} {8:>10.1f}'.format(result['benchmark'],
+        scan['page_size'], scan['entities'], scan['pages'],
+        scan['entities_per_second'], scan['page_latency']['p50'],
+        scan['page_latency']['p99'], scan['cursor_encode_us'],
+        scan['cursor_decode_us'])
+
+def report_test_results(summaries, stats, wall_time, startup_time, options):
+  """
+  Print the outcome of a test run and save its timing results.
+
+  Args:
+    summaries     Suite summaries as returned by run_test_suite
+    stats         Run stats as returned by hawkeye_utils.get_run_stats
+    wall_time     Wall time of the run in seconds
+    startup_time  Startup time of the run in seconds
+    options       Parsed command line options
+
+  Returns:
+    Exit status of the run (see save_and_compare)
+  """
+  import results_store
+  print_summary(summaries, wall_time, startup_time)
+  print_connection_stats(stats['pool'])
+  print_wait_stats(stats['waits'])
+  latency_report = summarize_latency_stats(stats['latency'])
+  write_latency_report(latency_report)
+  print_latency_report(latency_report)
+  if options.profile:
+    report_profile(stats['profile'], options.profile_top)
+  return save_and_compare(results_store.get_endpoint_rows(latency_report),
+    'tests', options)
+
+def save_and_compare(rows, mode, options):
+  """
+  Save the timing results of this run to the results store and, if
+  requested, compare them against a baseline run.
+
+  Args:
+    rows    A list of (kind, name, latency summary) tuples
+    mode    Kind of run (eg: tests, bench, load)
+    options Parsed command line options
+
+  Returns:
+    Exit status of the run: 1 if the comparison found regressions, or
+    could not be made because no matching baseline run has results in
+    common with this run, and 0 otherwise
+  """
+  import results_store
+  store = results_store.ResultsStore(options.results_db)
+  try:
+    server = '{0}:{1}'.format(options.server, options.port)
+    revision = options.revision or results_store.get_revision()
+    run_id = store.save_run(server, options.lang, revision, mode, rows)
+    print '\nSaved results as run #{0} (revision {1}) in {2}'.format(run_id,
+      revision, options.results_db)
+    if options.compare is None:
+      return 0
+
+    baseline = store.find_run(options.compare, server, options.lang, mode,
+      run_id)
+    if baseline is None:
+      print 'Baseline run {0} not found for {1} ({2} {3} run)'.format(
+        options.compare, server, options.lang, mode)
+      return 1
+    compared, regressions = store.compare(baseline['id'], run_id,
+      options.threshold)
+    results_store.print_regressions(baseline, compared, regressions,
+      options.threshold)
+    if not compared or regressions:
+      return 1
+    return 0
+  finally:
+    store.close()
+
 def print_usage_and_exit(msg, parser):
   print msg
   parser.print_help()
@@ -45,8 +902,154 @@ if __name__ == '__main__':
     dest='suites', help='A comma separated list of suites to run')
   parser.add_option('--exclude-suites', action='store', type='string',
     dest='exclude_suites', help='A comma separated list of suites to exclude')
+  parser.add_option('--trace', action='store', type='choice',
+    choices=hawkeye_utils.TRACE_LEVELS, dest='trace',
+    help='HTTP trace level: off, headers or full (defaults to full)')
+  parser.add_option('--trace-body-limit', action='store', type='int',
+    dest='trace_body_limit',
+    help='Maximum number of body bytes to trace per request ' \
+         '(defaults to 65536, 0 means unlimited)')
+  parser.add_option('--parallel', action='store', type='int',
+    dest='parallel', help='Run the suites in N parallel processes')
+  parser.add_option('--workers', action='store', type='int',
+    dest='workers', help='Number of threads used to run independent ' \
+                         'tests of a suite concurrently (defaults to 1)')
+  parser.add_option('--load', action='store_true', dest='load',
+    help='Generate load on the target server instead of running the suites')
+  parser.add_option('--load-mix', action='store', type='string',
+    dest='load_mix', default=DEFAULT_LOAD_MIX,
+    help='Weighted mix of load operations (defaults to {0})'.format(
+      DEFAULT_LOAD_MIX))
+  parser.add_option('--load-rate', action='store', type='float',
+    dest='load_rate', help='Target request rate per second. If not set ' \
+                           'the load is generated in a closed loop')
+  parser.add_option('--load-concurrency', action='store', type='int',
+    dest='load_concurrency', default=16,
+    help='Maximum number of concurrent load requests (defaults to 16)')
+  parser.add_option('--load-duration', action='store', type='float',
+    dest='load_duration', default=60,
+    help='Number of seconds to generate load for (defaults to 60)')
+  parser.add_option('--load-seed', action='store', type='int',
+    dest='load_seed', help='Seed for the random choice of load operations')
+  parser.add_option('--bench', action='store', type='string', dest='bench',
+    help='Run the given comma separated list of benchmark suites (or all) ' \
+         'instead of the test suites')
+  parser.add_option('--bench-warmup', action='store', type='int',
+    dest='bench_warmup', help='Override the number of warmup iterations ' \
+                              'of every benchmark')
+  parser.add_option('--bench-iterations', action='store', type='int',
+    dest='bench_iterations', help='Override the number of measured ' \
+                                  'iterations of every benchmark')
+  parser.add_option('--fixtures', action='store', type='string',
+    dest='fixtures', help='Manifest written by fixtures.py for a dataset ' \
+                          'already loaded on the server. The datastore ' \
+                          'tests and benchmarks then leave the dataset in ' \
+                          'place and account for it in their results')
+  parser.add_option('--soak', action='store_true', dest='soak',
+    help='Run the selected suites in a loop and check latency, failure ' \
+         'rate, memory and task queue backlog for upward drift. HTTP ' \
+         'tracing is off in this mode unless --trace is given')
+  parser.add_option('--soak-iterations', action='store', type='int',
+    dest='soak_iterations', help='Number of soak iterations to run')
+  parser.add_option('--soak-duration', action='store', type='float',
+    dest='soak_duration', help='Number of seconds to soak for. Without ' \
+                               'this or --soak-iterations the soak test ' \
+                               'runs until interrupted')
+  parser.add_option('--soak-interval', action='store', type='float',
+    dest='soak_interval', default=0,
+    help='Number of seconds to pause between soak iterations')
+  parser.add_option('--soak-threshold', action='store', type='float',
+    dest='soak_threshold', default=DEFAULT_SOAK_THRESHOLD,
+    help='Percentage by which a metric may grow over a soak run before ' \
+         'it is reported as drifting (defaults to {0})'.format(
+      DEFAULT_SOAK_THRESHOLD))
+  parser.add_option('--results-db', action='store', type='string',
+    dest='results_db', default=DEFAULT_RESULTS_DB,
+    help='SQLite database the timing results are saved to (defaults ' \
+         'to {0})'.format(DEFAULT_RESULTS_DB))
+  parser.add_option('--revision', action='store', type='string',
+    dest='revision', help='Revision to key the results of this run by ' \
+                          '(defaults to the git revision of Hawkeye)')
+  parser.add_option('--compare', action='store', type='string',
+    dest='compare', help='Compare the results against a baseline run, ' \
+                         'given as a run ID prefixed with # (eg: #12) or ' \
+                         'a revision, and exit with a non-zero status on ' \
+                         'regressions')
+  parser.add_option('--threshold', action='store', type='float',
+    dest='threshold', default=DEFAULT_THRESHOLD,
+    help='Percentage by which p50 or p99 latency may grow before it is ' \
+         'reported as a regression (defaults to {0})'.format(
+      DEFAULT_THRESHOLD))
+  parser.add_option('--profile', action='store_true', dest='profile',
+    help='Run each test case under cProfile and report the hot functions ' \
+         'along with the network, wait and local time of each test case')
+  parser.add_option('--profile-top', action='store', type='int',
+    dest='profile_top', default=DEFAULT_PROFILE_TOP,
+    help='Number of test cases and functions to include in the profile ' \
+         'report (defaults to {0})'.format(DEFAULT_PROFILE_TOP))
+  parser.add_option('--shard', action='store', type='string', dest='shard',
+    help='Only run shard i of n (given as i/n) of the selected test ' \
+         'cases. Results are written to logs/shard-i-of-n.json')
+  parser.add_option('--merge-shards', action='store', type='string',
+    dest='merge_shards', help='Merge and report the comma separated list ' \
+                              'of shard result files instead of running ' \
+                              'any tests')
+  parser.add_option('--targets', action='store', type='string',
+    dest='targets', help='Run the suites (or the load) against each of ' \
+                         'the comma separated list of host:port targets ' \
+                         'at the same time and compare them side by side')
+  parser.add_option('--record', action='store_true', dest='record',
+    help='Record every request in a replayable form to ' \
+         'logs/session.jsonl (one file per worker in parallel mode)')
+  parser.add_option('--replay', action='store', type='string',
+    dest='replay', help='Replay the comma separated list of recorded ' \
+                        'session files against the target server instead ' \
+                        'of running the suites')
+  parser.add_option('--replay-speed', action='store', type='float',
+    dest='replay_speed', default=1.0,
+    help='Factor by which the replayed session is sped up (defaults to 1)')
+  parser.add_option('--replay-concurrency', action='store', type='int',
+    dest='replay_concurrency', default=16,
+    help='Maximum number of concurrent replayed requests (defaults to 16)')
+  parser.add_option('--local', action='store_true', dest='local',
+    help='Run against an in-memory stand-in of the Python app served ' \
+         'by this process (server defaults to 127.0.0.1 and port ' \
+         'to {0})'.format(DEFAULT_LOCAL_PORT))
+  parser.add_option('--local-certfile', action='store', type='string',
+    dest='local_certfile', help='PEM certificate and key used to serve ' \
+                                'HTTPS in local mode')
   (options, args) = parser.parse_args(sys.argv[1:])
 
+  if options.merge_shards is not None:
+    try:
+      merged = merge_shard_results(options.merge_shards.split(','))
+    except (IOError, ValueError) as exception:
+      print_usage_and_exit(str(exception), parser)
+    if merged['missing']:
+      print 'Warning: no results for shard(s) {0}'.format(
+        ', '.join(str(index) for index in merged['missing']))
+    options.server = merged['server']
+    options.port = merged['port']
+    options.lang = merged['lang']
+    if not os.path.exists('logs'):
+      os.makedirs('logs')
+    sys.exit(report_test_results(merged['summaries'], merged['stats'],
+      merged['wall_time'], merged['startup_time'], options))
+
+  targets = None
+  if options.targets is not None:
+    try:
+      targets = parse_targets(options.targets)
+    except ValueError as exception:
+      print_usage_and_exit(str(exception), parser)
+    options.server, options.port = targets[0]
+
+  if options.local:
+    if options.server is None:
+      options.server = '127.0.0.1'
+    if options.port is None:
+      options.port = DEFAULT_LOCAL_PORT
+
   if options.server is None:
     print_usage_and_exit('Target server name not specified', parser)
   elif options.port is None:
@@ -54,9 +1057,95 @@ if __name__ == '__main__':
   elif options.lang is not None and options.lang not in SUPPORTED_LANGUAGES:
     print_usage_and_exit('Unsupported language. Must be one of: {0}'.
       format(SUPPORTED_LANGUAGES), parser)
+  elif options.parallel is not None and options.parallel < 1:
+    print_usage_and_exit('Number of parallel processes must be positive',
+      parser)
+  elif options.workers is not None and options.workers < 1:
+    print_usage_and_exit('Number of workers must be positive', parser)
+  elif options.load_rate is not None and options.load_rate <= 0:
+    print_usage_and_exit('Load rate must be positive', parser)
+  elif options.load_concurrency < 1:
+    print_usage_and_exit('Load concurrency must be positive', parser)
+  elif options.bench_warmup is not None and options.bench_warmup < 0:
+    print_usage_and_exit('Number of warmup iterations must not be negative',
+      parser)
+  elif options.bench_iterations is not None and options.bench_iterations < 1:
+    print_usage_and_exit('Number of benchmark iterations must be positive',
+      parser)
+  elif options.profile_top < 1:
+    print_usage_and_exit('Profile report size must be positive', parser)
+  elif options.shard is not None and (options.load or
+                                      options.bench is not None):
+    print_usage_and_exit('Shards can only be used to run test suites',
+      parser)
+  elif options.soak and (options.load or options.bench is not None or
+                        options.shard is not None or
+                        options.parallel is not None):
+    print_usage_and_exit('Soak mode cannot be combined with load, ' \
+                         'benchmark, shard or parallel mode', parser)
+  elif targets is not None and (options.local or options.soak or
+                               options.bench is not None or
+                               options.shard is not None or
+                               options.parallel is not None):
+    print_usage_and_exit('Targets can only be used to run the test ' \
+                         'suites or load', parser)
+  elif options.replay is not None and (options.load or options.soak or
+                                      options.bench is not None or
+                                      options.shard is not None or
+                                      targets is not None or
+                                      options.parallel is not None):
+    print_usage_and_exit('Replay cannot be combined with load, soak, ' \
+                         'benchmark, shard, target or parallel mode', parser)
+  elif options.replay_speed <= 0:
+    print_usage_and_exit('Replay speed must be positive', parser)
+  elif options.replay_concurrency < 1:
+    print_usage_and_exit('Replay concurrency must be positive', parser)
+  elif options.soak_iterations is not None and options.soak_iterations < 1:
+    print_usage_and_exit('Number of soak iterations must be positive',
+      parser)
+  elif options.soak_duration is not None and options.soak_duration <= 0:
+    print_usage_and_exit('Soak duration must be positive', parser)
+  elif options.soak_interval < 0:
+    print_usage_and_exit('Soak interval must not be negative', parser)
+  elif options.threshold < 0:
+    print_usage_and_exit('Regression threshold must not be negative', parser)
+  elif options.local and options.lang not in (None, 'python'):
+    print_usage_and_exit('Local mode only supports the python binding',
+      parser)
   elif options.lang is None:
     options.lang = 'python'
 
+  shard_index = None
+  if options.shard is not None:
+    try:
+      shard_index, shard_count = parse_shard(options.shard)
+    except ValueError as exception:
+      print_usage_and_exit(str(exception), parser)
+
+  if options.load:
+    import load_generator
+    try:
+      load_mix = load_generator.parse_mix(options.load_mix, options.lang)
+    except ValueError as exception:
+      print_usage_and_exit(str(exception), parser)
+
+  # Loaded before the logs directory is cleared, since the session may
+  # have been recorded there
+  if options.replay is not None:
+    import load_generator
+    try:
+      replay_requests, replay_skipped = load_generator.load_session(
+        options.replay.split(','))
+    except (IOError, ValueError) as exception:
+      print_usage_and_exit(str(exception), parser)
+
+  if options.fixtures is not None:
+    try:
+      hawkeye_utils.FIXTURES = hawkeye_utils.load_fixtures(options.fixtures,
+        options.lang)
+    except (IOError, ValueError) as exception:
+      print_usage_and_exit(str(exception), parser)
+
   suite_names = ['all']
   exclude_suites = []
   if options.suites is not None:
@@ -64,10 +1153,14 @@ if __name__ == '__main__':
   if options.exclude_suites is not None:
     exclude_suites = options.exclude_suites.split(',')
 
-  if options.user is not None:
-    user_tests.USER_EMAIL = options.user
-  if options.password is not None:
-    user_tests.USER_PASSWORD = options.password
+  if options.user is not None or options.password is not None:
+    # Imported here (before any worker process is forked) so that the
+    # credentials are also seen by the suites run in parallel mode
+    from tests import user_tests
+    if options.user is not None:
+      user_tests.USER_EMAIL = options.user
+    if options.password is not None:
+      user_tests.USER_PASSWORD = options.password
 
   hawkeye_utils.HOST = options.server
   hawkeye_utils.PORT = options.port
@@ -76,30 +1169,87 @@ if __name__ == '__main__':
   if options.console:
     hawkeye_utils.CONSOLE_MODE = True
 
-  suites = {}
-  TEST_SUITES = init_test_suites(options.lang)
+  if options.workers is not None:
+    hawkeye_utils.TEST_WORKERS = options.workers
+
+  hawkeye_utils.BENCHMARK_WARMUP = options.bench_warmup
+  hawkeye_utils.BENCHMARK_ITERATIONS = options.bench_iterations
+
+  if options.profile:
+    hawkeye_utils.PROFILE = True
+
+  if options.record:
+    hawkeye_utils.RECORD_FILE = 'logs/session.jsonl'
+
+  if options.trace is not None:
+    hawkeye_utils.TRACE_LEVEL = options.trace
+  elif options.soak:
+    hawkeye_utils.TRACE_LEVEL = hawkeye_utils.TRACE_OFF
+  if options.trace_body_limit is not None:
+    if options.trace_body_limit > 0:
+      hawkeye_utils.TRACE_BODY_LIMIT = options.trace_body_limit
+    else:
+      hawkeye_utils.TRACE_BODY_LIMIT = None
+
+  if options.local:
+    import local_server
+
+  selected = set()
   for suite_name in suite_names:
     suite_name = suite_name.strip()
     if suite_name == 'all':
-      suites = TEST_SUITES
+      selected = set(TEST_SUITES.keys())
       break
     elif TEST_SUITES.has_key(suite_name):
-      suites[suite_name] = TEST_SUITES[suite_name]
+      selected.add(suite_name)
     else:
       print_usage_and_exit('Unsupported test suite: {0}'.
         format(suite_name), parser)
 
   for exclude_suite in exclude_suites:
     exclude_suite = exclude_suite.strip()
-    if suites.has_key(exclude_suite):
-      del(suites[exclude_suite])
+    if exclude_suite in selected:
+      selected.remove(exclude_suite)
     elif not TEST_SUITES.has_key(exclude_suite):
       print_usage_and_exit('Unsupported test suite: {0}'.
         format(exclude_suite), parser)
 
-  if not suites:
+  if options.local:
+    unsupported = list(local_server.UNSUPPORTED_SUITES)
+    if options.local_certfile is None:
+      unsupported.append('secure_url')
+    for suite_name in unsupported:
+      if suite_name in selected:
+        print 'Skipping the {0} suite, which is not supported in local ' \
+              'mode'.format(suite_name)
+        selected.remove(suite_name)
+
+  if not selected:
     print_usage_and_exit('Must specify at least one suite to execute', parser)
 
+  benchmark_names = []
+  if options.bench is not None:
+    for benchmark_name in options.bench.split(','):
+      benchmark_name = benchmark_name.strip()
+      if benchmark_name == 'all':
+        benchmark_names = sorted(BENCHMARK_SUITES.keys())
+        break
+      elif BENCHMARK_SUITES.has_key(benchmark_name):
+        benchmark_names.append(benchmark_name)
+      else:
+        print_usage_and_exit('Unsupported benchmark suite: {0}'.
+          format(benchmark_name), parser)
+
+    if options.local:
+      for benchmark_name in local_server.UNSUPPORTED_SUITES:
+        if benchmark_name in benchmark_names:
+          print 'Skipping the {0} benchmark suite, which is not supported ' \
+                'in local mode'.format(benchmark_name)
+          benchmark_names.remove(benchmark_name)
+    if not benchmark_names:
+      print_usage_and_exit('Must specify at least one benchmark suite to ' \
+                           'execute', parser)
+
   if not os.path.exists('logs'):
     os.makedirs('logs')
 
@@ -108,6 +1258,78 @@ if __name__ == '__main__':
     if os.path.isfile(file_path):
       os.unlink(file_path)
 
-  for suite in suites.values():
-    runner = hawkeye_utils.HawkeyeTestRunner(suite)
-    runner.run_suite()
+  if options.local:
+    server = local_server.LocalServer(options.server, options.port,
+      options.port - hawkeye_utils.SSL_PORT_OFFSET, options.local_certfile)
+    server.start()
+
+  if targets is not None:
+    if not options.load:
+      load_mix = None
+    sys.exit(run_targets(targets, sorted(selected), load_mix, options))
+
+  # Every mode saves its timing results to the results store
+  import results_store
+
+  if options.replay is not None:
+    report = run_replay(replay_requests, replay_skipped, options)
+    sys.exit(save_and_compare(results_store.get_load_rows(report), 'replay',
+      options))
+
+  if options.load:
+    report = run_load(load_mix, options)
+    sys.exit(save_and_compare(results_store.get_load_rows(report), 'load',
+      options))
+
+  if benchmark_names:
+    start = time.time()
+    summaries, results = run_benchmarks(benchmark_names, options.lang)
+    print_summary(summaries, time.time() - start, start - START_TIME)
+    if options.profile:
+      report_profile(hawkeye_utils.PROFILER.get_stats(), options.profile_top)
+    sys.exit(save_and_compare(results_store.get_benchmark_rows(results),
+      'bench', options))
+
+  if options.soak:
+    sys.exit(run_soak(sorted(selected), options))
+
+  suites = None
+  shard = None
+  if shard_index is not None:
+    suites = dict((suite_name, load_suite(TEST_SUITES[suite_name],
+      options.lang)) for suite_name in selected)
+    shard = assign_shards(suites, shard_count)[shard_index - 1]
+    print 'Running shard {0} of {1}: {2} test cases'.format(shard_index,
+      shard_count, sum(len(indices) for indices in shard.values()))
+
+  suite_names = sorted(selected)
+  if shard is not None:
+    suite_names = sorted(shard.keys())
+
+  if options.parallel is not None:
+    # Suites are built by the worker processes
+    start = time.time()
+    summaries, stats = run_test_suites_in_parallel(suite_names,
+      options.lang, options.parallel, shard)
+  else:
+    if suites is None:
+      suites = dict((suite_name, load_suite(TEST_SUITES[suite_name],
+        options.lang)) for suite_name in suite_names)
+    if shard is not None:
+      for suite_name, indices in shard.items():
+        suites[suite_name] = select_tests(suites[suite_name], indices)
+    start = time.time()
+    summaries = []
+    for suite_name in suite_names:
+      summaries.append(run_test_suite(suites[suite_name]))
+    hawkeye_utils.CONNECTION_POOL.close_all()
+    hawkeye_utils.TRACER.close()
+    hawkeye_utils.RECORDER.close()
+    stats = hawkeye_utils.get_run_stats()
+
+  wall_time = time.time() - start
+  if shard is not None:
+    write_shard_results(options, shard, sorted(selected), summaries, stats,
+      wall_time, start - START_TIME)
+  sys.exit(report_test_results(summaries, stats, wall_time,
+    start - START_TIME, options))
@@ -1,8 +1,27 @@
+import atexit
+import base64
+import cProfile
+import hashlib
+import heapq
 import httplib
 import json
+import math
+import mmap
+import operator
 import os
+import Queue
+import random
+import re
+import select
+import socket
 import sys
+import tempfile
+import threading
+import time
+import urllib
+import urlparse
 from unittest.case import TestCase
+from unittest.result import TestResult
 from unittest.runner import TextTestResult, TextTestRunner
 from unittest.suite import TestSuite
 
@@ -13,25 +32,1196 @@ PORT = -1
 LANG = None
 CONSOLE_MODE = False
 
+TRACE_OFF = 'off'
+TRACE_HEADERS = 'headers'
+TRACE_FULL = 'full'
+TRACE_LEVELS = [ TRACE_OFF, TRACE_HEADERS, TRACE_FULL ]
+
+TRACE_LEVEL = TRACE_FULL
+TRACE_BODY_LIMIT = 64 * 1024
+TRACE_FILE = 'logs/http.log'
+
+# If set, every request made via make_request is recorded to this file
+# in a replayable form (see SessionRecorder)
+RECORD_FILE = None
+
+TEST_WORKERS = 1
+
+LATENCY_MIN_VALUE = 0.01
+LATENCY_BUCKET_RATIO = 1.05
+ID_SEGMENT_PATTERN = re.compile(r'^(\d+|(?=.*\d)[\w\-=.]{16,})$')
+
 SSL_PORT_OFFSET = 3700
 
+# Streamed response bodies are read in chunks of this size and are kept
+# in memory up to the spool size, beyond which they are spilled to a
+# temporary file.
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_SPOOL_SIZE = 1024 * 1024
+
+MULTIPART_BOUNDARY = '----------boundary------'
+
+# Version of the schema of the benchmark results (see HawkeyeBenchmark).
+# Bump this whenever a field is renamed, removed or changes meaning.
+BENCHMARK_SCHEMA_VERSION = 1
+
+# If set, these override the warmup and measurement iteration counts
+# declared by the individual benchmarks.
+BENCHMARK_WARMUP = None
+BENCHMARK_ITERATIONS = None
+
+# If True, each test case is run under cProfile (see TestProfiler) and
+# its profile is written to PROFILE_DIR.
+PROFILE = False
+PROFILE_DIR = 'logs'
+
+# Manifests of the fixture datasets loaded into the target server (see
+# fixtures.py), keyed by fixture API (eg: datastore). The query tests
+# and benchmarks of an API with a loaded dataset leave it in place and
+# expect it in their query results.
+FIXTURES = {}
+
+# Rating comparators of the project_ratings endpoints
+RATING_COMPARATORS = {
+  'eq' : operator.eq,
+  'ne' : operator.ne,
+  'gt' : operator.gt,
+  'ge' : operator.ge,
+  'lt' : operator.lt,
+  'le' : operator.le,
+}
+
+# Requests with these methods may be sent twice without side effects, so
+# ConnectionPool retries them when a reused connection fails mid-request.
+IDEMPOTENT_METHODS = [ 'GET', 'HEAD', 'OPTIONS' ]
+
+class ConnectionPool:
+  """
+  A per-thread pool of keep-alive HTTP connections. Connections are
+  keyed by (host, port, ssl) so that consecutive requests made by the
+  same thread against the same endpoint reuse a single TCP (or SSL)
+  connection instead of paying a fresh handshake for every request.
+  Each thread gets its own set of connections, which means a pooled
+  connection is never shared between two in-flight requests. The pool
+  also keeps track of how many requests were served by an already open
+  connection (hits), how many required a new connection (misses) and
+  how many had to be retried because a pooled connection turned out
+  to be stale.
+  """
+
+  def __init__(self, debuglevel=0):
+    """
+    Create a new, empty instance of ConnectionPool.
+
+    Args:
+      debuglevel  httplib debug level to set on each new connection
+    """
+    self.debuglevel = debuglevel
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.reconnects = 0
+
+  def request(self, method, host, port, ssl, path, payload=None, headers=None):
+    """
+    Send a HTTP request over a pooled connection and return the
+    resulting HTTPResponse along with the time it took to connect and
+    to receive the response headers. If a reused connection has been
+    closed or reset by the server in the meantime, it is discarded and
+    the request is retried once over a brand new connection. Requests
+    with a method that is not idempotent (eg: POST) are only retried if
+    the failure occurred before any part of the request was sent, so
+    that the server never processes them twice. The caller must read the
+    returned response fully before issuing another request to the same
+    endpoint from the same thread.
+
+    Args:
+      method  HTTP method (eg: GET, POST)
+      host    Hostname of the target server
+      port    Port of the target server
+      ssl     If True use HTTPS to make the connection
+      path    URL path to execute on
+      payload Payload to be sent (may be None)
+      headers Any HTTP headers to be sent as a dictionary (may be None)
+
+    Returns:
+      A tuple of the form (response, timings) where response is an
+      instance of httplib.HTTPResponse and timings is a dictionary
+      containing the connect and first_byte durations in seconds
+    """
+    if headers is None:
+      headers = {}
+    key = (host, port, ssl)
+    for attempt in range(2):
+      start = time.time()
+      conn, reused = self.__get_connection(key)
+      sent = False
+      try:
+        if conn.sock is None:
+          conn.connect()
+        connected = time.time()
+        sent = True
+        if isinstance(payload, MultipartBody):
+          self.__send_streaming(conn, method, path, payload, headers)
+        else:
+          conn.request(method, path, payload, headers)
+        response = conn.getresponse()
+        return response, {
+          'connect' : connected - start,
+          'first_byte' : time.time() - connected
+        }
+      except (httplib.HTTPException, socket.error):
+        self.__discard_connection(key)
+        if not reused or attempt > 0 or not getattr(payload, 'replayable',
+                                                    True):
+          raise
+        if sent and method.upper() not in IDEMPOTENT_METHODS:
+          raise
+        self.__increment('reconnects')
+
+  def close_all(self):
+    """
+    Close all the connections opened by the calling thread.
+    """
+    connections = self.__get_connections()
+    for conn in connections.values():
+      conn.close()
+    connections.clear()
+
+  def get_stats(self):
+    """
+    Returns:
+      A dictionary containing the hits, misses and reconnects counters
+    """
+    with self.lock:
+      return {
+        'hits' : self.hits,
+        'misses' : self.misses,
+        'reconnects' : self.reconnects
+      }
+
+  def reset_stats(self):
+    """
+    Reset the hits, misses and reconnects counters to zero.
+    """
+    with self.lock:
+      self.hits = 0
+      self.misses = 0
+      self.reconnects = 0
+
+  def __get_connections(self):
+    connections = getattr(self.local, 'connections', None)
+    if connections is None:
+      connections = {}
+      self.local.connections = connections
+    return connections
+
+  def __get_connection(self, key):
+    """
+    Look up an open connection for the given key, creating a new one
+    if the calling thread does not have one yet. Connections whose
+    socket has been closed (eg: because the server sent a
+    'Connection: close' header) are counted as misses since httplib
+    will transparently open a new socket for them. So are idle
+    connections that the server has already closed on its end, which
+    would otherwise only fail once a request has been sent over them.
+
+    Returns:
+      A tuple of the form (connection, reused)
+    """
+    connections = self.__get_connections()
+    conn = connections.get(key)
+    if conn is None:
+      host, port, ssl = key
+      if ssl:
+        conn = httplib.HTTPSConnection(host, port)
+      else:
+        conn = httplib.HTTPConnection(host, port)
+      conn.set_debuglevel(self.debuglevel)
+      connections[key] = conn
+    elif conn.sock is not None and self.__is_closed_by_peer(conn):
+      conn.close()
+    reused = conn.sock is not None
+    if reused:
+      self.__increment('hits')
+    else:
+      self.__increment('misses')
+    return conn, reused
+
+  def __is_closed_by_peer(self, conn):
+    """
+    Check whether the server has closed an idle connection. Nothing is
+    expected on an idle connection, so if its socket is readable the
+    server has either closed it or sent data we can not make sense of.
+    """
+    try:
+      readable, _, _ = select.select([ conn.sock ], [], [], 0)
+    except (select.error, socket.error, ValueError):
+      return True
+    return len(readable) > 0
+
+  def __send_streaming(self, conn, method, path, payload, headers):
+    """
+    Send a request whose body is a MultipartBody, writing the body to
+    the connection one chunk at a time.
+    """
+    conn.putrequest(method, path)
+    for name, value in headers.items():
+      conn.putheader(name, value)
+    if 'content-length' not in [ name.lower() for name in headers.keys() ]:
+      conn.putheader('Content-Length', str(payload.get_length()))
+    conn.endheaders()
+    for chunk in payload.iter_chunks():
+      conn.send(chunk)
+
+  def __discard_connection(self, key):
+    conn = self.__get_connections().pop(key, None)
+    if conn is not None:
+      conn.close()
+
+  def __increment(self, counter):
+    with self.lock:
+      setattr(self, counter, getattr(self, counter) + 1)
+
+CONNECTION_POOL = ConnectionPool()
+
+class JsonLinesWriter:
+  """
+  Writes records to a file as JSON lines from a background thread, so
+  that the I/O stays off the request path and records can be written
+  from several threads at once.
+  """
+
+  def __init__(self, path):
+    """
+    Open the file at the specified path for appending and start the
+    writer thread.
+
+    Args:
+      path  Path of the file to write to
+    """
+    self.queue = Queue.Queue()
+    self.thread = threading.Thread(target=self.__write_records,
+      args=(open(path, 'a'), self.queue))
+    self.thread.daemon = True
+    self.thread.start()
+
+  def write(self, record):
+    """
+    Queue a record to be written.
+
+    Args:
+      record  A JSON serializable object
+    """
+    self.queue.put(record)
+
+  def close(self):
+    """
+    Write all the queued records, close the file and stop the writer
+    thread.
+    """
+    self.queue.put(None)
+    self.thread.join()
+
+  def __write_records(self, log_file, queue):
+    try:
+      while True:
+        record = queue.get()
+        if record is None:
+          break
+        log_file.write(json.dumps(record) + '\n')
+        if queue.empty():
+          log_file.flush()
+    finally:
+      log_file.close()
+
+class HttpTracer:
+  """
+  Traces HTTP requests and responses to a log file as JSON lines. The
+  caller only builds a record and puts it on a queue, while a background
+  writer thread serializes the records and writes them to a single,
+  long-lived file handle. This keeps the tracing I/O off the request
+  path and makes it safe to trace requests from several threads at
+  once. The amount of detail logged is controlled by the
+  hawkeye_utils.TRACE_LEVEL and hawkeye_utils.TRACE_BODY_LIMIT constants,
+  which are read when the first record is traced.
+  """
+
+  def __init__(self):
+    """
+    Create a new instance of HttpTracer. The log file and the writer
+    thread are not created until the first record is traced.
+    """
+    self.lock = threading.Lock()
+    self.writer = None
+    self.level = None
+    self.body_limit = None
+
+  def trace(self, test, method, url, request_headers, request_body,
+            response_info):
+    """
+    Queue a trace record for the given HTTP request/response pair.
+
+    Args:
+      test            Description of the test case that made the request
+      method          HTTP method (eg: GET, POST)
+      url             Full URL of the request
+      request_headers A dictionary of request headers (may be None)
+      request_body    Request payload string (may be None)
+      response_info   An instance of ResponseInfo
+    """
+    if not self.__start():
+      return
+    record = {
+      'time' : time.time(),
+      'test' : test,
+      'method' : method,
+      'url' : url,
+      'status' : response_info.status,
+      'request_headers' : request_headers or {},
+      'response_headers' : response_info.headers,
+    }
+    if isinstance(request_body, MultipartBody):
+      record['request_body_streamed'] = True
+      record['request_body_size'] = request_body.get_length()
+    elif self.level == TRACE_FULL:
+      self.__add_body(record, 'request_body', request_body)
+    else:
+      record['request_body_size'] = len(request_body or '')
+    if response_info.streamed:
+      record['response_body_streamed'] = True
+      record['response_body_size'] = response_info.content_length
+      record['response_body_md5'] = response_info.get_md5()
+    elif self.level == TRACE_FULL:
+      self.__add_body(record, 'response_body', response_info.payload)
+    else:
+      record['response_body_size'] = response_info.content_length
+    self.writer.write(record)
+
+  def close(self):
+    """
+    Flush all the queued records to the log file and stop the writer
+    thread. Tracing is restarted if another record is traced afterwards.
+    """
+    with self.lock:
+      if self.writer is None:
+        return
+      self.writer.close()
+      self.writer = None
+
+  def __start(self):
+    """
+    Open the log file and start the writer thread, unless tracing is
+    already running or has been turned off.
+
+    Returns:
+      True if records should be traced and False otherwise
+    """
+    if self.writer is not None:
+      return True
+    if TRACE_LEVEL == TRACE_OFF:
+      return False
+    with self.lock:
+      if self.writer is None:
+        self.level = TRACE_LEVEL
+        self.body_limit = TRACE_BODY_LIMIT
+        self.writer = JsonLinesWriter(TRACE_FILE)
+    return True
+
+  def __add_body(self, record, name, body):
+    """
+    Add the given payload to the trace record. Payloads longer than the
+    configured body limit are truncated and payloads which are not valid
+    UTF-8 (eg: images) are base64 encoded.
+    """
+    if body is None:
+      body = ''
+    record[name + '_size'] = len(body)
+    if self.body_limit is not None and len(body) > self.body_limit:
+      body = body[:self.body_limit]
+      record[name + '_truncated'] = True
+    try:
+      record[name] = body.decode('utf-8')
+    except UnicodeDecodeError:
+      record[name] = base64.b64encode(body)
+      record[name + '_encoding'] = 'base64'
+
+TRACER = HttpTracer()
+atexit.register(TRACER.close)
+
+class SessionRecorder:
+  """
+  Records the HTTP requests made via make_request to RECORD_FILE as JSON
+  lines, so that the session can later be replayed against a server
+  (see load_generator.SessionReplayer). Unlike the HTTP trace, each
+  record holds everything needed to re-issue the request: the time it
+  was sent, the method, the full path, the headers and the complete
+  payload (base64 encoded), along with the status the server responded
+  with. Streamed multipart payloads cannot be recorded without reading
+  their sources twice, so such requests are recorded as skipped.
+  """
+
+  def __init__(self):
+    """
+    Create a new instance of SessionRecorder. The record file is not
+    opened until the first request is recorded.
+    """
+    self.lock = threading.Lock()
+    self.writer = None
+
+  def record(self, sent, method, path, ssl, headers, payload, status,
+             source):
+    """
+    Record a single HTTP request, if recording is turned on.
+
+    Args:
+      sent    Time the request was sent
+      method  HTTP method (eg: GET, POST)
+      path    Full URL path of the request
+      ssl     True if the request was made over HTTPS
+      headers A dictionary of request headers (may be None)
+      payload Request payload (may be None)
+      status  Status code of the response
+      source  Description of the caller (eg: a test case)
+    """
+    if RECORD_FILE is None:
+      return
+    with self.lock:
+      if self.writer is None:
+        self.writer = JsonLinesWriter(RECORD_FILE)
+    record = {
+      'time' : sent,
+      'method' : method,
+      'path' : path,
+      'ssl' : ssl,
+      'headers' : headers or {},
+      'status' : status,
+      'source' : source,
+    }
+    if isinstance(payload, MultipartBody):
+      record['skipped'] = True
+    elif payload is not None:
+      record['payload'] = base64.b64encode(payload)
+    self.writer.write(record)
+
+  def close(self):
+    """
+    Flush all the recorded requests to the record file. Recording is
+    restarted if another request is recorded afterwards.
+    """
+    with self.lock:
+      if self.writer is None:
+        return
+      self.writer.close()
+      self.writer = None
+
+RECORDER = SessionRecorder()
+atexit.register(RECORDER.close)
+
+class WaitStats:
+  """
+  Records how long each wait performed via hawkeye_utils.wait_for took.
+  Waits are aggregated by name, keeping track of the number of waits,
+  the number of polling attempts, the total and maximum time spent
+  waiting and the number of waits that ran into their deadline.
+  """
+
+  def __init__(self):
+    """
+    Create a new, empty instance of WaitStats.
+    """
+    self.lock = threading.Lock()
+    self.waits = {}
+
+  def record(self, name, elapsed, attempts, timed_out):
+    """
+    Record the outcome of a single wait.
+
+    Args:
+      name      Name of the wait (eg: datastore.projects)
+      elapsed   Time spent waiting in seconds
+      attempts  Number of times the condition was polled
+      timed_out True if the wait ran into its deadline
+    """
+    with self.lock:
+      stats = self.waits.get(name)
+      if stats is None:
+        stats = { 'count' : 0, 'attempts' : 0, 'total' : 0.0, 'max' : 0.0,
+                  'timeouts' : 0 }
+        self.waits[name] = stats
+      stats['count'] += 1
+      stats['attempts'] += attempts
+      stats['total'] += elapsed
+      stats['max'] = max(stats['max'], elapsed)
+      if timed_out:
+        stats['timeouts'] += 1
+
+  def get_stats(self):
+    """
+    Returns:
+      A dictionary of wait statistics keyed by wait name
+    """
+    with self.lock:
+      return dict((name, dict(stats)) for name, stats in self.waits.items())
+
+  def reset(self):
+    """
+    Discard all the recorded waits.
+    """
+    with self.lock:
+      self.waits = {}
+
+WAIT_STATS = WaitStats()
+
+class TestProfiler:
+  """
+  Runs test cases under cProfile and breaks down the wall time of each
+  test case into the time spent blocked on the network (connecting,
+  waiting for and reading HTTP responses made via make_request), the
+  time spent sleeping between the polls of wait_for, and the remaining
+  time spent in local code (eg: building requests, parsing responses
+  and tracing). The profile of each test case is written to
+  PROFILE_DIR/{module}.{class}.prof. Note that local time includes the
+  overhead added by the profiler itself.
+
+  Network and wait times are accumulated per thread, so test cases run
+  concurrently by HawkeyeTestScheduler are accounted separately.
+  """
+
+  def __init__(self):
+    """
+    Create a new, empty instance of TestProfiler.
+    """
+    self.lock = threading.Lock()
+    self.local = threading.local()
+    self.tests = []
+    self.names = set()
+
+  def run(self, test):
+    """
+    Run the run_hawkeye_test method of the given test case under the
+    profiler and record its timings. Exceptions raised by the test case
+    are passed on to the caller after the timings have been recorded.
+
+    Args:
+      test  An instance of HawkeyeTestCase
+    """
+    name = self.__get_name(test)
+    profiler = cProfile.Profile()
+    self.local.network = 0.0
+    self.local.wait = 0.0
+    self.local.active = True
+    start = time.time()
+    try:
+      profiler.runcall(test.run_hawkeye_test)
+    finally:
+      wall = time.time() - start
+      self.local.active = False
+      profile_file = os.path.join(PROFILE_DIR, name + '.prof')
+      profiler.dump_stats(profile_file)
+      with self.lock:
+        self.tests.append({
+          'test' : name,
+          'wall' : wall,
+          'network' : self.local.network,
+          'wait' : self.local.wait,
+          'local' : max(wall - self.local.network - self.local.wait, 0.0),
+          'profile_file' : profile_file,
+        })
+
+  def add_network_time(self, duration):
+    """
+    Add the given duration (in seconds) to the network time of the test
+    case running in the current thread, if it is being profiled.
+    """
+    if getattr(self.local, 'active', False):
+      self.local.network += duration
+
+  def add_wait_time(self, duration):
+    """
+    Add the given duration (in seconds) to the wait time of the test
+    case running in the current thread, if it is being profiled.
+    """
+    if getattr(self.local, 'active', False):
+      self.local.wait += duration
+
+  def get_stats(self):
+    """
+    Returns:
+      A list of dictionaries, one per profiled test case, containing the
+      test name, the wall, network, wait and local times in seconds and
+      the path of the profile file
+    """
+    with self.lock:
+      return [ dict(test) for test in self.tests ]
+
+  def reset(self):
+    """
+    Discard the timings of the test cases profiled so far. The names
+    handed out so far stay reserved, so that their profile files are
+    not overwritten.
+    """
+    with self.lock:
+      self.tests = []
+
+  def __get_name(self, test):
+    base = '{0}.{1}'.format(test.__class__.__module__, test.__class__.__name__)
+    with self.lock:
+      name = base
+      index = 1
+      while name in self.names:
+        index += 1
+        name = '{0}-{1}'.format(base, index)
+      self.names.add(name)
+      return name
+
+PROFILER = TestProfiler()
+
+class LatencyHistogram:
+  """
+  A histogram of latency samples with logarithmically sized buckets.
+  Each bucket covers a range of values that is LATENCY_BUCKET_RATIO
+  times wider than the previous one, so percentiles can be estimated
+  with a bounded relative error while the memory used stays constant
+  no matter how many samples are recorded. Histograms can be converted
+  to and from plain dictionaries and merged, which allows combining the
+  histograms recorded by different processes.
+  """
+
+  def __init__(self):
+    """
+    Create a new, empty instance of LatencyHistogram.
+    """
+    self.buckets = {}
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self, value):
+    """
+    Add a sample to the histogram.
+
+    Args:
+      value A latency in milliseconds
+    """
+    if value <= LATENCY_MIN_VALUE:
+      bucket = 0
+    else:
+      bucket = int(math.ceil(math.log(value / LATENCY_MIN_VALUE) /
+        math.log(LATENCY_BUCKET_RATIO)))
+    self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+  def percentile(self, percent):
+    """
+    Estimate the given percentile of the recorded samples.
+
+    Args:
+      percent A percentage between 0 and 100
+
+    Returns:
+      The upper bound of the bucket containing the percentile, in
+      milliseconds
+    """
+    if self.count == 0:
+      return 0.0
+    threshold = self.count * percent / 100.0
+    seen = 0
+    for bucket in sorted(self.buckets.keys()):
+      seen += self.buckets[bucket]
+      if seen >= threshold:
+        return min(LATENCY_MIN_VALUE * LATENCY_BUCKET_RATIO ** bucket, self.max)
+    return self.max
+
+  def mean(self):
+    if self.count == 0:
+      return 0.0
+    return self.total / self.count
+
+  def merge(self, other):
+    """
+    Add all the samples of another histogram to this histogram.
+    """
+    for bucket, count in other.buckets.items():
+      self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+    self.count += other.count
+    self.total += other.total
+    self.max = max(self.max, other.max)
+
+  def summary(self):
+    """
+    Returns:
+      A dictionary containing the sample count, mean, p50, p90, p99 and
+      max of the histogram
+    """
+    return {
+      'count' : self.count,
+      'mean' : self.mean(),
+      'p50' : self.percentile(50),
+      'p90' : self.percentile(90),
+      'p99' : self.percentile(99),
+      'max' : self.max,
+    }
+
+  def to_dict(self):
+    return {
+      'buckets' : self.buckets.items(),
+      'count' : self.count,
+      'total' : self.total,
+      'max' : self.max,
+    }
+
+  @classmethod
+  def from_dict(cls, data):
+    histogram = cls()
+    histogram.buckets = dict((int(bucket), count)
+      for bucket, count in data['buckets'])
+    histogram.count = data['count']
+    histogram.total = data['total']
+    histogram.max = data['max']
+    return histogram
+
+class LatencyStats:
+  """
+  Aggregates the timings of HTTP calls into one LatencyHistogram per
+  endpoint and timing phase. Endpoints are identified by the HTTP
+  method, the normalized URL path (see normalize_path) and the language
+  binding under test. The recorded phases are connect (time to open a
+  new connection, zero when a pooled connection is reused), first_byte
+  (time from sending the request until the response headers have been
+  received), read (time to read the response body) and total.
+  """
+
+  PHASES = [ 'connect', 'first_byte', 'read', 'total' ]
+
+  def __init__(self):
+    """
+    Create a new, empty instance of LatencyStats.
+    """
+    self.lock = threading.Lock()
+    self.endpoints = {}
+
+  def record(self, method, path, lang, timings):
+    """
+    Record the timings of a single HTTP call.
+
+    Args:
+      method  HTTP method (eg: GET, POST)
+      path    URL path of the call (query strings are ignored)
+      lang    Language binding under test
+      timings A dictionary of phase durations in seconds
+    """
+    key = (method, normalize_path(path), lang)
+    with self.lock:
+      histograms = self.endpoints.get(key)
+      if histograms is None:
+        histograms = dict((phase, LatencyHistogram()) for phase in self.PHASES)
+        self.endpoints[key] = histograms
+      total = 0.0
+      for phase in self.PHASES[:-1]:
+        histograms[phase].record(timings[phase] * 1000)
+        total += timings[phase]
+      histograms['total'].record(total * 1000)
+
+  def get_stats(self):
+    """
+    Returns:
+      A list of dictionaries, one per endpoint, containing the endpoint
+      key and the histogram of each phase as a plain dictionary
+    """
+    with self.lock:
+      stats = []
+      for key, histograms in self.endpoints.items():
+        entry = { 'method' : key[0], 'path' : key[1], 'lang' : key[2] }
+        for phase, histogram in histograms.items():
+          entry[phase] = histogram.to_dict()
+        stats.append(entry)
+      return stats
+
+  def reset(self):
+    """
+    Discard the histograms of all the endpoints.
+    """
+    with self.lock:
+      self.endpoints = {}
+
+def normalize_path(path):
+  """
+  Normalize a URL path so that calls made on the same endpoint with
+  different parameters are aggregated together. The query string is
+  dropped and path segments that look like identifiers (eg: numeric IDs
+  and blob keys) are replaced by a placeholder.
+
+  Args:
+    path  A URL path or an absolute URL
+
+  Returns:
+    The normalized path (eg: /python/blobstore/download/{id})
+  """
+  path = urlparse.urlsplit(path).path
+  segments = []
+  for segment in path.split('/'):
+    if ID_SEGMENT_PATTERN.match(segment):
+      segments.append('{id}')
+    else:
+      segments.append(segment)
+  return '/'.join(segments)
+
+def merge_latency_stats(stats, other):
+  """
+  Merge two lists of endpoint latency stats as returned by
+  LatencyStats.get_stats.
+
+  Returns:
+    A new list containing the merged stats
+  """
+  merged = {}
+  for entry in stats + other:
+    key = (entry['method'], entry['path'], entry['lang'])
+    if not merged.has_key(key):
+      merged[key] = dict((phase, LatencyHistogram())
+        for phase in LatencyStats.PHASES)
+    for phase in LatencyStats.PHASES:
+      merged[key][phase].merge(LatencyHistogram.from_dict(entry[phase]))
+
+  result = []
+  for key, histograms in merged.items():
+    entry = { 'method' : key[0], 'path' : key[1], 'lang' : key[2] }
+    for phase, histogram in histograms.items():
+      entry[phase] = histogram.to_dict()
+    result.append(entry)
+  return result
+
+def get_total_latency(stats):
+  """
+  Merge the total latency histograms of all the endpoints in a list of
+  endpoint latency stats.
+
+  Args:
+    stats A list of endpoint latency stats as returned by
+          LatencyStats.get_stats
+
+  Returns:
+    A LatencyHistogram of the total latency of all the HTTP calls
+  """
+  histogram = LatencyHistogram()
+  for entry in stats:
+    histogram.merge(LatencyHistogram.from_dict(entry['total']))
+  return histogram
+
+LATENCY_STATS = LatencyStats()
+
+def load_fixtures(path, lang):
+  """
+  Load the manifest written by fixtures.py.
+
+  Args:
+    path  Path to the manifest file
+    lang  Language binding under test
+
+  Returns:
+    A dictionary mapping fixture API names to the descriptions of the
+    datasets loaded through them for the given language
+
+  Raises:
+    IOError     If the manifest cannot be read
+    ValueError  If the manifest is malformed or describes no dataset
+                for the given language
+  """
+  manifest = open(path)
+  try:
+    reports = json.load(manifest)
+  finally:
+    manifest.close()
+  fixtures = {}
+  for report in reports:
+    for key in ('api', 'lang', 'ratings', 'license_ratings'):
+      if not report.has_key(key):
+        raise ValueError('Fixture manifest {0} has no {1}'.format(path, key))
+    if report['lang'] == lang:
+      fixtures[report['api']] = report
+  if not fixtures:
+    raise ValueError('Fixture manifest {0} has no {1} dataset'.format(path,
+      lang))
+  return fixtures
+
+def count_fixture_projects(api, rating=None, comparator='eq', license=None):
+  """
+  Count the projects of the fixture dataset loaded through the given API
+  that match a rating and license filter, as recorded in its manifest.
+
+  Args:
+    api         Fixture API name (eg: datastore)
+    rating      Rating to compare against (None matches all ratings)
+    comparator  One of the RATING_COMPARATORS
+    license     License the projects must have (None matches all)
+
+  Returns:
+    The number of matching projects (0 if no dataset has been loaded
+    through the API)
+  """
+  if not FIXTURES.has_key(api):
+    return 0
+  if license is None:
+    counts = FIXTURES[api]['ratings']
+  else:
+    counts = FIXTURES[api]['license_ratings'].get(license, {})
+  compare = RATING_COMPARATORS[comparator]
+  return sum(count for value, count in counts.items()
+             if rating is None or compare(int(value), rating))
+
+def wait_for(condition, timeout, name, initial_delay=0.05, max_delay=2.0,
+             backoff=2.0, jitter=0.25):
+  """
+  Poll the given condition until it returns a true value or the deadline
+  expires. The delay between two polls starts at initial_delay and grows
+  exponentially up to max_delay, with some random jitter added so that
+  concurrent waiters do not poll in lock step. This lets a fast server
+  satisfy the condition within milliseconds while a slow one still gets
+  up to the full timeout. The time each wait took is recorded in
+  hawkeye_utils.WAIT_STATS.
+
+  Args:
+    condition     A function taking no arguments that returns a true
+                  value once the awaited state has been reached
+    timeout       Maximum number of seconds to wait
+    name          Name under which the wait is recorded
+    initial_delay Delay in seconds before the second poll
+    max_delay     Upper bound for the delay between two polls
+    backoff       Factor by which the delay grows after each poll
+    jitter        Fraction of the delay by which it is randomly varied
+
+  Returns:
+    The value returned by the condition, or None if the deadline expired
+    before the condition was satisfied
+  """
+  start = time.time()
+  deadline = start + timeout
+  delay = initial_delay
+  attempts = 0
+  while True:
+    attempts += 1
+    value = condition()
+    now = time.time()
+    if value:
+      WAIT_STATS.record(name, now - start, attempts, False)
+      return value
+    if now >= deadline:
+      WAIT_STATS.record(name, now - start, attempts, True)
+      return None
+    time.sleep(min(delay * random.uniform(1 - jitter, 1 + jitter),
+      deadline - now))
+    PROFILER.add_wait_time(time.time() - now)
+    delay = min(delay * backoff, max_delay)
+
 class ResponseInfo:
   """
   Contains the metadata and data related to a HTTP response. In
   particular this class can be used as a holder of HTTP response
-  code, headers and payload information.
+  code, headers and payload information. The time it took to read
+  the payload is available as read_time (in seconds) and the length
+  of the payload as content_length.
+
+  A streamed response is read in chunks of STREAM_CHUNK_SIZE bytes. Its
+  length and MD5 digest are computed while reading and the body is kept
+  in a temporary file that only holds up to STREAM_SPOOL_SIZE bytes in
+  memory, so the payload attribute of a streamed response is None. Use
+  get_payload, iter_payload or get_json to access the body instead.
   """
 
-  def __init__(self, response):
+  def __init__(self, response, stream=False):
     """
     Create a new instance of ResponseInfo using the given HTTPResponse
-    object.
+    object. The response body is read fully before returning.
+
+    Args:
+      response  An instance of httplib.HTTPResponse
+      stream    If True read the body in chunks instead of all at once
     """
     self.status = response.status
     self.headers = {}
     for header in response.getheaders():
       self.headers[header[0]] = header[1]
-    self.payload = response.read()
+    self.streamed = stream
+    self.md5 = None
+    self.json = None
+    start = time.time()
+    if stream:
+      self.payload = None
+      self.body = tempfile.SpooledTemporaryFile(STREAM_SPOOL_SIZE)
+      self.content_length = 0
+      digest = hashlib.md5()
+      while True:
+        chunk = response.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+          break
+        digest.update(chunk)
+        self.content_length += len(chunk)
+        self.body.write(chunk)
+      self.md5 = digest.hexdigest()
+    else:
+      self.payload = response.read()
+      self.body = None
+      self.content_length = len(self.payload)
+    self.read_time = time.time() - start
+
+  def get_md5(self):
+    """
+    Returns:
+      The hex MD5 digest of the payload
+    """
+    if self.md5 is None:
+      self.md5 = hashlib.md5(self.payload).hexdigest()
+    return self.md5
+
+  def iter_payload(self, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterate over the payload in chunks without loading all of a
+    streamed payload into memory.
+
+    Args:
+      chunk_size  Maximum size of each chunk in bytes
+    """
+    if not self.streamed:
+      for offset in range(0, len(self.payload), chunk_size):
+        yield self.payload[offset:offset + chunk_size]
+      return
+    self.body.seek(0)
+    while True:
+      chunk = self.body.read(chunk_size)
+      if not chunk:
+        break
+      yield chunk
+
+  def get_payload(self):
+    """
+    Returns:
+      The payload as a string. For a streamed response this loads the
+      whole payload into memory.
+    """
+    if not self.streamed:
+      return self.payload
+    self.body.seek(0)
+    return self.body.read()
+
+  def get_json(self):
+    """
+    Parse the payload as JSON. The payload is only parsed the first time
+    this method is called and the parsed value is cached.
+
+    Returns:
+      The parsed JSON value
+    """
+    if self.json is None:
+      if self.streamed:
+        self.body.seek(0)
+        self.json = json.load(self.body)
+      else:
+        self.json = json.loads(self.payload)
+    return self.json
+
+def make_request(method, path, payload=None, headers=None, prepend_lang=True,
+                 ssl=False, source=None, stream=False):
+  """
+  Make a HTTP call on the server identified by hawkeye_utils.HOST and
+  hawkeye_utils.PORT. The call is made over a keep-alive connection
+  obtained from hawkeye_utils.CONNECTION_POOL, its timings are recorded
+  in hawkeye_utils.LATENCY_STATS and the HTTP request and response are
+  traced to logs/http.log via hawkeye_utils.TRACER. If
+  hawkeye_utils.RECORD_FILE is set, the request is also recorded in a
+  replayable form via hawkeye_utils.RECORDER.
+
+  Args:
+    method        HTTP method (eg: GET, POST)
+    path          URL path to execute on
+    payload       Payload to be sent. Only used if the method is POST or PUT
+    headers       Any HTTP headers to be sent as a dictionary
+    prepend_lang  If True the value of hawkeye_utils.LANG will be prepended
+                  to the URL
+    ssl           If True use HTTPS to make the connection. Defaults to False.
+    source        Description of the caller (eg: a test case) to be
+                  included in the HTTP trace
+    stream        If True the response body is streamed (see ResponseInfo)
+                  and only its size and MD5 digest are traced
+
+  Returns:
+    An instance of ResponseInfo
+  """
+  if prepend_lang:
+    path = "/" + LANG + path
+  if ssl:
+    port = PORT - SSL_PORT_OFFSET
+    url = 'https://{0}:{1}{2}'.format(HOST, port, path)
+  else:
+    port = PORT
+    url = 'http://{0}:{1}{2}'.format(HOST, port, path)
+  sent = time.time()
+  response, timings = CONNECTION_POOL.request(method, HOST, port, ssl,
+    path, payload, headers)
+  response_info = ResponseInfo(response, stream)
+  timings['read'] = response_info.read_time
+  LATENCY_STATS.record(method, path, LANG, timings)
+  PROFILER.add_network_time(timings['connect'] + timings['first_byte'] +
+    timings['read'])
+  TRACER.trace(source, method, url, headers, payload, response_info)
+  RECORDER.record(sent, method, path, ssl, headers, payload,
+    response_info.status, source)
+  return response_info
+
+def get_run_stats():
+  """
+  Collect the statistics gathered by this process while running tests.
+
+  Returns:
+    A dictionary containing the connection pool stats, the wait stats,
+    the endpoint latency stats and the timings of the profiled test
+    cases
+  """
+  return {
+    'pool' : CONNECTION_POOL.get_stats(),
+    'waits' : WAIT_STATS.get_stats(),
+    'latency' : LATENCY_STATS.get_stats(),
+    'profile' : PROFILER.get_stats(),
+  }
+
+def reset_run_stats():
+  """
+  Discard the statistics gathered by this process so far, so that the
+  next call to get_run_stats only covers what happens from now on. A
+  worker process of the parallel mode may run several tasks, and each
+  of them must report only its own statistics.
+  """
+  CONNECTION_POOL.reset_stats()
+  WAIT_STATS.reset()
+  LATENCY_STATS.reset()
+  PROFILER.reset()
+
+def merge_run_stats(stats, other):
+  """
+  Merge the run statistics gathered by another process (eg: a worker
+  of the parallel mode) into the given run statistics.
+
+  Args:
+    stats A dictionary returned by get_run_stats, updated in place
+    other A dictionary returned by get_run_stats in another process
+
+  Returns:
+    The updated stats dictionary
+  """
+  for key, value in other['pool'].items():
+    stats['pool'][key] = stats['pool'].get(key, 0) + value
+  for name, wait in other['waits'].items():
+    merged = stats['waits'].setdefault(name, { 'count' : 0, 'attempts' : 0,
+      'total' : 0.0, 'max' : 0.0, 'timeouts' : 0 })
+    for key in ('count', 'attempts', 'total', 'timeouts'):
+      merged[key] += wait[key]
+    merged['max'] = max(merged['max'], wait['max'])
+  stats['latency'] = merge_latency_stats(stats['latency'], other['latency'])
+  stats['profile'] = stats['profile'] + other['profile']
+  return stats
 
 class HawkeyeTestCase(TestCase):
   """
@@ -41,20 +1231,36 @@ class HawkeyeTestCase(TestCase):
   method. Use the http_* methods to perform HTTP calls on backend
   endpoints. All the HTTP calls performed via these methods are
   traced and logged to logs/http.log.
+
+  Test cases pass state to each other (eg: the IDs of entities created
+  by an earlier test case) through module level variables. To allow a
+  test case to run concurrently with others (see HawkeyeTestScheduler),
+  set the produces and consumes class attributes to lists naming the
+  pieces of shared state the test case writes and reads, respectively.
+  A test case that depends on no shared state at all should set both
+  to empty lists. Test cases that leave both attributes as None are
+  always run in isolation.
   """
 
+  produces = None
+  consumes = None
+
   def __init__(self):
     """
     Create a new instance of HawkeyeTestCase.
     """
     TestCase.__init__(self)
-    self.description_printed = False
 
   def runTest(self):
     """
-    Called by the unittest framework to run a test case.
+    Called by the unittest framework to run a test case. If
+    hawkeye_utils.PROFILE is set, the test case is run under the
+    profiler (see TestProfiler).
     """
-    self.run_hawkeye_test()
+    if PROFILE:
+      PROFILER.run(self)
+    else:
+      self.run_hawkeye_test()
 
   def run_hawkeye_test(self):
     """
@@ -63,7 +1269,41 @@ class HawkeyeTestCase(TestCase):
     """
     raise NotImplementedError
 
-  def http_get(self, path, headers=None, prepend_lang=True, ssl=False):
+  def skip_with_fixtures(self, api):
+    """
+    Skip the test case if a fixture dataset has been loaded through the
+    given API. Used by test cases that fetch every entity one by one or
+    depend on the key order of all the entities, neither of which works
+    at the scale of a fixture dataset.
+
+    Args:
+      api Fixture API name (eg: datastore)
+    """
+    if FIXTURES.has_key(api):
+      self.skipTest('not run with the {0} fixtures loaded'.format(api))
+
+  def wait_until(self, condition, timeout, name):
+    """
+    Wait for the given condition to be satisfied and fail the test case
+    if it is not satisfied within the specified timeout. See
+    hawkeye_utils.wait_for for details on how the condition is polled.
+
+    Args:
+      condition A function taking no arguments that returns a true
+                value once the awaited state has been reached
+      timeout   Maximum number of seconds to wait
+      name      Name under which the wait is recorded
+
+    Returns:
+      The value returned by the condition
+    """
+    value = wait_for(condition, timeout, name)
+    if not value:
+      self.fail('Timed out after {0}s waiting for {1}'.format(timeout, name))
+    return value
+
+  def http_get(self, path, headers=None, prepend_lang=True, ssl=False,
+               stream=False):
     """
     Perform a HTTP GET request on the specified URL path.
     The hostname and port segments of the URL are inferred from
@@ -78,12 +1318,15 @@ class HawkeyeTestCase(TestCase):
                     True.
       ssl           If True use HTTPS to make the connection. Defaults
                     to False.
+      stream        If True read the response body in chunks, computing
+                    its length and MD5 digest on the fly, instead of
+                    loading it into memory. Defaults to False.
 
     Returns:
       An instance of ResponseInfo
     """
     return self.__make_request('GET', path, headers=headers,
-      prepend_lang=prepend_lang, ssl=ssl)
+      prepend_lang=prepend_lang, ssl=ssl, stream=stream)
 
   def http_post(self, path, payload, headers=None, prepend_lang=True):
     """
@@ -165,7 +1408,8 @@ class HawkeyeTestCase(TestCase):
 
     Args:
       path          A URL path fragment (eg: /foo)
-      payload       Payload string content to be uploaded
+      payload       Payload string content to be uploaded, or a
+                    MultipartBody to be streamed to the server
       headers       A dictionary to be sent as HTTP headers
       prepend_lang  If True the value of hawkeye_utils.LANG will be
                     prepended to the provided URL path. Default is
@@ -199,11 +1443,87 @@ class HawkeyeTestCase(TestCase):
     self.assertTrue(len(list) > 0)
     return list
 
+  def walk_pages(self, path, page_size):
+    """
+    Fetch all the results of a paged list endpoint, page by page, by
+    passing the next cursor of each page back until the last page. Each
+    page is a JSON object of the form { 'results' : [...], 'next' :
+    cursor } with a null cursor on the last page, which is the first
+    page to come back short (possibly empty).
+
+    Args:
+      path      A URL path (without the page_size and cursor parameters)
+      page_size Number of results requested per page
+
+    Returns:
+      A tuple of the form (results, latencies, sizes) where results is
+      the list of the results of all the pages in order, latencies is
+      the list of the latencies of the page requests (in seconds) and
+      sizes is the list of the numbers of results on each page
+
+    Raises:
+      AssertionError  If a page request fails
+    """
+    if '?' in path:
+      separator = '&'
+    else:
+      separator = '?'
+    results = []
+    latencies = []
+    sizes = []
+    cursor = None
+    while True:
+      page_path = '{0}{1}page_size={2}'.format(path, separator, page_size)
+      if cursor is not None:
+        page_path += '&cursor=' + urllib.quote(cursor)
+      start = time.time()
+      response = self.http_get(page_path)
+      latencies.append(time.time() - start)
+      self.assertEquals(response.status, 200)
+      page = json.loads(response.payload)
+      results.extend(page['results'])
+      sizes.append(len(page['results']))
+      cursor = page['next']
+      if cursor is None:
+        return results, latencies, sizes
+
+  def assert_delete_all(self, path):
+    """
+    Executes HTTP DELETE requests on the specified URL path until the
+    bulk delete behind it reports that all the entities are gone. A bulk
+    delete that runs out of time responds with a cursor, which is passed
+    back in the cursor parameter of the next request to resume. Empty
+    responses (eg: from the Java app) mean that the deletion completed.
+
+    Args:
+      path  A URL path
+
+    Raises:
+      AssertionError  If a DELETE request fails
+    """
+    cursor = None
+    while True:
+      if cursor is None:
+        response = self.http_delete(path)
+      else:
+        if '?' in path:
+          separator = '&'
+        else:
+          separator = '?'
+        response = self.http_delete('{0}{1}cursor={2}'.format(path,
+          separator, urllib.quote(cursor)))
+      self.assertEquals(response.status, 200)
+      if not response.payload.strip():
+        return
+      cursor = json.loads(response.payload).get('cursor')
+      if cursor is None:
+        return
+
   def __make_request(self, method, path, payload=None, headers=None,
-                     prepend_lang=True, ssl=False):
+                     prepend_lang=True, ssl=False, stream=False):
     """
-    Make a HTTP call using the provided arguments. HTTP request and response
-    are traced and logged to logs/http.log.
+    Make a HTTP call using the provided arguments. See
+    hawkeye_utils.make_request for details.
 
     Args:
       method  HTTP method (eg: GET, POST)
@@ -213,47 +1533,181 @@ class HawkeyeTestCase(TestCase):
       prepend_lang If True the value of hawkeye_utils.LANG will be prepended
                     to the URL
       ssl     If True use HTTPS to make the connection. Defaults to False.
+      stream  If True stream the response body (see ResponseInfo)
 
     Returns:
       An instance of ResponseInfo
     """
-    http_log = open('logs/http.log', 'a')
-    if not self.description_printed:
-      http_log.write('\n' + str(self) + '\n')
-      http_log.write('=' * 70)
-      self.description_printed = True
+    return make_request(method, path, payload, headers, prepend_lang, ssl,
+      str(self), stream)
+
+class HawkeyeBenchmark(HawkeyeTestCase):
+  """
+  This abstract class provides a skeleton to implement Hawkeye
+  benchmarks. A benchmark is run like any other test case, but instead
+  of checking a single behavior it measures how long an operation takes.
+  For each combination of the parameter values listed in the sweep class
+  attribute (eg: { 'size' : [ 1, 10 ] }), the benchmark calls
+  set_up_benchmark, runs warmup_iterations untimed iterations followed
+  by iterations timed iterations of run_iteration, and then calls
+  tear_down_benchmark. Each parameter combination produces one result
+  in the stable schema described by get_result. Results are collected
+  in the results attribute of the benchmark instance.
+
+  Subclasses must set the benchmark_name class attribute and implement
+  run_iteration. Assertion failures raised while benchmarking fail the
+  benchmark just like they fail a test case.
+  """
+
+  benchmark_name = None
+  warmup_iterations = 5
+  iterations = 50
+  sweep = {}
+
+  def __init__(self):
+    """
+    Create a new instance of HawkeyeBenchmark.
+    """
+    HawkeyeTestCase.__init__(self)
+    self.results = []
+
+  def run_hawkeye_test(self):
+    self.results = []
+    for params in expand_sweep(self.sweep):
+      self.results.append(self.__measure(params))
+
+  def set_up_benchmark(self, params):
+    """
+    Called before the warmup phase of each parameter combination.
+    Subclasses can override this to create the data the benchmark needs.
+
+    Args:
+      params  A dictionary of parameter values
+    """
+    pass
 
-    original = sys.stdout
-    sys.stdout = http_log
+  def run_iteration(self, params):
+    """
+    Subclasses must implement this method and perform the operation
+    being benchmarked exactly once.
+
+    Args:
+      params  A dictionary of parameter values
+
+    Returns:
+      Number of operations performed by the iteration (eg: the number
+      of keys fetched by a batch get). None is treated as 1.
+    """
+    raise NotImplementedError
+
+  def tear_down_benchmark(self, params):
+    """
+    Called after the measurement phase of each parameter combination.
+
+    Args:
+      params  A dictionary of parameter values
+    """
+    pass
+
+  def get_result(self, params, warmup, histogram, operations, elapsed):
+    """
+    Build a benchmark result in the stable result schema.
+
+    Args:
+      params      A dictionary of parameter values
+      warmup      Number of warmup iterations performed
+      histogram   LatencyHistogram of the measured iterations (in ms)
+      operations  Total number of operations performed while measuring
+      elapsed     Wall clock time of the measurement phase in seconds
+
+    Returns:
+      A dictionary containing the schema version, benchmark name, the
+      target server and language, the parameter values, iteration
+      counts, throughput (operations per second) and the latency
+      summary of an iteration in milliseconds
+    """
+    return {
+      'schema_version' : BENCHMARK_SCHEMA_VERSION,
+      'benchmark' : self.benchmark_name,
+      'server' : '{0}:{1}'.format(HOST, PORT),
+      'lang' : LANG,
+      'params' : params,
+      'warmup_iterations' : warmup,
+      'iterations' : histogram.count,
+      'operations' : operations,
+      'elapsed' : elapsed,
+      'throughput' : operations / elapsed if elapsed > 0 else 0.0,
+      'latency' : histogram.summary(),
+    }
+
+  def __measure(self, params):
+    warmup = self.warmup_iterations
+    if BENCHMARK_WARMUP is not None:
+      warmup = BENCHMARK_WARMUP
+    iterations = self.iterations
+    if BENCHMARK_ITERATIONS is not None:
+      iterations = BENCHMARK_ITERATIONS
+
+    self.set_up_benchmark(params)
     try:
-      print
-      if prepend_lang:
-        path = "/" + LANG + path
-      if ssl:
-        conn = httplib.HTTPSConnection(HOST + ':' + str(PORT - SSL_PORT_OFFSET))
-      else:
-        conn = httplib.HTTPConnection(HOST + ':' + str(PORT))
-      conn.set_debuglevel(1)
-      if method == 'POST' or method == 'PUT':
-        if headers is not None:
-          conn.request(method, path, payload, headers)
-        else:
-          conn.request(method, path, payload)
-        print 'req-body: ' + payload
-      else:
-        if headers is not None:
-          conn.request(method, path, headers=headers)
-        else:
-          conn.request(method, path)
-      response = conn.getresponse()
-      response_info = ResponseInfo(response)
-      conn.close()
-      if response_info.payload is not None and len(response_info.payload) > 0:
-        print 'resp-body: ' + response_info.payload
-      return response_info
+      for _ in range(warmup):
+        self.run_iteration(params)
+      histogram = LatencyHistogram()
+      operations = 0
+      start = time.time()
+      for _ in range(iterations):
+        iteration_start = time.time()
+        count = self.run_iteration(params)
+        histogram.record((time.time() - iteration_start) * 1000)
+        if count is None:
+          count = 1
+        operations += count
+      elapsed = time.time() - start
     finally:
-      sys.stdout = original
-      http_log.close()
+      self.tear_down_benchmark(params)
+    return self.get_result(params, warmup, histogram, operations, elapsed)
+
+def expand_sweep(sweep):
+  """
+  Expand a parameter sweep into the list of all the combinations of
+  parameter values. Parameters are varied in the order of their names,
+  with the last name varying fastest.
+
+  Args:
+    sweep A dictionary mapping parameter names to lists of values
+
+  Returns:
+    A list of dictionaries, each mapping every parameter name to one of
+    its values. An empty sweep yields a single empty combination.
+  """
+  combinations = [ {} ]
+  for name in sorted(sweep.keys()):
+    expanded = []
+    for combination in combinations:
+      for value in sweep[name]:
+        params = dict(combination)
+        params[name] = value
+        expanded.append(params)
+    combinations = expanded
+  return combinations
+
+def get_benchmark_results(suite):
+  """
+  Collect the results of all the benchmarks in the given suite.
+
+  Args:
+    suite A HawkeyeTestSuite containing HawkeyeBenchmark instances
+
+  Returns:
+    A list of benchmark results (see HawkeyeBenchmark.get_result)
+  """
+  results = []
+  for test in suite:
+    if isinstance(test, HawkeyeBenchmark):
+      for result in test.results:
+        result['suite'] = suite.short_name
+        results.append(result)
+  return results
 
 class HawkeyeTestSuite(TestSuite):
   """
@@ -282,6 +1736,220 @@ class HawkeyeTestSuite(TestSuite):
     self.name = name
     self.short_name = short_name
 
+  def run(self, result):
+    """
+    Run the test cases of this suite. If hawkeye_utils.TEST_WORKERS is
+    greater than 1, test cases are executed concurrently by a
+    HawkeyeTestScheduler, subject to the dependencies implied by their
+    produces and consumes declarations. Otherwise they are executed one
+    after the other in the order they were added to the suite.
+
+    Args:
+      result  A TestResult instance to collect the results into
+
+    Returns:
+      The provided TestResult instance
+    """
+    if TEST_WORKERS > 1:
+      HawkeyeTestScheduler(list(self), TEST_WORKERS).run(result)
+      return result
+    return TestSuite.run(self, result)
+
+class RecordingTestResult(TestResult):
+  """
+  A TestResult that records the events reported by a single test case
+  instead of acting on them. The recorded events can later be replayed
+  onto another TestResult. HawkeyeTestScheduler uses this class to run
+  test cases concurrently while still reporting the outcome of each test
+  case to the (non thread-safe) suite result as one uninterrupted unit.
+  """
+
+  def __init__(self):
+    TestResult.__init__(self)
+    self.events = []
+
+  def startTest(self, test):
+    self.events.append(('startTest', (test,)))
+
+  def stopTest(self, test):
+    self.events.append(('stopTest', (test,)))
+
+  def addSuccess(self, test):
+    self.events.append(('addSuccess', (test,)))
+
+  def addError(self, test, err):
+    self.events.append(('addError', (test, err)))
+
+  def addFailure(self, test, err):
+    self.events.append(('addFailure', (test, err)))
+
+  def addSkip(self, test, reason):
+    self.events.append(('addSkip', (test, reason)))
+
+  def addExpectedFailure(self, test, err):
+    self.events.append(('addExpectedFailure', (test, err)))
+
+  def addUnexpectedSuccess(self, test):
+    self.events.append(('addUnexpectedSuccess', (test,)))
+
+  def replay(self, result):
+    """
+    Report all the recorded events to the given TestResult.
+    """
+    for name, args in self.events:
+      getattr(result, name)(*args)
+
+class HawkeyeTestScheduler:
+  """
+  Runs a list of test cases on a pool of worker threads. A test case
+  may declare the names of the shared state it writes to and reads from
+  via its produces and consumes attributes (see HawkeyeTestCase). From
+  these declarations the scheduler builds a dependency graph in which
+  a test case waits for every earlier test case that writes state it
+  reads or writes, and for every earlier test case that reads state it
+  writes. Test cases that do not declare anything are treated as
+  barriers: they wait for all the earlier test cases and all the later
+  test cases wait for them. Whenever several test cases are ready to
+  run, they are started in the order they were added to the suite.
+  """
+
+  def __init__(self, tests, workers):
+    """
+    Create a new scheduler for the given test cases.
+
+    Args:
+      tests   A list of test cases in their suite order
+      workers Number of worker threads to run the test cases on
+    """
+    self.tests = tests
+    self.workers = workers
+    self.dependencies = get_test_dependencies(tests)
+    self.condition = threading.Condition()
+    self.ready = []
+    self.remaining = []
+    self.dependents = [[] for _ in tests]
+    self.finished = 0
+
+  def run(self, result):
+    """
+    Run all the test cases and report their outcome to the given
+    TestResult. Returns when all the test cases have completed, or
+    when the result signals that the run should stop.
+
+    Args:
+      result  A TestResult instance to collect the results into
+    """
+    for index, dependencies in enumerate(self.dependencies):
+      self.remaining.append(len(dependencies))
+      for dependency in dependencies:
+        self.dependents[dependency].append(index)
+      if not dependencies:
+        heapq.heappush(self.ready, index)
+
+    threads = []
+    for _ in range(min(self.workers, len(self.tests))):
+      thread = threading.Thread(target=self.__run_tests, args=(result,))
+      thread.daemon = True
+      thread.start()
+      threads.append(thread)
+    for thread in threads:
+      thread.join()
+
+  def __run_tests(self, result):
+    try:
+      while True:
+        with self.condition:
+          while not self.ready and self.finished < len(self.tests) and \
+              not result.shouldStop:
+            self.condition.wait()
+          if not self.ready or result.shouldStop:
+            return
+          index = heapq.heappop(self.ready)
+
+        recorder = RecordingTestResult()
+        self.tests[index](recorder)
+
+        with self.condition:
+          recorder.replay(result)
+          self.finished += 1
+          for dependent in self.dependents[index]:
+            self.remaining[dependent] -= 1
+            if self.remaining[dependent] == 0:
+              heapq.heappush(self.ready, dependent)
+          self.condition.notify_all()
+    finally:
+      CONNECTION_POOL.close_all()
+
+def get_test_dependencies(tests):
+  """
+  Compute the dependencies among the given test cases based on their
+  produces and consumes declarations. See HawkeyeTestScheduler for the
+  rules used to derive the dependencies.
+
+  Args:
+    tests A list of test cases in their suite order
+
+  Returns:
+    A list containing, for each test case, the set of indices of the
+    test cases it depends on
+  """
+  declarations = []
+  for test in tests:
+    produces = getattr(test, 'produces', None)
+    consumes = getattr(test, 'consumes', None)
+    if produces is None and consumes is None:
+      declarations.append(None)
+    else:
+      declarations.append((set(produces or []), set(consumes or [])))
+
+  dependencies = []
+  for index, declaration in enumerate(declarations):
+    test_dependencies = set()
+    for earlier in range(index):
+      earlier_declaration = declarations[earlier]
+      if declaration is None or earlier_declaration is None:
+        test_dependencies.add(earlier)
+        continue
+      produces, consumes = declaration
+      earlier_produces, earlier_consumes = earlier_declaration
+      if earlier_produces & (produces | consumes) or \
+          earlier_consumes & produces:
+        test_dependencies.add(earlier)
+    dependencies.append(test_dependencies)
+  return dependencies
+
+def get_test_components(tests):
+  """
+  Group the given test cases into the connected components of their
+  dependency graph (see get_test_dependencies). Test cases in different
+  components neither read nor write any state the others depend on, so
+  the components can be run independently of each other (eg: by
+  different Hawkeye processes), as long as the test cases within each
+  component are run in their suite order.
+
+  Args:
+    tests A list of test cases in their suite order
+
+  Returns:
+    A list of components ordered by their first test case, each a
+    sorted list of test case indices
+  """
+  parents = range(len(tests))
+  def find(index):
+    while parents[index] != index:
+      parents[index] = parents[parents[index]]
+      index = parents[index]
+    return index
+
+  for index, dependencies in enumerate(get_test_dependencies(tests)):
+    for dependency in dependencies:
+      parents[find(dependency)] = find(index)
+
+  components = {}
+  for index in range(len(tests)):
+    components.setdefault(find(index), []).append(index)
+  return sorted(components.values(), key=lambda component: component[0])
+
 class HawkeyeTestResult(TextTestResult):
   """
   A collection of test results generated by a suite of test cases.
@@ -364,15 +2032,19 @@ class HawkeyeTestRunner(TextTestRunner):
   to a separate log file in the logs directory.
   """
 
-  def __init__(self, suite):
+  def __init__(self, suite, stream=None):
     """
     Create a new instance of the test runner for the given test suite.
 
     Args:
-      suite An instance of HawkeyeTestSuite class
+      suite   An instance of HawkeyeTestSuite class
+      stream  Stream to write the console output to. Defaults to
+              sys.stderr.
     """
 
-    TextTestRunner.__init__(self, verbosity=2)
+    if stream is None:
+      stream = sys.stderr
+    TextTestRunner.__init__(self, stream=stream, verbosity=2)
     self.suite = suite
     self.stream.writeln('\n' + suite.name)
     self.stream.writeln('=' * len(suite.name))
@@ -381,11 +2053,16 @@ class HawkeyeTestRunner(TextTestRunner):
     """
     Run the child test suite and print the outcome to console and relevant
     log files.
+
+    Returns:
+      An instance of HawkeyeTestResult or None if the suite does not
+      contain any test cases
     """
     if self.suite.countTestCases() > 0:
-      self.run(self.suite)
+      return self.run(self.suite)
     else:
       self.stream.writeln('No test cases for {0} API - SKIPPING'.format(LANG))
+      return None
 
   def _makeResult(self):
     return HawkeyeTestResult(self.stream, self.descriptions,
@@ -400,6 +2077,172 @@ class HawkeyeConstants:
   MOD_NHTTP = 'NHTTP'
 
 
+class MultipartBody:
+  """
+  A multipart/form-data request body that is produced in chunks while
+  it is being sent, instead of being built as a single string. Each file
+  added to the form can be read from a string, a file object, an mmap,
+  a file path or a generator of strings. The total length of the body is
+  known before anything is read, so it can be sent with a Content-Length
+  header. A body containing a generator can only be sent once.
+  """
+
+  def __init__(self, boundary=MULTIPART_BOUNDARY):
+    """
+    Create a new, empty instance of MultipartBody.
+
+    Args:
+      boundary  The multipart boundary string
+    """
+    self.boundary = boundary
+    self.parts = []
+    self.replayable = True
+    self.consumed = False
+
+  def add_field(self, name, value):
+    """
+    Add a simple form field to the body.
+
+    Args:
+      name  Name of the form field
+      value String value of the form field
+    """
+    header = 'Content-Disposition: form-data; name="{0}"'.format(name)
+    self.parts.append((self.__make_header(header), 'string', value, 0,
+      len(value)))
+
+  def add_file(self, file_name, source, length=None, name='file'):
+    """
+    Add a file to the body.
+
+    Args:
+      file_name Name of the file sent to the server
+      source    Content of the file: a string, a file object opened in
+                binary mode, an mmap or a generator of strings. File
+                objects are read from their current position onwards.
+      length    Number of bytes in the content. Only required (and
+                checked while sending) if the source is a generator.
+      name      Name of the form field
+
+    Raises:
+      ValueError  If the source is a generator and no length is given
+    """
+    if isinstance(source, str):
+      kind, offset, length = 'string', 0, len(source)
+    elif isinstance(source, mmap.mmap):
+      kind, offset, length = 'string', 0, len(source)
+    elif hasattr(source, 'read'):
+      kind, offset = 'file', source.tell()
+      if length is None:
+        source.seek(0, os.SEEK_END)
+        length = source.tell() - offset
+        source.seek(offset)
+    else:
+      if length is None:
+        raise ValueError('Length of a generated file must be specified')
+      kind, offset = 'generator', 0
+      self.replayable = False
+    self.parts.append((self.__make_file_header(file_name, name), kind,
+      source, offset, length))
+
+  def add_file_path(self, file_path, name='file'):
+    """
+    Add the file at the given path to the body. The file is opened and
+    read each time the body is sent.
+
+    Args:
+      file_path Path to the file
+      name      Name of the form field
+    """
+    self.parts.append((self.__make_file_header(os.path.basename(file_path),
+      name), 'path', file_path, 0, os.path.getsize(file_path)))
+
+  def get_content_type(self):
+    return 'multipart/form-data; boundary=%s' % self.boundary
+
+  def get_length(self):
+    """
+    Returns:
+      Total length of the encoded body in bytes
+    """
+    length = len(self.__make_trailer())
+    for header, _, _, _, part_length in self.parts:
+      length += len(header) + part_length + 2
+    return length
+
+  def iter_chunks(self, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Produce the encoded body.
+
+    Args:
+      chunk_size  Maximum number of bytes read from a source at once
+
+    Returns:
+      A generator of body chunks
+
+    Raises:
+      ValueError  If the body cannot be sent again or a generator did
+                  not produce the specified number of bytes
+    """
+    if self.consumed and not self.replayable:
+      raise ValueError('A body containing a generator can only be sent once')
+    self.consumed = True
+    for header, kind, source, offset, length in self.parts:
+      yield header
+      sent = 0
+      for chunk in self.__read_part(kind, source, offset, length, chunk_size):
+        sent += len(chunk)
+        yield chunk
+      if sent != length:
+        raise ValueError('Multipart file produced {0} bytes, expected '
+                         '{1}'.format(sent, length))
+      yield '\r\n'
+    yield self.__make_trailer()
+
+  def get_payload(self):
+    """
+    Returns:
+      The whole encoded body as a single string
+    """
+    return ''.join(self.iter_chunks())
+
+  def __make_header(self, disposition):
+    return '--{0}\r\n{1}\r\n\r\n'.format(self.boundary, disposition)
+
+  def __make_file_header(self, file_name, name):
+    # The upload server determines the mime-type, no need to set it.
+    return self.__make_header('Content-Disposition: form-data; name="{0}"; '
+      'filename="{1}"\r\nContent-Type: application/octet-stream'.format(name,
+      file_name))
+
+  def __make_trailer(self):
+    return '--{0}--\r\n'.format(self.boundary)
+
+  def __read_part(self, kind, source, offset, length, chunk_size):
+    if kind == 'string':
+      for start in range(0, length, chunk_size):
+        yield source[start:start + chunk_size]
+    elif kind == 'generator':
+      for chunk in source:
+        yield chunk
+    else:
+      if kind == 'path':
+        file_data = open(source, 'rb')
+      else:
+        file_data = source
+        file_data.seek(offset)
+      try:
+        remaining = length
+        while remaining > 0:
+          chunk = file_data.read(min(chunk_size, remaining))
+          if not chunk:
+            break
+          remaining -= len(chunk)
+          yield chunk
+      finally:
+        if kind == 'path':
+          file_data.close()
+
 def encode (file_name, content):
   """
   Encode the specified file name and content payload into a HTTP
@@ -410,29 +2253,28 @@ def encode (file_name, content):
     content   String payload to be uploaded
 
   Returns:
-    A HTTP multipart form request encoded payload string
+    A tuple of the form (content_type, body) where body is a HTTP
+    multipart form request encoded payload string
   """
 
   # Thanks Pietro Abate for the helpful post at:
   # http://mancoosi.org/~abate/upload-file-using-httplib
-  boundary = '----------boundary------'
-  delimiter = '\r\n'
-  body = []
-  body.extend(
-    ['--' + boundary,
-     'Content-Disposition: form-data; name="file"; filename="%s"'
-     % file_name,
-     # The upload server determines the mime-type, no need to set it.
-     'Content-Type: application/octet-stream',
-     '',
-     content,
-     ])
-  # Finalize the form body
-  body.extend(['--' + boundary + '--', ''])
-  return 'multipart/form-data; boundary=%s' % boundary, delimiter.join(body)
+  body = MultipartBody()
+  body.add_file(file_name, content)
+  return body.get_content_type(), body.get_payload()
 
 def encode_file(file_path):
-  file_data = open(file_path, 'rb')
-  content = file_data.read()
-  file_data.close()
-  return encode(os.path.basename(file_path), content)
\ No newline at end of file
+  """
+  Encode the file at the specified path into a HTTP file upload request.
+  The file is not read until the request is sent.
+
+  Args:
+    file_path Path to the file to be uploaded
+
+  Returns:
+    A tuple of the form (content_type, body) where body is a
+    MultipartBody that streams the file content
+  """
+  body = MultipartBody()
+  body.add_file_path(file_path)
+  return body.get_content_type(), body
@@ -0,0 +1,453 @@
+import base64
+import hawkeye_utils
+import json
+import Queue
+import random
+import threading
+import time
+import uuid
+
+FORM_HEADERS = { 'Content-Type' : 'application/x-www-form-urlencoded' }
+
+# Number of distinct memcache keys used by the memcache operations, so
+# that gets have a realistic chance of hitting a previously set key.
+MEMCACHE_KEY_SPACE = 1000
+
+# A replayed request handed over to a worker more than this many seconds
+# after it was due is counted as late
+REPLAY_LATE_TOLERANCE = 0.01
+
+def datastore_put(rand):
+  return 'POST', '/datastore/project', \
+    'name=load-{0}&description=Load Test&rating={1}&license=L{2}'.format(
+      uuid.uuid1(), rand.randint(1, 10), rand.randint(1, 2))
+
+def datastore_query(rand):
+  return 'GET', '/datastore/project_ratings?rating={0}&comparator=ge&' \
+                'limit=10'.format(rand.randint(1, 10)), None
+
+def ndb_put(rand):
+  return 'POST', '/ndb/project', \
+    'name=load-{0}&description=Load Test&rating={1}&license=L{2}'.format(
+      uuid.uuid1(), rand.randint(1, 10), rand.randint(1, 2))
+
+def ndb_query(rand):
+  return 'GET', '/ndb/project_ratings?rating={0}&comparator=ge&' \
+                'limit=10'.format(rand.randint(1, 10)), None
+
+def memcache_set(rand):
+  return 'POST', '/memcache', 'key=load-{0}&value={1}&update=true'.format(
+    rand.randint(0, MEMCACHE_KEY_SPACE - 1), uuid.uuid1())
+
+def memcache_get(rand):
+  return 'GET', '/memcache?key=load-{0}'.format(
+    rand.randint(0, MEMCACHE_KEY_SPACE - 1)), None
+
+def taskqueue_add(rand):
+  return 'POST', '/taskqueue/counter', 'key=load-{0}'.format(
+    rand.randint(0, MEMCACHE_KEY_SPACE - 1))
+
+# Operation name -> (request builder, expected status codes, languages)
+LOAD_OPERATIONS = {
+  'datastore_put' : (datastore_put, [ 201 ], [ 'java', 'python' ]),
+  'datastore_query' : (datastore_query, [ 200 ], [ 'java', 'python' ]),
+  'ndb_put' : (ndb_put, [ 201 ], [ 'python' ]),
+  'ndb_query' : (ndb_query, [ 200 ], [ 'python' ]),
+  'memcache_set' : (memcache_set, [ 200 ], [ 'java', 'python' ]),
+  'memcache_get' : (memcache_get, [ 200, 404 ], [ 'java', 'python' ]),
+  'taskqueue_add' : (taskqueue_add, [ 200 ], [ 'java', 'python' ]),
+}
+
+def parse_mix(mix, lang):
+  """
+  Parse a load mix specification of the form op1=weight1,op2=weight2.
+
+  Args:
+    mix   A load mix specification string
+    lang  Language binding under test
+
+  Returns:
+    A list of (operation name, weight) tuples
+
+  Raises:
+    ValueError  If the specification is malformed or refers to an
+                unknown operation or one not supported by the language
+  """
+  result = []
+  for entry in mix.split(','):
+    entry = entry.strip()
+    if '=' in entry:
+      name, weight = entry.split('=', 1)
+      weight = float(weight)
+    else:
+      name, weight = entry, 1.0
+    if not LOAD_OPERATIONS.has_key(name):
+      raise ValueError('Unsupported load operation: {0}'.format(name))
+    if lang not in LOAD_OPERATIONS[name][2]:
+      raise ValueError('Load operation {0} is not supported for {1}'.format(
+        name, lang))
+    if weight <= 0:
+      raise ValueError('Weight of {0} must be positive'.format(name))
+    result.append((name, weight))
+  return result
+
+def run_open_loop(schedule, issue, concurrency, tolerance):
+  """
+  Issue requests on an open-loop schedule: each request is handed over
+  to one of the worker threads at the time it is due, regardless of how
+  long earlier requests took. A request that could not be handed over
+  on time because the scheduler itself fell behind keeps its original
+  due time.
+
+  Args:
+    schedule    An iterable of (due time, request) tuples in due order
+    issue       A function that takes a request and its due time and
+                issues the request
+    concurrency Number of worker threads issuing requests, which bounds
+                the number of requests in flight
+    tolerance   Number of seconds a request may be handed over after it
+                was due before it is counted as late
+
+  Returns:
+    The number of requests that were handed over late
+  """
+  queue = Queue.Queue()
+  workers = []
+  for _ in range(concurrency):
+    worker = threading.Thread(target=process_scheduled_requests,
+      args=(queue, issue))
+    worker.daemon = True
+    worker.start()
+    workers.append(worker)
+
+  late = 0
+  for due, request in schedule:
+    now = time.time()
+    if due > now:
+      time.sleep(due - now)
+    elif now - due > tolerance:
+      late += 1
+    queue.put((due, request))
+  for _ in workers:
+    queue.put(None)
+  for worker in workers:
+    worker.join()
+  return late
+
+def process_scheduled_requests(queue, issue):
+  try:
+    while True:
+      item = queue.get()
+      if item is None:
+        break
+      due, request = item
+      issue(request, due)
+  finally:
+    hawkeye_utils.CONNECTION_POOL.close_all()
+
+class LoadGenerator:
+  """
+  Drives the endpoints exposed by the Hawkeye apps with a weighted mix
+  of operations for a fixed duration. Two scheduling modes are
+  supported. When a target rate is given, requests are issued on an
+  open-loop schedule: request i is due at start + i / rate regardless
+  of how long earlier requests took, and its latency is measured from
+  the time it was due. A slow server therefore shows up as growing
+  latency (queueing delay) instead of silently reducing the offered
+  load. The concurrency setting then only bounds the number of requests
+  in flight. Without a target rate, the generator runs closed-loop,
+  with each of the concurrent workers issuing requests back to back.
+  """
+
+  def __init__(self, mix, duration, rate=None, concurrency=16, seed=None):
+    """
+    Create a new instance of LoadGenerator.
+
+    Args:
+      mix         A list of (operation name, weight) tuples
+      duration    Number of seconds to generate load for
+      rate        Target request rate per second. If None, the
+                  generator runs in closed-loop mode.
+      concurrency Number of worker threads issuing requests
+      seed        Seed for the random choice of operations
+    """
+    self.mix = mix
+    self.duration = duration
+    self.rate = rate
+    self.concurrency = concurrency
+    self.random = random.Random(seed)
+    self.total_weight = sum(weight for _, weight in mix)
+    self.lock = threading.Lock()
+    self.stats = {}
+    for name, _ in mix:
+      self.stats[name] = self.new_stats()
+    self.late = 0
+    if rate is not None:
+      self.mode = 'open-loop'
+    else:
+      self.mode = 'closed-loop'
+
+  def run(self):
+    """
+    Generate load for the configured duration and wait for all the
+    outstanding requests to complete.
+
+    Returns:
+      A report dictionary (see LoadGenerator.get_report)
+    """
+    start = time.time()
+    if self.rate is not None:
+      self.late = run_open_loop(self.__iter_schedule(start),
+        self.__issue_request, self.concurrency, 1.0 / self.rate)
+      return self.get_report(time.time() - start)
+
+    workers = []
+    for _ in range(self.concurrency):
+      worker = threading.Thread(target=self.__issue_requests, args=(start,))
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+    for worker in workers:
+      worker.join()
+    return self.get_report(time.time() - start)
+
+  def get_report(self, elapsed):
+    """
+    Summarize the load generated so far.
+
+    Args:
+      elapsed Wall clock time of the run in seconds
+
+    Returns:
+      A dictionary containing the overall throughput and error rate
+      along with per operation counts, status codes, throughput and
+      latency percentiles (in milliseconds)
+    """
+    operations = {}
+    requests = 0
+    errors = 0
+    for name, stats in self.stats.items():
+      requests += stats['count']
+      errors += stats['errors']
+      operations[name] = {
+        'count' : stats['count'],
+        'errors' : stats['errors'],
+        'statuses' : stats['statuses'],
+        'throughput' : stats['count'] / elapsed,
+        'latency' : stats['latency'].summary(),
+        'service_time' : stats['service_time'].summary(),
+      }
+    return {
+      'mode' : self.mode,
+      'rate' : self.rate,
+      'concurrency' : self.concurrency,
+      'duration' : elapsed,
+      'requests' : requests,
+      'errors' : errors,
+      'error_rate' : float(errors) / max(requests, 1),
+      'throughput' : requests / elapsed,
+      'late' : self.late,
+      'operations' : operations,
+    }
+
+  def new_stats(self):
+    return {
+      'count' : 0,
+      'errors' : 0,
+      'statuses' : {},
+      'latency' : hawkeye_utils.LatencyHistogram(),
+      'service_time' : hawkeye_utils.LatencyHistogram(),
+    }
+
+  def record(self, name, status, failed, due, sent, done):
+    """
+    Record the outcome of a single request.
+
+    Args:
+      name    Name of the operation the request belongs to
+      status  Status code of the response, or the name of the exception
+              raised while making the request
+      failed  True if the request failed
+      due     Time the request was due
+      sent    Time the request was sent
+      done    Time the response was received
+    """
+    with self.lock:
+      stats = self.stats.get(name)
+      if stats is None:
+        stats = self.new_stats()
+        self.stats[name] = stats
+      stats['count'] += 1
+      stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+      if failed:
+        stats['errors'] += 1
+      stats['latency'].record((done - due) * 1000)
+      stats['service_time'].record((done - sent) * 1000)
+
+  def __choose_operation(self):
+    point = self.random.uniform(0, self.total_weight)
+    for name, weight in self.mix:
+      point -= weight
+      if point <= 0:
+        return name
+    return self.mix[-1][0]
+
+  def __iter_schedule(self, start):
+    """
+    Generate the open-loop schedule: request i is due at
+    start + i / rate.
+    """
+    interval = 1.0 / self.rate
+    index = 0
+    while True:
+      due = start + index * interval
+      if due >= start + self.duration:
+        break
+      yield due, self.__choose_operation()
+      index += 1
+
+  def __issue_requests(self, start):
+    try:
+      while time.time() < start + self.duration:
+        self.__issue_request(self.__choose_operation(), time.time())
+    finally:
+      hawkeye_utils.CONNECTION_POOL.close_all()
+
+  def __issue_request(self, name, due):
+    builder, expected, _ = LOAD_OPERATIONS[name]
+    with self.lock:
+      method, path, payload = builder(self.random)
+    if payload is not None:
+      headers = FORM_HEADERS
+    else:
+      headers = None
+
+    sent = time.time()
+    try:
+      response = hawkeye_utils.make_request(method, path, payload,
+        dict(headers or {}), source='load:' + name)
+      status = str(response.status)
+      failed = response.status not in expected
+    except Exception as exception:
+      status = exception.__class__.__name__
+      failed = True
+    self.record(name, status, failed, due, sent, time.time())
+
+def load_session(paths):
+  """
+  Load the requests recorded by hawkeye_utils.SessionRecorder. Several
+  record files (eg: those written by the workers of a parallel run) are
+  merged into a single session ordered by time.
+
+  Args:
+    paths A list of paths to record files
+
+  Returns:
+    A tuple of the form (requests, skipped) where requests is the list
+    of replayable request records and skipped is the number of records
+    that could not be replayed
+  """
+  requests = []
+  skipped = 0
+  for path in paths:
+    record_file = open(path.strip())
+    try:
+      for line in record_file:
+        if not line.strip():
+          continue
+        request = json.loads(line)
+        if request.get('skipped'):
+          skipped += 1
+        else:
+          requests.append(request)
+    finally:
+      record_file.close()
+  requests.sort(key=lambda request: request['time'])
+  return requests, skipped
+
+class SessionReplayer(LoadGenerator):
+  """
+  Replays a recorded session (see load_session) against the target
+  server using the same open-loop dispatch as LoadGenerator. Request i
+  is due at start + (t[i] - t[0]) / speed, where t are the recorded send
+  times, so the original inter-arrival timing is kept (compressed or
+  stretched by the speed multiplier) no matter how slowly the server
+  responds. Requests are aggregated by method and normalized path (see
+  hawkeye_utils.normalize_path). A request whose response status differs
+  from the recorded one is counted as an error.
+  """
+
+  def __init__(self, requests, speed=1.0, concurrency=16):
+    """
+    Create a new instance of SessionReplayer.
+
+    Args:
+      requests    A list of recorded requests ordered by time
+      speed       Factor by which the session is sped up
+      concurrency Maximum number of concurrent requests
+    """
+    LoadGenerator.__init__(self, [], None, concurrency=concurrency)
+    self.requests = requests
+    self.speed = speed
+    self.mode = 'replay x{0:g}'.format(speed)
+
+  def run(self):
+    """
+    Replay the session and wait for all the outstanding requests to
+    complete.
+
+    Returns:
+      A report dictionary (see LoadGenerator.get_report)
+    """
+    start = time.time()
+    self.late = run_open_loop(self.__iter_schedule(start),
+      self.__replay_request, self.concurrency, REPLAY_LATE_TOLERANCE)
+    return self.get_report(max(time.time() - start, 0.001))
+
+  def __iter_schedule(self, start):
+    if not self.requests:
+      return
+    first = self.requests[0]['time']
+    for request in self.requests:
+      yield start + (request['time'] - first) / self.speed, request
+
+  def __replay_request(self, request, due):
+    payload = request.get('payload')
+    if payload is not None:
+      payload = base64.b64decode(payload)
+    name = '{0} {1}'.format(request['method'],
+      hawkeye_utils.normalize_path(request['path']))
+
+    sent = time.time()
+    try:
+      response = hawkeye_utils.make_request(request['method'],
+        str(request['path']), payload, dict(request['headers']),
+        prepend_lang=False, ssl=request['ssl'], source='replay')
+      status = str(response.status)
+      failed = response.status != request['status']
+    except Exception as exception:
+      status = exception.__class__.__name__
+      failed = True
+    self.record(name, status, failed, due, sent, time.time())
+
+def print_load_report(report):
+  print '\nLoad Report ({0}, {1} workers, {2:.1f}s)'.format(report['mode'],
+    report['concurrency'], report['duration'])
+  print '=' * 50
+  width = max([ 16 ] + [ len(name) for name in report['operations'].keys() ])
+  print '{0:<{8}} {1:>7} {2:>7} {3:>9} {4:>8} {5:>8} {6:>8} {7:>8}'.format(
+    'Operation', 'Count', 'Errors', 'Req/s', 'p50', 'p90', 'p99', 'Max',
+    width)
+  print '(latencies in ms, measured from the time each request was due)'
+  for name in sorted(report['operations'].keys()):
+    operation = report['operations'][name]
+    latency = operation['latency']
+    print '{0:<{8}} {1:>7} {2:>7} {3:>9.1f} {4:>8.1f} {5:>8.1f} {6:>8.1f} ' \
+          '{7:>8.1f}'.format(name, operation['count'], operation['errors'],
+      operation['throughput'], latency['p50'], latency['p90'],
+      latency['p99'], latency['max'], width)
+  print 'Total: {0} requests, {1:.1f} req/s, {2:.2%} errors'.format(
+    report['requests'], report['throughput'], report['error_rate'])
+  if report['late']:
+    print 'Warning: {0} requests were dispatched late, the client could ' \
+          'not keep up with the target rate'.format(report['late'])
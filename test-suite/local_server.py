@@ -0,0 +1,1253 @@
+import base64
+import BaseHTTPServer
+import cgi
+import Cookie
+import json
+import re
+import Queue
+import SocketServer
+import ssl
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+
+# Number of threads executing push tasks
+TASK_WORKERS = 4
+
+LOGIN_COOKIE = 'dev_appserver_login'
+
+# Maximum number of entities the datastore accepts in a single put
+MAX_BATCH_SIZE = 500
+
+# Page sizes scanned by the cursor scan endpoints by default
+DEFAULT_SCAN_PAGE_SIZES = [ 1, 10, 100, 1000 ]
+
+# Suites exercising APIs the local server does not implement
+UNSUPPORTED_SUITES = [ 'images' ]
+
+def encode_key(key):
+  """
+  Encode a datastore key (a tuple of (kind, id or name) pairs) into a
+  URL safe string, like ndb.Key.urlsafe does.
+  """
+  return base64.urlsafe_b64encode(json.dumps(key))
+
+def decode_key(value):
+  """
+  Decode a key encoded by encode_key.
+
+  Raises:
+    ValueError  If the value is not a valid encoded key
+  """
+  try:
+    path = json.loads(base64.urlsafe_b64decode(str(value)))
+    return tuple((str(kind), id) for kind, id in path)
+  except (TypeError, ValueError):
+    raise ValueError('Invalid key: {0}'.format(value))
+
+def get_kind(key):
+  return key[-1][0]
+
+class LocalDatastore:
+  """
+  A thread safe, in-memory stand-in for the App Engine datastore.
+  Entities are dictionaries of property values identified by keys. A
+  key is a tuple of (kind, id or name) pairs, starting with the root
+  entity of the entity group, so sorting keys yields the same order as
+  the datastore's key order (numeric ids before names, children right
+  after their parent).
+  """
+
+  def __init__(self):
+    self.lock = threading.RLock()
+    self.entities = {}
+    self.next_id = 1
+
+  def allocate_id(self):
+    with self.lock:
+      self.next_id += 1
+      return self.next_id - 1
+
+  def put(self, key, properties):
+    with self.lock:
+      self.entities[key] = dict(properties)
+    return key
+
+  def put_multi(self, entities):
+    """
+    Store a list of (key, properties) tuples atomically.
+    """
+    with self.lock:
+      for key, properties in entities:
+        self.entities[key] = dict(properties)
+
+  def get(self, key):
+    """
+    Returns:
+      A copy of the properties of the entity, or None if it does not exist
+    """
+    with self.lock:
+      properties = self.entities.get(key)
+      if properties is not None:
+        return dict(properties)
+      return None
+
+  def delete(self, keys):
+    with self.lock:
+      for key in keys:
+        self.entities.pop(key, None)
+
+  def query(self, kind=None, ancestor=None):
+    """
+    Find the entities of a kind (or of all kinds), optionally restricted
+    to the descendants of an ancestor (including the ancestor itself).
+
+    Returns:
+      A list of (key, properties) tuples in key order
+    """
+    with self.lock:
+      result = []
+      for key, properties in self.entities.items():
+        if kind is not None and get_kind(key) != kind:
+          continue
+        if ancestor is not None and key[:len(ancestor)] != ancestor:
+          continue
+        result.append((key, dict(properties)))
+    return sorted(result)
+
+  def run_in_transaction(self, function, *args):
+    """
+    Run the given function while holding the datastore lock. If the
+    function raises an exception, all the changes it made are undone.
+    """
+    with self.lock:
+      snapshot = dict(self.entities)
+      try:
+        return function(*args)
+      except Exception:
+        self.entities = snapshot
+        raise
+
+class LocalMemcache:
+  """
+  An in-memory stand-in for the App Engine memcache API.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.values = {}
+
+  def get(self, key):
+    with self.lock:
+      entry = self.values.get(key)
+      if entry is None:
+        return None
+      value, expires = entry
+      if expires is not None and expires <= time.time():
+        del self.values[key]
+        return None
+      return value
+
+  def set(self, key, value, timeout, add_only=False):
+    """
+    Store a value, replacing any existing one unless add_only is set.
+
+    Returns:
+      True if the value was stored and False otherwise
+    """
+    if add_only and self.get(key) is not None:
+      return False
+    expires = None
+    if timeout:
+      expires = time.time() + timeout
+    with self.lock:
+      self.values[key] = (value, expires)
+    return True
+
+  def delete(self, key):
+    with self.lock:
+      self.values.pop(key, None)
+
+class LocalTaskQueue:
+  """
+  An in-memory stand-in for the App Engine task queue API. Push tasks
+  are executed asynchronously by a pool of worker threads, each task
+  incrementing a TaskCounter entity like the worker of the Hawkeye app
+  does. Pull tasks are kept until they are leased.
+  """
+
+  def __init__(self, datastore):
+    self.datastore = datastore
+    self.queue = Queue.Queue()
+    self.lock = threading.Lock()
+    self.executed = []
+    self.pull_tasks = []
+    for _ in range(TASK_WORKERS):
+      worker = threading.Thread(target=self.__execute_tasks)
+      worker.daemon = True
+      worker.start()
+
+  def add(self, key):
+    self.queue.put(key)
+
+  def add_pull_task(self, payload):
+    with self.lock:
+      self.pull_tasks.append(payload)
+
+  def lease_pull_tasks(self, count):
+    with self.lock:
+      leased = self.pull_tasks[:count]
+      del self.pull_tasks[:count]
+      return leased
+
+  def process(self, key):
+    counter_key = (('TaskCounter', key),)
+    def increment():
+      counter = self.datastore.get(counter_key) or { 'count' : 0 }
+      counter['count'] += 1
+      self.datastore.put(counter_key, counter)
+    self.datastore.run_in_transaction(increment)
+
+  def get_stats(self):
+    now = time.time()
+    with self.lock:
+      self.executed = [ t for t in self.executed if t > now - 60 ]
+      return {
+        'queue' : 'default',
+        'tasks' : self.queue.qsize(),
+        'oldest_eta' : None,
+        'exec_last_minute' : len(self.executed),
+        'in_flight' : 0,
+      }
+
+  def __execute_tasks(self):
+    while True:
+      key = self.queue.get()
+      self.process(key)
+      with self.lock:
+        self.executed.append(time.time())
+
+class LocalBlobstore:
+  """
+  An in-memory stand-in for the App Engine blobstore API.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.blobs = {}
+
+  def create(self, file_name, data):
+    key = uuid.uuid4().hex
+    with self.lock:
+      self.blobs[key] = { 'filename' : file_name, 'data' : data,
+                          'size' : len(data) }
+    return key
+
+  def get(self, key):
+    with self.lock:
+      return self.blobs.get(key)
+
+  def find(self, predicate):
+    with self.lock:
+      return [ blob for blob in self.blobs.values() if predicate(blob) ]
+
+  def delete(self, key):
+    with self.lock:
+      return self.blobs.pop(key, None) is not None
+
+class LocalRequest:
+  """
+  A parsed HTTP request handed to the route handlers of LocalServer.
+  Like webapp2.Request.get, the get method looks up a parameter in the
+  query string and the form encoded body, and returns an empty string
+  if the parameter is missing.
+  """
+
+  def __init__(self, method, path, query, headers, body, secure, host):
+    self.method = method
+    self.path = path
+    self.headers = headers
+    self.body = body
+    self.secure = secure
+    self.host = host
+    self.params = urlparse.parse_qs(query, keep_blank_values=True)
+    content_type = headers.get('content-type', '')
+    if body and content_type.startswith('application/x-www-form-urlencoded'):
+      for name, values in urlparse.parse_qs(body,
+          keep_blank_values=True).items():
+        self.params.setdefault(name, []).extend(values)
+    self.cookies = Cookie.SimpleCookie()
+    if headers.get('cookie'):
+      try:
+        self.cookies.load(headers.get('cookie'))
+      except Cookie.CookieError:
+        pass
+
+  def get(self, name):
+    values = self.params.get(name)
+    if values:
+      return values[0]
+    return ''
+
+  def get_user(self):
+    """
+    Returns:
+      A tuple of the form (email, admin) for the logged in user, or
+      None if the request does not carry a login cookie
+    """
+    morsel = self.cookies.get(LOGIN_COOKIE)
+    if morsel is None or ':' not in morsel.value:
+      return None
+    email, admin = morsel.value.split(':', 1)
+    return email, admin == 'True'
+
+class LocalResponse:
+  def __init__(self, status=200, body='', content_type='application/json',
+               headers=None):
+    self.status = status
+    self.body = body
+    self.headers = { 'Content-Type' : content_type }
+    if headers:
+      self.headers.update(headers)
+
+def get_percentile(values, percentile):
+  if not values:
+    return 0
+  return values[int(round(percentile / 100.0 * (len(values) - 1)))]
+
+def summarize_scan(page_size, entities, elapsed, latencies, encode_times,
+                   decode_times):
+  """
+  Summarize a cursor scan in the format of the cursor scan endpoints of
+  the Python app (see python-app/utils.py).
+  """
+  latencies = sorted(latencies)
+  mean = lambda values: sum(values) / max(len(values), 1)
+  return {
+    'page_size' : page_size,
+    'entities' : entities,
+    'pages' : len(latencies),
+    'elapsed' : elapsed,
+    'complete' : True,
+    'entities_per_second' : entities / elapsed if elapsed > 0 else 0.0,
+    'page_latency' : {
+      'mean' : mean(latencies) * 1000,
+      'p50' : get_percentile(latencies, 50) * 1000,
+      'p90' : get_percentile(latencies, 90) * 1000,
+      'p99' : get_percentile(latencies, 99) * 1000,
+      'max' : get_percentile(latencies, 100) * 1000,
+    },
+    'cursors' : len(encode_times),
+    'cursor_encode_us' : mean(encode_times) * 1000000,
+    'cursor_decode_us' : mean(decode_times) * 1000000,
+  }
+
+def json_response(data, status=200):
+  return LocalResponse(status, json.dumps(data))
+
+def redirect(location):
+  return LocalResponse(302, '', 'text/plain', { 'Location' : location })
+
+class HawkeyeApp:
+  """
+  In-memory implementation of the /python routes of the Hawkeye Python
+  app (datastore, ndb, memcache, taskqueue, blobstore, users and secure
+  URLs). The handlers mirror the request parameters and the responses
+  of the corresponding webapp2 handlers under python-app/. Each route
+  maps to a method named {method}_{handler} (eg: get_project).
+  """
+
+  ROUTES = [
+    (r'/python/datastore/project$', 'project'),
+    (r'/python/datastore/module$', 'module'),
+    (r'/python/datastore/batch$', 'batch'),
+    (r'/python/datastore/project_modules$', 'project_modules'),
+    (r'/python/datastore/project_keys$', 'project_keys'),
+    (r'/python/datastore/entity_names$', 'entity_names'),
+    (r'/python/datastore/project_ratings$', 'project_ratings'),
+    (r'/python/datastore/project_fields$', 'project_fields'),
+    (r'/python/datastore/project_filter$', 'project_filter'),
+    (r'/python/datastore/project_cursor$', 'project_cursor'),
+    (r'/python/datastore/cursor_scan$', 'cursor_scan'),
+    (r'/python/datastore/complex_cursor$', 'complex_cursor'),
+    (r'/python/datastore/transactions$', 'transactions'),
+    (r'/python/datastore/query_stats$', 'query_stats'),
+    (r'/python/ndb/project$', 'ndb_project'),
+    (r'/python/ndb/module$', 'ndb_module'),
+    (r'/python/ndb/project_modules$', 'ndb_project_modules'),
+    (r'/python/ndb/project_ratings$', 'ndb_project_ratings'),
+    (r'/python/ndb/project_fields$', 'ndb_project_fields'),
+    (r'/python/ndb/project_filter$', 'ndb_project_filter'),
+    (r'/python/ndb/project_license_filter$', 'ndb_project_license_filter'),
+    (r'/python/ndb/transactions$', 'ndb_transactions'),
+    (r'/python/ndb/project_cursor$', 'ndb_project_cursor'),
+    (r'/python/ndb/cursor_scan$', 'ndb_cursor_scan'),
+    (r'/python/memcache$', 'memcache'),
+    (r'/python/memcache/multi$', 'memcache_multi'),
+    (r'/python/taskqueue/counter$', 'task_counter'),
+    (r'/python/taskqueue/worker$', 'task_worker'),
+    (r'/python/taskqueue/pull$', 'pull_task'),
+    (r'/python/blobstore/url$', 'blob_url'),
+    (r'/python/blobstore/upload$', 'blob_upload'),
+    (r'/python/blobstore/download/(.*)$', 'blob_download'),
+    (r'/python/blobstore/query$', 'blob_query'),
+    (r'/python/users/secure$', 'users_secure'),
+    (r'/python/users/home$', 'users_home'),
+    (r'/python/secure/always$', 'secure_always'),
+    (r'/python/secure/never$', 'secure_never'),
+    (r'/_ah/login$', 'login'),
+  ]
+
+  RATING_COMPARATORS = {
+    '' : lambda a, b: a == b,
+    'eq' : lambda a, b: a == b,
+    'gt' : lambda a, b: a > b,
+    'ge' : lambda a, b: a >= b,
+    'lt' : lambda a, b: a < b,
+    'le' : lambda a, b: a <= b,
+    'ne' : lambda a, b: a != b,
+  }
+
+  def __init__(self, port, ssl_port=None):
+    """
+    Create a new instance of HawkeyeApp.
+
+    Args:
+      port      Port the app is served on over HTTP
+      ssl_port  Port the app is served on over HTTPS (None if HTTPS
+                is not available)
+    """
+    self.port = port
+    self.ssl_port = ssl_port
+    self.datastore = LocalDatastore()
+    self.memcache = LocalMemcache()
+    self.taskqueue = LocalTaskQueue(self.datastore)
+    self.blobstore = LocalBlobstore()
+    self.routes = [ (re.compile(pattern), name)
+                    for pattern, name in self.ROUTES ]
+
+  def dispatch(self, request):
+    """
+    Route the given request to its handler.
+
+    Args:
+      request A LocalRequest instance
+
+    Returns:
+      A LocalResponse instance
+    """
+    for pattern, name in self.routes:
+      match = pattern.match(request.path)
+      if match is None:
+        continue
+      handler = getattr(self, '{0}_{1}'.format(request.method.lower(), name),
+        None)
+      if handler is None:
+        return LocalResponse(405, '', 'text/plain')
+      try:
+        response = handler(request, *match.groups())
+      except Exception as exception:
+        return LocalResponse(500, str(exception), 'text/plain')
+      if response is None:
+        response = LocalResponse(200, '', 'text/html')
+      return response
+    return LocalResponse(404, '', 'text/plain')
+
+  # Datastore (db API)
+
+  def serialize(self, key, entity, fields=None):
+    kind = get_kind(key)
+    data = { 'name' : entity.get('name'),
+             'description' : entity.get('description') }
+    if kind == 'Project':
+      data['project_id'] = entity.get('project_id')
+      data['type'] = 'project'
+      data['rating'] = entity.get('rating')
+      data['license'] = entity.get('license')
+    elif kind == 'Module':
+      data['module_id'] = entity.get('module_id')
+      data['type'] = 'module'
+    else:
+      data['type'] = 'unknown'
+    if fields is not None:
+      for name in data.keys():
+        if name != 'type' and name not in fields:
+          data[name] = None
+    return data
+
+  def serialize_all(self, entities, fields=None):
+    return json_response([ self.serialize(key, entity, fields)
+                           for key, entity in entities ])
+
+  def serialize_results(self, entities, request, serialize):
+    """
+    Serialize the results of a list endpoint like the Python app does:
+    all of them as a JSON array or, if the page_size parameter is set,
+    the page that starts after the cursor parameter as a JSON object
+    containing the results and the cursor of the next page. As in the
+    Python app, the next cursor is omitted once a page comes back short.
+
+    Args:
+      entities  A list of (key, properties) tuples in key order
+      request   A LocalRequest instance
+      serialize A function that serializes a key and its properties
+    """
+    page_size = request.get('page_size')
+    if not page_size:
+      return json_response([ serialize(key, entity)
+                             for key, entity in entities ])
+    page_size = int(page_size)
+    if page_size < 1:
+      raise ValueError('Invalid page size')
+    cursor = request.get('cursor')
+    if cursor:
+      last_key = decode_key(cursor)
+      entities = [ e for e in entities if e[0] > last_key ]
+    entities = entities[:page_size]
+    next = None
+    if len(entities) == page_size:
+      next = encode_key(entities[-1][0])
+    return json_response({ 'results' : [ serialize(key, entity)
+                                         for key, entity in entities ],
+                           'next' : next })
+
+  def find_project(self, name, value):
+    for key, entity in self.datastore.query('Project'):
+      if entity[name] == value:
+        return key, entity
+    raise IndexError('The query returned no results')
+
+  def get_project(self, request):
+    id = request.get('id')
+    name = request.get('name')
+    entities = self.datastore.query('Project')
+    if id.strip():
+      entities = [ e for e in entities if e[1]['project_id'] == id ]
+    elif name:
+      entities = [ e for e in entities if e[1]['name'] == name ]
+    return self.serialize_results(entities, request, self.serialize)
+
+  def post_project(self, request):
+    project_id = str(uuid.uuid1())
+    name = request.get('name')
+    self.datastore.put((('Project', name),), {
+      'project_id' : project_id,
+      'name' : name,
+      'rating' : int(request.get('rating')),
+      'description' : request.get('description'),
+      'license' : request.get('license'),
+    })
+    return json_response({ 'success' : True, 'project_id' : project_id }, 201)
+
+  def delete_all(self, kind, request):
+    """
+    Delete all the entities of a kind that come after the given cursor in
+    key order, like the bulk deletes of the Python app, optionally only
+    those whose name starts with the name_prefix parameter. The in-memory
+    store has no request deadline, so the deletion always completes and
+    never hands back a cursor to resume from.
+    """
+    entities = self.datastore.query(kind)
+    cursor = request.get('cursor')
+    if cursor:
+      last_key = decode_key(cursor)
+      entities = [ e for e in entities if e[0] > last_key ]
+    name_prefix = request.get('name_prefix')
+    if name_prefix:
+      entities = [ e for e in entities
+                   if e[1].get('name', '').startswith(name_prefix) ]
+    self.datastore.delete([ key for key, _ in entities ])
+    return json_response({ 'success' : True, 'deleted' : len(entities),
+                           'cursor' : None })
+
+  def delete_project(self, request):
+    return self.delete_all('Project', request)
+
+  def get_module(self, request):
+    id = request.get('id')
+    entities = self.datastore.query('Module')
+    if id.strip():
+      entities = [ e for e in entities if e[1]['module_id'] == id ]
+    return self.serialize_results(entities, request, self.serialize)
+
+  def post_module(self, request):
+    parent, _ = self.find_project('project_id', request.get('project_id'))
+    module_id = str(uuid.uuid1())
+    name = request.get('name')
+    self.datastore.put(parent + (('Module', name),), {
+      'module_id' : module_id,
+      'name' : name,
+      'description' : request.get('description'),
+    })
+    return json_response({ 'success' : True, 'module_id' : module_id }, 201)
+
+  def delete_module(self, request):
+    return self.delete_all('Module', request)
+
+  def post_batch(self, request):
+    batch_size = min(int(request.get('batch_size') or MAX_BATCH_SIZE),
+      MAX_BATCH_SIZE)
+    if batch_size < 1:
+      raise ValueError('Invalid batch size')
+    projects = []
+    modules = []
+    ids = []
+    for item in json.loads(request.body):
+      type = item.get('type', 'project')
+      if type == 'project':
+        project_id = str(uuid.uuid1())
+        projects.append(((('Project', item['name']),), {
+          'project_id' : project_id,
+          'name' : item['name'],
+          'rating' : int(item['rating']),
+          'description' : item['description'],
+          'license' : item['license'],
+        }))
+        ids.append(project_id)
+      elif type == 'module':
+        if item.get('project_name'):
+          parent = (('Project', item['project_name']),)
+        else:
+          parent, _ = self.find_project('project_id', item['project_id'])
+        module_id = str(uuid.uuid1())
+        modules.append((parent + (('Module', item['name']),), {
+          'module_id' : module_id,
+          'name' : item['name'],
+          'description' : item['description'],
+        }))
+        ids.append(module_id)
+      else:
+        raise ValueError('Unsupported entity type: {0}'.format(type))
+    entities = projects + modules
+    puts = 0
+    for start in range(0, len(entities), batch_size):
+      self.datastore.put_multi(entities[start:start + batch_size])
+      puts += 1
+    return json_response({ 'success' : True, 'ids' : ids, 'puts' : puts },
+      201)
+
+  def get_project_modules(self, request):
+    ancestor, _ = self.find_project('project_id', request.get('project_id'))
+    return self.serialize_all(self.datastore.query(ancestor=ancestor))
+
+  def get_project_keys(self, request):
+    project_key, _ = self.find_project('project_id',
+      request.get('project_id'))
+    ancestor = None
+    if request.get('ancestor') == 'true':
+      ancestor = project_key
+    comparator = request.get('comparator')
+    if comparator == 'ge':
+      matches = lambda key: key >= project_key
+    elif comparator == 'gt':
+      matches = lambda key: key > project_key
+    else:
+      raise Exception('Unsupported comparator')
+    return self.serialize_all([ (key, entity) for key, entity
+      in self.datastore.query(ancestor=ancestor) if matches(key) and
+      get_kind(key) in ('Project', 'Module') ])
+
+  def get_entity_names(self, request):
+    project_name = request.get('project_name')
+    module_name = request.get('module_name')
+    if not project_name:
+      raise Exception('Missing parameters')
+    if module_name:
+      parent, _ = self.find_project('name', project_name)
+      key = parent + (('Module', module_name),)
+    else:
+      key = (('Project', project_name),)
+    entity = self.datastore.get(key)
+    if entity is None:
+      return json_response(None)
+    return json_response(self.serialize(key, entity))
+
+  def filter_ratings(self, request, kind):
+    comparator = request.get('comparator')
+    if not self.RATING_COMPARATORS.has_key(comparator):
+      raise Exception('Unsupported comparator')
+    matches = self.RATING_COMPARATORS[comparator]
+    rating = int(request.get('rating'))
+    entities = [ (key, entity) for key, entity in self.datastore.query(kind)
+                 if matches(entity['rating'], rating) ]
+    if comparator not in ('', 'eq'):
+      entities.sort(key=lambda e: e[1]['rating'])
+    if request.get('desc') == 'true':
+      entities.sort(key=lambda e: e[1]['rating'], reverse=True)
+    limit = request.get('limit')
+    if limit:
+      entities = entities[:int(limit)]
+    return entities
+
+  def get_project_ratings(self, request):
+    return self.serialize_all(self.filter_ratings(request, 'Project'))
+
+  def get_project_fields(self, request):
+    fields = request.get('fields').split(',')
+    rate_limit = request.get('rate_limit')
+    entities = self.datastore.query('Project')
+    if request.get('gql') != 'true' and rate_limit and 'rating' in fields:
+      entities = [ e for e in entities if e[1]['rating'] >= int(rate_limit) ]
+    return self.serialize_all(entities, fields)
+
+  def get_project_filter(self, request):
+    license = request.get('license')
+    rate_limit = int(request.get('rate_limit'))
+    return self.serialize_all([ (key, entity) for key, entity
+      in self.datastore.query('Project') if entity['license'] == license and
+      entity['rating'] >= rate_limit ])
+
+  def fetch_page(self, kind, cursor, page_size):
+    """
+    Fetch the entities of a kind that come after the given cursor in
+    key order.
+
+    Returns:
+      A tuple of the form (entities, next cursor)
+    """
+    entities = self.datastore.query(kind)
+    if cursor:
+      last_key = decode_key(cursor)
+      entities = [ e for e in entities if e[0] > last_key ]
+    entities = entities[:page_size]
+    if entities:
+      return entities, encode_key(entities[-1][0])
+    return entities, cursor
+
+  def scan_with_cursors(self, kind, page_size):
+    """
+    Scan all the entities of a kind page by page, encoding the key of the
+    last entity of each page into a cursor and decoding it to start the
+    next page, like the cursor scan endpoints of the Python app.
+    """
+    latencies = []
+    encode_times = []
+    decode_times = []
+    scanned = 0
+    cursor = None
+    start = time.time()
+    while True:
+      page_start = time.time()
+      entities = self.datastore.query(kind)
+      if cursor is not None:
+        entities = [ e for e in entities if e[0] > cursor ]
+      entities = entities[:page_size]
+      latencies.append(time.time() - page_start)
+      scanned += len(entities)
+      if len(entities) < page_size:
+        break
+      encode_start = time.time()
+      value = encode_key(entities[-1][0])
+      encode_times.append(time.time() - encode_start)
+      decode_start = time.time()
+      cursor = decode_key(value)
+      decode_times.append(time.time() - decode_start)
+    return summarize_scan(page_size, scanned, time.time() - start, latencies,
+      encode_times, decode_times)
+
+  def cursor_scan(self, request, default_kind):
+    kind = request.get('kind') or default_kind
+    page_sizes = DEFAULT_SCAN_PAGE_SIZES
+    if request.get('page_sizes'):
+      page_sizes = [ int(size) for size in request.get('page_sizes').split(',') ]
+    return json_response([ self.scan_with_cursors(kind, page_size)
+                           for page_size in page_sizes ])
+
+  def get_cursor_scan(self, request):
+    return self.cursor_scan(request, 'Project')
+
+  def get_project_cursor(self, request):
+    entities, cursor = self.fetch_page('Project', request.get('cursor'), 1)
+    if entities:
+      return json_response({ 'project' : entities[0][1]['name'],
+                             'next' : cursor })
+    return json_response({ 'project' : None, 'next' : None })
+
+  def get_complex_cursor(self, request):
+    company = (('Company', self.datastore.allocate_id()),)
+    self.datastore.put(company, { 'name' : 'AppScale' })
+    for name in ('A', 'B', 'C', 'D'):
+      employee = company + (('Employee', self.datastore.allocate_id()),)
+      self.datastore.put(employee, { 'name' : name })
+      self.datastore.put(employee + (('PhoneNumber',
+        self.datastore.allocate_id()),), { 'work' : name * 10 })
+    try:
+      seen = set()
+      cursor = None
+      while True:
+        entities, cursor = self.fetch_page('Employee', cursor, 1)
+        if not entities:
+          break
+        if entities[0][0] in seen:
+          raise Exception('Saw same result twice')
+        seen.add(entities[0][0])
+      success = len(seen) == 4
+    finally:
+      for kind in ('Company', 'Employee', 'PhoneNumber'):
+        self.datastore.delete([ key for key, _ in self.datastore.query(kind) ])
+    if not success:
+      return LocalResponse(500, json.dumps({ 'success' : False }))
+    return json_response({ 'success' : True })
+
+  def run_transaction(self, kind, request):
+    """
+    Increment a counter (and a backup counter if xg=true) the requested
+    number of times in a transaction that fails when the counter
+    reaches 5, like the transaction handlers of the Hawkeye app.
+    """
+    key = request.get('key')
+    amount = int(request.get('amount'))
+    keys = [ ((kind, key),) ]
+    if request.get('xg') == 'true':
+      keys.append(((kind, key + '_backup'),))
+
+    def increment():
+      counters = [ self.datastore.get(k) or { 'counter' : 0 } for k in keys ]
+      for _ in range(amount):
+        for counter in counters:
+          counter['counter'] += 1
+        if counters[0]['counter'] == 5:
+          raise Exception('Mock Exception')
+        for k, counter in zip(keys, counters):
+          self.datastore.put(k, counter)
+
+    try:
+      self.datastore.run_in_transaction(increment)
+      status = { 'success' : True }
+    except Exception:
+      status = { 'success' : False }
+    status['counter'] = self.datastore.get(keys[0])['counter']
+    if len(keys) > 1:
+      status['backup'] = self.datastore.get(keys[1])['counter']
+    return json_response(status)
+
+  def get_transactions(self, request):
+    return self.run_transaction('Counter', request)
+
+  def delete_transactions(self, request):
+    return self.delete_all('Counter', request)
+
+  def get_query_stats(self, request):
+    # There is no GQL to parse, so nothing is ever cached
+    return json_response({ 'hits' : 0, 'misses' : 0, 'hit_rate' : 0.0,
+                           'parse_time' : 0.0, 'saved_parse_time' : 0.0 })
+
+  def delete_query_stats(self, request):
+    pass
+
+  # Datastore (ndb API)
+
+  def ndb_serialize(self, key, entity, fields=None):
+    data = {}
+    kind = get_kind(key)
+    if kind == 'NDBProject':
+      data['project_id'] = encode_key(key)
+      data['type'] = 'project'
+      for name in ('name', 'description', 'rating', 'license'):
+        if fields is None or name in fields:
+          data[name] = entity[name]
+        else:
+          data[name] = None
+    elif kind == 'NDBModule':
+      data['name'] = entity['name']
+      data['description'] = entity['description']
+      data['module_id'] = encode_key(key)
+      data['type'] = 'module'
+    else:
+      data['type'] = 'unknown'
+    return data
+
+  def ndb_serialize_all(self, entities, fields=None):
+    return json_response([ self.ndb_serialize(key, entity, fields)
+                           for key, entity in entities ])
+
+  def get_ndb_project(self, request):
+    id = request.get('id')
+    if id.strip():
+      key = decode_key(id)
+      entities = [ (key, self.datastore.get(key)) ]
+    else:
+      entities = self.datastore.query('NDBProject')
+    return self.serialize_results(entities, request, self.ndb_serialize)
+
+  def post_ndb_project(self, request):
+    key = self.datastore.put((('NDBProject', self.datastore.allocate_id()),), {
+      'name' : request.get('name'),
+      'rating' : int(request.get('rating')),
+      'description' : request.get('description'),
+      'license' : request.get('license'),
+    })
+    return json_response({ 'success' : True,
+                           'project_id' : encode_key(key) }, 201)
+
+  def delete_ndb_project(self, request):
+    return self.delete_all('NDBProject', request)
+
+  def get_ndb_module(self, request):
+    id = request.get('id')
+    if id.strip():
+      key = decode_key(id)
+      entities = [ (key, self.datastore.get(key)) ]
+    else:
+      entities = self.datastore.query('NDBModule')
+    return self.serialize_results(entities, request, self.ndb_serialize)
+
+  def post_ndb_module(self, request):
+    parent = decode_key(request.get('project_id'))
+    key = self.datastore.put(parent + (('NDBModule',
+      self.datastore.allocate_id()),), {
+      'name' : request.get('name'),
+      'description' : request.get('description'),
+    })
+    return json_response({ 'success' : True,
+                           'module_id' : encode_key(key) }, 201)
+
+  def delete_ndb_module(self, request):
+    return self.delete_all('NDBModule', request)
+
+  def get_ndb_project_modules(self, request):
+    return self.ndb_serialize_all(self.datastore.query('NDBModule',
+      decode_key(request.get('project_id'))))
+
+  def get_ndb_project_ratings(self, request):
+    return self.ndb_serialize_all(self.filter_ratings(request, 'NDBProject'))
+
+  def get_ndb_project_fields(self, request):
+    fields = request.get('fields').split(',')
+    rate_limit = request.get('rate_limit')
+    entities = self.datastore.query('NDBProject')
+    if rate_limit and 'rating' in fields:
+      entities = [ e for e in entities if e[1]['rating'] >= int(rate_limit) ]
+    return self.ndb_serialize_all(entities, fields)
+
+  def get_ndb_project_filter(self, request):
+    license = request.get('license')
+    rate_limit = int(request.get('rate_limit'))
+    return self.ndb_serialize_all([ (key, entity) for key, entity
+      in self.datastore.query('NDBProject') if entity['license'] == license
+      and entity['rating'] >= rate_limit ])
+
+  def get_ndb_project_license_filter(self, request):
+    licenses = request.get('licenses').split(',')
+    return self.ndb_serialize_all([ (key, entity) for key, entity
+      in self.datastore.query('NDBProject') if entity['license'] in licenses ])
+
+  def get_ndb_transactions(self, request):
+    return self.run_transaction('NDBCounter', request)
+
+  def delete_ndb_transactions(self, request):
+    return self.delete_all('NDBCounter', request)
+
+  def get_ndb_cursor_scan(self, request):
+    return self.cursor_scan(request, 'NDBProject')
+
+  def get_ndb_project_cursor(self, request):
+    entities, cursor = self.fetch_page('NDBProject', request.get('cursor'), 1)
+    if entities:
+      return json_response({ 'project' : entities[0][1]['name'],
+                             'next' : cursor })
+    return json_response({ 'project' : None, 'next' : None })
+
+  # Memcache
+
+  def get_timeout(self, request):
+    timeout = request.get('timeout')
+    if not timeout:
+      return 3600
+    return int(timeout)
+
+  def get_memcache(self, request):
+    value = self.memcache.get(request.get('key'))
+    if value is None:
+      return LocalResponse(404, '')
+    return json_response({ 'value' : value })
+
+  def post_memcache(self, request):
+    success = self.memcache.set(request.get('key'), request.get('value'),
+      self.get_timeout(request), request.get('update') != 'true')
+    return json_response({ 'success' : success })
+
+  def delete_memcache(self, request):
+    self.memcache.delete(request.get('key'))
+    return json_response({ 'success' : True })
+
+  def get_memcache_multi(self, request):
+    values = {}
+    for key in request.get('keys').split(','):
+      value = self.memcache.get(key)
+      if value is not None:
+        values[key] = value
+    return json_response(values)
+
+  def post_memcache_multi(self, request):
+    timeout = self.get_timeout(request)
+    add_only = request.get('update') != 'true'
+    failed_keys = []
+    for key, value in zip(request.get('keys').split(','),
+                          request.get('values').split(',')):
+      if not self.memcache.set(key, value, timeout, add_only):
+        failed_keys.append(key)
+    if not failed_keys:
+      return json_response({ 'success' : True })
+    return json_response({ 'success' : False, 'failed_keys' : failed_keys })
+
+  def delete_memcache_multi(self, request):
+    for key in request.get('keys').split(','):
+      self.memcache.delete(key)
+    return json_response({ 'success' : True })
+
+  # Task queue
+
+  def get_task_counter(self, request):
+    key = request.get('key')
+    if key:
+      counter = self.datastore.get((('TaskCounter', key),))
+      if counter is None:
+        return LocalResponse(404, '')
+      return json_response({ key : counter['count'] })
+    elif request.get('stats') == 'true':
+      return json_response(self.taskqueue.get_stats())
+
+  def post_task_counter(self, request):
+    self.taskqueue.add(request.get('key'))
+    return json_response({ 'status' : True })
+
+  def delete_task_counter(self, request):
+    self.datastore.delete([ key for key, _ in
+                            self.datastore.query('TaskCounter') ])
+
+  def get_task_worker(self, request):
+    self.taskqueue.process(request.get('key'))
+
+  def post_task_worker(self, request):
+    self.taskqueue.process(request.get('key'))
+
+  def get_pull_task(self, request):
+    return json_response({ 'tasks' : self.taskqueue.lease_pull_tasks(100) })
+
+  def post_pull_task(self, request):
+    self.taskqueue.add_pull_task(request.get('key'))
+    return json_response({ 'status' : True })
+
+  # Blobstore
+
+  def get_blob_url(self, request):
+    return json_response({ 'url' : self.get_url(request,
+      '/python/blobstore/upload') })
+
+  def post_blob_upload(self, request):
+    form = request.body
+    if not isinstance(form, cgi.FieldStorage) or not form.has_key('file'):
+      return LocalResponse(400, '')
+    upload = form['file']
+    if isinstance(upload, list):
+      upload = upload[0]
+    key = self.blobstore.create(upload.filename, upload.value)
+    return json_response({ 'key' : key })
+
+  def get_blob_download(self, request, key):
+    blob = self.blobstore.get(urllib.unquote(key))
+    if blob is None:
+      return LocalResponse(500, '', 'text/plain')
+    return LocalResponse(200, blob['data'], 'application/octet-stream')
+
+  def get_blob_query(self, request):
+    key = request.get('key')
+    if request.get('data') == 'true':
+      blob = self.blobstore.get(key)
+      if blob is None:
+        return LocalResponse(404, '')
+      start = int(request.get('start'))
+      end = int(request.get('end'))
+      return LocalResponse(200, blob['data'][start:end + 1], 'text/html')
+    file_name = request.get('file')
+    size = request.get('size')
+    if file_name:
+      blobs = self.blobstore.find(lambda blob: blob['filename'] == file_name)
+      return json_response({ 'filename' : blobs[0]['filename'],
+                             'size' : blobs[0]['size'] })
+    elif size:
+      return json_response([ { 'filename' : entry['filename'],
+        'size' : entry['size'] } for entry in
+        self.blobstore.find(lambda entry: entry['size'] > int(size)) ])
+    blob = self.blobstore.get(key)
+    if blob is None:
+      return LocalResponse(404, '')
+    return json_response({ 'filename' : blob['filename'],
+                           'size' : blob['size'] })
+
+  def delete_blob_query(self, request):
+    deleted = self.blobstore.delete(request.get('key'))
+    if request.get('async') == 'true':
+      deleted = True
+    return json_response({ 'success' : deleted })
+
+  # Users
+
+  def get_url(self, request, path, secure=None):
+    if secure is None:
+      secure = request.secure
+    host = request.host.split(':')[0]
+    if secure:
+      return 'https://{0}:{1}{2}'.format(host, self.ssl_port, path)
+    return 'http://{0}:{1}{2}'.format(host, self.port, path)
+
+  def create_login_url(self, request, continue_url):
+    return '/_ah/login?' + urllib.urlencode({ 'continue' : continue_url })
+
+  def get_users_secure(self, request):
+    user = request.get_user()
+    if user is None:
+      return redirect(self.get_url(request, self.create_login_url(request,
+        self.get_url(request, request.path))))
+    email, admin = user
+    return json_response({ 'user' : email.split('@')[0], 'email' : email,
+                           'admin' : admin })
+
+  def get_users_home(self, request):
+    if request.get_user() is not None:
+      return json_response({ 'type' : 'logout', 'url' : '/_ah/login?' +
+        urllib.urlencode({ 'continue' : '/python/users/',
+                           'action' : 'Logout' }) })
+    return json_response({ 'type' : 'login',
+      'url' : self.create_login_url(request, '/python/users/') })
+
+  def get_login(self, request):
+    if request.get('action') == 'Logout':
+      response = redirect(request.get('continue') or '/')
+      response.headers['Set-Cookie'] = '{0}=; Path=/'.format(LOGIN_COOKIE)
+      return response
+    return LocalResponse(200, '<form method="post"><input name="email">'
+      '<input name="isAdmin" type="checkbox"><input name="action" '
+      'type="submit" value="Login"></form>', 'text/html')
+
+  def post_login(self, request):
+    email = request.get('email')
+    if request.get('action') != 'Login' or not email:
+      return self.get_login(request)
+    admin = request.get('isAdmin') == 'on'
+    response = redirect(request.get('continue') or '/')
+    response.headers['Set-Cookie'] = '{0}={1}:{2}; Path=/'.format(
+      LOGIN_COOKIE, email, admin)
+    return response
+
+  # Secure URLs
+
+  def get_secure_always(self, request):
+    if not request.secure:
+      return redirect(self.get_url(request, request.path, secure=True))
+    return json_response({ 'success' : True })
+
+  def get_secure_never(self, request):
+    if request.secure:
+      return redirect(self.get_url(request, request.path, secure=False))
+    return json_response({ 'success' : True })
+
+class LocalRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """
+  Parses HTTP/1.1 requests, hands them to the HawkeyeApp of the server
+  and writes the responses back, keeping connections alive.
+  """
+
+  protocol_version = 'HTTP/1.1'
+
+  # Buffer the status line, headers and body of a response and send
+  # them together (the buffer is flushed after each request), so that
+  # Nagle's algorithm and delayed ACKs do not add latency.
+  wbufsize = -1
+  disable_nagle_algorithm = True
+
+  def log_message(self, format, *args):
+    pass
+
+  def do_GET(self):
+    self.__handle('GET')
+
+  def do_POST(self):
+    self.__handle('POST')
+
+  def do_PUT(self):
+    self.__handle('PUT')
+
+  def do_DELETE(self):
+    self.__handle('DELETE')
+
+  def __handle(self, method):
+    path, _, query = self.path.partition('?')
+    length = int(self.headers.get('content-length') or 0)
+    content_type = self.headers.get('content-type', '')
+    if content_type.startswith('multipart/form-data'):
+      body = cgi.FieldStorage(fp=self.rfile, headers=self.headers,
+        environ={ 'REQUEST_METHOD' : method, 'CONTENT_TYPE' : content_type,
+                  'CONTENT_LENGTH' : str(length) })
+    elif length:
+      body = self.rfile.read(length)
+    else:
+      body = ''
+    headers = dict((name.lower(), value)
+                   for name, value in self.headers.items())
+    request = LocalRequest(method, path, query, headers, body,
+      self.server.secure, self.headers.get('host', 'localhost'))
+    response = self.server.app.dispatch(request)
+
+    self.send_response(response.status)
+    for name, value in response.headers.items():
+      self.send_header(name, value)
+    self.send_header('Content-Length', str(len(response.body)))
+    self.end_headers()
+    if method != 'HEAD':
+      self.wfile.write(response.body)
+
+class LocalHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, address, app, certfile=None):
+    BaseHTTPServer.HTTPServer.__init__(self, address, LocalRequestHandler)
+    self.app = app
+    self.secure = certfile is not None
+    if self.secure:
+      self.socket = ssl.wrap_socket(self.socket, certfile=certfile,
+        server_side=True)
+
+class LocalServer:
+  """
+  Serves an in-memory implementation of the Hawkeye Python app from
+  background threads of the current process. This allows running the
+  Hawkeye suites, benchmarks and load generator without an AppScale
+  deployment, eg: to measure the overhead of the harness itself. HTTPS
+  (used by the secure URL tests) is served on port - SSL_PORT_OFFSET
+  if a certificate file is provided.
+  """
+
+  def __init__(self, host, port, ssl_port=None, certfile=None):
+    """
+    Create a new instance of LocalServer.
+
+    Args:
+      host      Address to listen on
+      port      Port to serve HTTP on
+      ssl_port  Port to serve HTTPS on (only used with a certfile)
+      certfile  PEM file containing the certificate and private key
+                for HTTPS. If None, HTTPS is not served.
+    """
+    if certfile is None:
+      ssl_port = None
+    self.app = HawkeyeApp(port, ssl_port)
+    self.servers = [ LocalHTTPServer((host, port), self.app) ]
+    if ssl_port is not None:
+      self.servers.append(LocalHTTPServer((host, ssl_port), self.app,
+        certfile))
+
+  def start(self):
+    for server in self.servers:
+      thread = threading.Thread(target=server.serve_forever)
+      thread.daemon = True
+      thread.start()
+
+  def stop(self):
+    for server in self.servers:
+      server.shutdown()
+      server.server_close()
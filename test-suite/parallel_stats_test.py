@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+"""
+Checks that the run stats reported by the parallel mode match those of a
+serial run of the same suites. Pool workers run several suites each, so
+this catches stats leaking from one task into the next. The suites are
+run against the in-process local server.
+
+Usage: python parallel_stats_test.py
+"""
+
+import hawkeye
+import hawkeye_utils
+import local_server
+import os
+import shutil
+import tempfile
+import unittest
+
+SUITES = [ 'datastore', 'ndb', 'users' ]
+PORT = 18481
+
+def get_request_count(stats):
+  return stats['pool']['hits'] + stats['pool']['misses']
+
+def get_endpoint_counts(stats):
+  counts = {}
+  for entry in stats['latency']:
+    key = (entry['method'], entry['path'])
+    counts[key] = hawkeye_utils.LatencyHistogram.from_dict(
+      entry['total']).count
+  return counts
+
+class ParallelStatsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.cwd = os.getcwd()
+    self.work_dir = tempfile.mkdtemp()
+    os.chdir(self.work_dir)
+    os.mkdir('logs')
+    hawkeye_utils.HOST = '127.0.0.1'
+    hawkeye_utils.PORT = PORT
+    hawkeye_utils.LANG = 'python'
+    hawkeye_utils.TRACE_LEVEL = hawkeye_utils.TRACE_OFF
+    self.server = local_server.LocalServer('127.0.0.1', PORT)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+    os.chdir(self.cwd)
+    shutil.rmtree(self.work_dir)
+
+  def test_parallel_stats_match_serial(self):
+    hawkeye_utils.reset_run_stats()
+    for suite_name in SUITES:
+      summary = hawkeye.run_test_suite(hawkeye.load_suite(
+        hawkeye.TEST_SUITES[suite_name], 'python'), open(os.devnull, 'w'))
+      self.assertEquals(summary['failures'] + summary['errors'], 0)
+    hawkeye_utils.CONNECTION_POOL.close_all()
+    serial = hawkeye_utils.get_run_stats()
+
+    # A single worker runs all the suites one after the other
+    hawkeye_utils.reset_run_stats()
+    summaries, parallel = hawkeye.run_test_suites_in_parallel(SUITES,
+      'python', 1)
+    for summary in summaries:
+      self.assertEquals(summary['failures'] + summary['errors'], 0)
+
+    self.assertEquals(get_request_count(parallel), get_request_count(serial))
+    self.assertEquals(get_endpoint_counts(parallel),
+      get_endpoint_counts(serial))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,264 @@
+import os
+import sqlite3
+import subprocess
+import time
+
+# Result kinds
+KIND_ENDPOINT = 'endpoint'
+KIND_BENCHMARK = 'benchmark'
+KIND_LOAD = 'load'
+
+# Latency percentiles checked for regressions
+COMPARED_METRICS = [ 'p50', 'p99' ]
+
+SCHEMA = [
+  """CREATE TABLE IF NOT EXISTS runs (
+       id INTEGER PRIMARY KEY AUTOINCREMENT,
+       server TEXT NOT NULL,
+       lang TEXT NOT NULL,
+       revision TEXT NOT NULL,
+       mode TEXT NOT NULL,
+       time REAL NOT NULL)""",
+  """CREATE TABLE IF NOT EXISTS results (
+       run_id INTEGER NOT NULL REFERENCES runs(id),
+       kind TEXT NOT NULL,
+       name TEXT NOT NULL,
+       count INTEGER NOT NULL,
+       mean REAL NOT NULL,
+       p50 REAL NOT NULL,
+       p90 REAL NOT NULL,
+       p99 REAL NOT NULL,
+       max REAL NOT NULL,
+       PRIMARY KEY (run_id, kind, name))""",
+  """CREATE INDEX IF NOT EXISTS runs_revision ON runs (revision, lang)""",
+]
+
+def get_revision():
+  """
+  Determine the git revision of the Hawkeye checkout.
+
+  Returns:
+    The abbreviated commit hash of HEAD, or 'unknown' if it cannot be
+    determined (eg: git is not installed)
+  """
+  try:
+    process = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+      stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+      cwd=os.path.dirname(os.path.abspath(__file__)))
+    output, _ = process.communicate()
+    if process.returncode == 0 and output.strip():
+      return output.strip()
+  except OSError:
+    pass
+  return 'unknown'
+
+def get_endpoint_rows(latency_report):
+  """
+  Convert an endpoint latency report into result rows.
+
+  Args:
+    latency_report  A list of endpoint latency summaries as returned by
+                    hawkeye.summarize_latency_stats
+
+  Returns:
+    A list of (kind, name, latency summary) tuples
+  """
+  return [ (KIND_ENDPOINT, '{0} {1}'.format(e['method'], e['path']),
+            e['total']) for e in latency_report ]
+
+def get_benchmark_rows(results):
+  """
+  Convert benchmark results into result rows.
+
+  Args:
+    results A list of benchmark results (see HawkeyeBenchmark.get_result)
+
+  Returns:
+    A list of (kind, name, latency summary) tuples
+  """
+  rows = []
+  for result in results:
+    params = ','.join('{0}={1}'.format(name, result['params'][name])
+      for name in sorted(result['params'].keys()))
+    name = result['benchmark']
+    if params:
+      name = '{0}[{1}]'.format(name, params)
+    rows.append((KIND_BENCHMARK, name, result['latency']))
+  return rows
+
+def get_load_rows(report):
+  """
+  Convert a load report into result rows.
+
+  Args:
+    report  A load report (see LoadGenerator.get_report)
+
+  Returns:
+    A list of (kind, name, latency summary) tuples
+  """
+  return [ (KIND_LOAD, name, operation['latency'])
+           for name, operation in report['operations'].items() ]
+
+class ResultsStore:
+  """
+  Stores the timing results of Hawkeye runs in a SQLite database, so
+  that the results of a run can be compared against those of an earlier
+  baseline run. Each run is keyed by the target server, language and
+  revision, and holds one latency summary per endpoint, benchmark or
+  load operation.
+  """
+
+  def __init__(self, path):
+    """
+    Open the results database at the specified path, creating it if
+    it does not exist.
+
+    Args:
+      path  Path to the SQLite database file
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+      os.makedirs(directory)
+    self.connection = sqlite3.connect(path)
+    self.connection.row_factory = sqlite3.Row
+    for statement in SCHEMA:
+      self.connection.execute(statement)
+    self.connection.commit()
+
+  def save_run(self, server, lang, revision, mode, rows):
+    """
+    Save the results of a run.
+
+    Args:
+      server    Target server of the run (host:port)
+      lang      Language binding under test
+      revision  Revision the run should be keyed by
+      mode      Kind of run (eg: tests, bench, load)
+      rows      A list of (kind, name, latency summary) tuples
+
+    Returns:
+      The ID of the new run
+    """
+    with self.connection:
+      cursor = self.connection.execute('INSERT INTO runs (server, lang, '
+        'revision, mode, time) VALUES (?, ?, ?, ?, ?)',
+        (server, lang, revision, mode, time.time()))
+      run_id = cursor.lastrowid
+      self.connection.executemany('INSERT OR REPLACE INTO results VALUES '
+        '(?, ?, ?, ?, ?, ?, ?, ?, ?)', [ (run_id, kind, name,
+        summary['count'], summary['mean'], summary['p50'], summary['p90'],
+        summary['p99'], summary['max']) for kind, name, summary in rows ])
+    return run_id
+
+  def find_run(self, spec, server, lang, mode, exclude=None):
+    """
+    Look up a run by its ID or by revision. Run IDs are prefixed with a
+    '#' (eg: #12), so that they can not be mistaken for an abbreviated
+    revision made up of digits only. Only runs against the same server,
+    for the same language and of the same kind are considered, since the
+    results of any other run are not comparable. When several runs match
+    a revision, the most recent one is returned.
+
+    Args:
+      spec    A run ID prefixed with '#', or a revision
+      server  Target server the run must be for (host:port)
+      lang    Language binding the run must be for
+      mode    Kind of run the run must be (eg: tests, bench, load)
+      exclude A run ID that must not be returned (eg: the current run)
+
+    Returns:
+      A dictionary describing the run, or None if no run matches
+    """
+    if spec.startswith('#'):
+      if not spec[1:].isdigit():
+        return None
+      row = self.connection.execute('SELECT * FROM runs WHERE id = ? '
+        'AND server = ? AND lang = ? AND mode = ? AND id != ?',
+        (int(spec[1:]), server, lang, mode, exclude or -1)).fetchone()
+    else:
+      row = self.connection.execute('SELECT * FROM runs WHERE revision = ? '
+        'AND server = ? AND lang = ? AND mode = ? AND id != ? '
+        'ORDER BY id DESC LIMIT 1',
+        (spec, server, lang, mode, exclude or -1)).fetchone()
+    if row is None:
+      return None
+    return dict(zip(row.keys(), row))
+
+  def get_results(self, run_id):
+    """
+    Load the results of a run.
+
+    Args:
+      run_id  ID of the run
+
+    Returns:
+      A dictionary mapping (kind, name) tuples to latency summaries
+    """
+    results = {}
+    for row in self.connection.execute('SELECT * FROM results WHERE '
+                                       'run_id = ?', (run_id,)):
+      results[(row['kind'], row['name'])] = dict(zip(row.keys(), row))
+    return results
+
+  def compare(self, baseline_id, run_id, threshold):
+    """
+    Compare the results of a run against those of a baseline run.
+    Results that appear in only one of the runs are ignored, so the
+    number of results found in both runs is returned as well. If it is
+    zero, nothing was actually compared.
+
+    Args:
+      baseline_id ID of the baseline run
+      run_id      ID of the run to check
+      threshold   Percentage by which a latency percentile may grow
+                  before it is reported as a regression
+
+    Returns:
+      A tuple of the form (compared, regressions) where compared is the
+      number of results found in both runs and regressions is a list of
+      regressions sorted by kind and name, each a dictionary containing
+      the kind, name, metric, baseline and current values and the change
+      in percent
+    """
+    baseline = self.get_results(baseline_id)
+    current = self.get_results(run_id)
+    compared = 0
+    regressions = []
+    for key in sorted(current.keys()):
+      if not baseline.has_key(key):
+        continue
+      compared += 1
+      for metric in COMPARED_METRICS:
+        old = baseline[key][metric]
+        new = current[key][metric]
+        if old > 0 and new > old * (1 + threshold / 100.0):
+          regressions.append({
+            'kind' : key[0],
+            'name' : key[1],
+            'metric' : metric,
+            'baseline' : old,
+            'current' : new,
+            'change' : (new - old) * 100.0 / old,
+          })
+    return compared, regressions
+
+  def close(self):
+    self.connection.close()
+
+def print_regressions(baseline, compared, regressions, threshold):
+  print '\nComparison against run #{0} (revision {1}, {2})'.format(
+    baseline['id'], baseline['revision'], baseline['server'])
+  print '=' * 50
+  if not compared:
+    print 'The baseline run has no results in common with this run'
+    return
+  if not regressions:
+    print 'No p50/p99 regressions beyond {0:.1f}%'.format(threshold)
+    return
+  print '{0:<10} {1:<52} {2:<6} {3:>10} {4:>10} {5:>8}'.format('Kind', 'Name',
+    'Metric', 'Baseline', 'Current', 'Change')
+  for regression in regressions:
+    print '{0:<10} {1:<52} {2:<6} {3:>10.1f} {4:>10.1f} {5:>7.1f}%'.format(
+      regression['kind'], regression['name'], regression['metric'],
+      regression['baseline'], regression['current'], regression['change'])
+  print '{0} regressions beyond {1:.1f}%'.format(len(regressions), threshold)
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+
+"""
+Checks how the results store picks the baseline run a run is compared
+against.
+
+Usage: python results_store_test.py
+"""
+
+import os
+import results_store
+import shutil
+import tempfile
+import unittest
+
+SERVER = 'localhost:8080'
+OTHER_SERVER = 'localhost:8081'
+
+def get_summary(p50):
+  return { 'count' : 1, 'mean' : p50, 'p50' : p50, 'p90' : p50,
+           'p99' : p50, 'max' : p50 }
+
+ENDPOINT_ROWS = [ (results_store.KIND_ENDPOINT, 'GET /python/users/home',
+                   get_summary(1.0)) ]
+BENCHMARK_ROWS = [ (results_store.KIND_BENCHMARK, 'datastore.put',
+                    get_summary(1.0)) ]
+
+class FindRunTest(unittest.TestCase):
+
+  def setUp(self):
+    self.work_dir = tempfile.mkdtemp()
+    self.store = results_store.ResultsStore(os.path.join(self.work_dir,
+      'hawkeye.db'))
+
+  def tearDown(self):
+    self.store.close()
+    shutil.rmtree(self.work_dir)
+
+  def test_other_mode_is_not_a_baseline(self):
+    bench_id = self.store.save_run(SERVER, 'python', 'abc', 'bench',
+      BENCHMARK_ROWS)
+    run_id = self.store.save_run(SERVER, 'python', 'def', 'tests',
+      ENDPOINT_ROWS)
+    self.assertEquals(self.store.find_run('abc', SERVER, 'python', 'tests',
+      run_id), None)
+    self.assertEquals(self.store.find_run('#{0}'.format(bench_id), SERVER,
+      'python', 'tests', run_id), None)
+
+  def test_other_server_is_not_a_baseline(self):
+    other_id = self.store.save_run(OTHER_SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    run_id = self.store.save_run(SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    self.assertEquals(self.store.find_run('abc', SERVER, 'python', 'tests',
+      run_id), None)
+    self.assertEquals(self.store.find_run('#{0}'.format(other_id), SERVER,
+      'python', 'tests', run_id), None)
+
+  def test_targets_use_own_baselines(self):
+    # Earlier runs against each of two targets
+    first_id = self.store.save_run(SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    second_id = self.store.save_run(OTHER_SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    # A fan-out run saves the first target before comparing the second
+    self.store.save_run(SERVER, 'python', 'abc', 'tests', ENDPOINT_ROWS)
+    run_id = self.store.save_run(OTHER_SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    baseline = self.store.find_run('abc', OTHER_SERVER, 'python', 'tests',
+      run_id)
+    self.assertEquals(baseline['id'], second_id)
+    self.assertNotEquals(baseline['id'], first_id)
+
+  def test_all_digit_revision(self):
+    baseline_id = self.store.save_run(SERVER, 'python', '1234567', 'tests',
+      ENDPOINT_ROWS)
+    run_id = self.store.save_run(SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    baseline = self.store.find_run('1234567', SERVER, 'python', 'tests',
+      run_id)
+    self.assertEquals(baseline['id'], baseline_id)
+
+  def test_no_common_results(self):
+    baseline_id = self.store.save_run(SERVER, 'python', 'abc', 'tests',
+      BENCHMARK_ROWS)
+    run_id = self.store.save_run(SERVER, 'python', 'def', 'tests',
+      ENDPOINT_ROWS)
+    self.assertEquals(self.store.compare(baseline_id, run_id, 10.0), (0, []))
+
+  def test_regression(self):
+    baseline_id = self.store.save_run(SERVER, 'python', 'abc', 'tests',
+      ENDPOINT_ROWS)
+    run_id = self.store.save_run(SERVER, 'python', 'def', 'tests',
+      [ (results_store.KIND_ENDPOINT, 'GET /python/users/home',
+         get_summary(2.0)) ])
+    compared, regressions = self.store.compare(baseline_id, run_id, 10.0)
+    self.assertEquals(compared, 1)
+    self.assertEquals([ r['metric'] for r in regressions ], [ 'p50', 'p99' ])
+
+if __name__ == '__main__':
+  unittest.main()
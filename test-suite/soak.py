@@ -0,0 +1,277 @@
+import hawkeye_utils
+import json
+import sys
+import time
+
+# Minimum number of iterations needed before drift is evaluated
+MIN_DRIFT_ITERATIONS = 3
+
+# Per iteration metrics checked for upward drift
+DRIFT_METRICS = [ 'p50', 'p99', 'failure_rate', 'rss', 'queued_tasks' ]
+
+SOAK_LOG = 'logs/soak.json'
+SOAK_CONSOLE_LOG = 'logs/soak-console.log'
+
+def get_rss():
+  """
+  Determine the resident set size of this process.
+
+  Returns:
+    The resident set size in bytes, or None if it cannot be determined
+    (eg: /proc is not available on this platform)
+  """
+  try:
+    status = open('/proc/self/status')
+  except IOError:
+    return None
+  try:
+    for line in status:
+      if line.startswith('VmRSS:'):
+        return int(line.split()[1]) * 1024
+  finally:
+    status.close()
+  return None
+
+def get_queue_stats():
+  """
+  Fetch the statistics of the default task queue from the server.
+
+  Returns:
+    A dictionary containing the queued tasks, tasks in flight and
+    tasks executed in the last minute, or None if the statistics could
+    not be fetched
+  """
+  try:
+    response = hawkeye_utils.make_request('GET',
+      '/taskqueue/counter?stats=true', source='soak:queue_stats')
+    if response.status != 200:
+      return None
+    stats = response.get_json()
+    return {
+      'queued_tasks' : stats['tasks'],
+      'in_flight' : stats['in_flight'],
+      'exec_last_minute' : stats['exec_last_minute'],
+    }
+  except Exception:
+    return None
+
+def get_drift(values):
+  """
+  Fit a least squares line through a series of per iteration values and
+  express the growth it predicts over the whole series relative to its
+  starting point. Fitting a line makes the estimate robust against
+  the odd slow iteration, which a first-versus-last comparison is not.
+
+  Args:
+    values  A list of numbers, one per iteration (None values are skipped)
+
+  Returns:
+    A tuple of the form (slope, drift) where slope is the growth per
+    iteration and drift is the fitted growth over the series in percent
+    of the fitted starting value. Series that start at zero (eg: an
+    empty task queue) are measured relative to their mean instead. Both
+    are None if there are fewer than MIN_DRIFT_ITERATIONS values.
+  """
+  points = [ (index, value) for index, value in enumerate(values)
+             if value is not None ]
+  if len(points) < MIN_DRIFT_ITERATIONS:
+    return None, None
+  count = float(len(points))
+  mean_x = sum(x for x, _ in points) / count
+  mean_y = sum(y for _, y in points) / count
+  variance = sum((x - mean_x) ** 2 for x, _ in points)
+  slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+  first = points[0][0]
+  last = points[-1][0]
+  base = mean_y + slope * (first - mean_x)
+  if base <= 0:
+    base = mean_y
+  if base <= 0:
+    return slope, None
+  return slope, slope * (last - first) * 100.0 / base
+
+class SoakRunner:
+  """
+  Runs the selected test suites over and over for a fixed number of
+  iterations or a fixed duration, to catch servers that degrade over a
+  long uptime (eg: growing memcache or task queue backlogs). For each
+  iteration the runner records the latency percentiles of all the HTTP
+  calls made, the test failure rate, the resident set size of this
+  process and the task queue statistics reported by the server. After
+  each iteration the recorded series are written to logs/soak.json, so
+  that the data of an interrupted soak run is not lost. At the end of
+  the run each series is checked for upward drift (see get_drift).
+  """
+
+  def __init__(self, run_suites, iterations, duration, interval,
+               drift_threshold):
+    """
+    Create a new instance of SoakRunner.
+
+    Args:
+      run_suites      A function that takes a stream to write the console
+                      output to, runs the selected suites once and
+                      returns their summaries (see hawkeye.run_test_suite)
+      iterations      Maximum number of iterations to run
+      duration        Maximum number of seconds to run for. If neither
+                      this nor iterations is set, the runner runs until
+                      it is interrupted.
+      interval        Number of seconds to pause between iterations
+      drift_threshold Percentage by which a metric may grow over the run
+                      before it is reported as drifting
+    """
+    self.run_suites = run_suites
+    self.iterations = iterations
+    self.duration = duration
+    self.interval = interval
+    self.drift_threshold = drift_threshold
+    self.results = []
+    self.latency = []
+
+  def run(self):
+    """
+    Run the soak test until the iteration count or duration is reached,
+    or until it is interrupted with Ctrl-C.
+
+    Returns:
+      A report dictionary (see SoakRunner.get_report)
+    """
+    start = time.time()
+    console_log = open(SOAK_CONSOLE_LOG, 'a')
+    try:
+      while self.iterations is None or len(self.results) < self.iterations:
+        if self.duration is not None and \
+            time.time() - start >= self.duration:
+          break
+        result = self.__run_iteration(len(self.results) + 1, console_log)
+        self.results.append(result)
+        print_soak_iteration(result)
+        self.write_log(time.time() - start)
+        if self.interval:
+          time.sleep(self.interval)
+    except KeyboardInterrupt:
+      print 'Soak test interrupted after {0} iterations'.format(
+        len(self.results))
+    finally:
+      console_log.close()
+      hawkeye_utils.CONNECTION_POOL.close_all()
+      hawkeye_utils.TRACER.close()
+      hawkeye_utils.RECORDER.close()
+    report = self.get_report(time.time() - start)
+    self.write_log(report['duration'])
+    return report
+
+  def get_report(self, elapsed):
+    """
+    Summarize the soak test run so far.
+
+    Args:
+      elapsed Wall clock time of the run in seconds
+
+    Returns:
+      A dictionary containing the per iteration results, the drift of
+      each of the DRIFT_METRICS and the names of the drifting metrics
+    """
+    drift = {}
+    drifting = []
+    for metric in DRIFT_METRICS:
+      slope, percent = get_drift([ result[metric]
+                                   for result in self.results ])
+      drift[metric] = { 'slope' : slope, 'percent' : percent }
+      if percent is not None and percent > self.drift_threshold:
+        drifting.append(metric)
+    return {
+      'duration' : elapsed,
+      'iterations' : len(self.results),
+      'drift_threshold' : self.drift_threshold,
+      'results' : self.results,
+      'drift' : drift,
+      'drifting' : drifting,
+    }
+
+  def get_latency_stats(self):
+    """
+    Returns:
+      The endpoint latency stats of all the iterations merged together
+      (see hawkeye_utils.LatencyStats.get_stats)
+    """
+    return self.latency
+
+  def write_log(self, elapsed):
+    soak_log = open(SOAK_LOG, 'w')
+    json.dump(self.get_report(elapsed), soak_log, indent=2, sort_keys=True)
+    soak_log.close()
+
+  def __run_iteration(self, iteration, console_log):
+    # Collect the latencies of this iteration separately from the others
+    hawkeye_utils.LATENCY_STATS = hawkeye_utils.LatencyStats()
+    start = time.time()
+    summaries = self.run_suites(console_log)
+    elapsed = time.time() - start
+    stats = hawkeye_utils.LATENCY_STATS.get_stats()
+    self.latency = hawkeye_utils.merge_latency_stats(self.latency, stats)
+
+    latency = hawkeye_utils.get_total_latency(stats).summary()
+
+    tests = sum(summary['tests'] for summary in summaries)
+    failed = sum(summary['failures'] + summary['errors']
+                 for summary in summaries)
+    result = {
+      'iteration' : iteration,
+      'time' : start,
+      'elapsed' : elapsed,
+      'tests' : tests,
+      'failed' : failed,
+      'failure_rate' : float(failed) / max(tests, 1),
+      'requests' : latency['count'],
+      'p50' : latency['p50'],
+      'p90' : latency['p90'],
+      'p99' : latency['p99'],
+      'max' : latency['max'],
+      'rss' : get_rss(),
+      'queued_tasks' : None,
+      'in_flight' : None,
+    }
+    queue_stats = get_queue_stats()
+    if queue_stats is not None:
+      result['queued_tasks'] = queue_stats['queued_tasks']
+      result['in_flight'] = queue_stats['in_flight']
+    return result
+
+def format_value(value, format_spec, scale=1, suffix=''):
+  if value is None:
+    return '-'
+  return format(value / scale, format_spec) + suffix
+
+def print_soak_iteration(result):
+  print '{0:>5} {1:>8.1f} {2:>6} {3:>7.2%} {4:>8.1f} {5:>8.1f} {6:>9} ' \
+        '{7:>7}'.format(result['iteration'], result['elapsed'],
+    result['tests'], result['failure_rate'], result['p50'], result['p99'],
+    format_value(result['rss'], '.1f', 1024.0 * 1024),
+    format_value(result['queued_tasks'], 'd'))
+  sys.stdout.flush()
+
+def print_soak_header():
+  print '\nSoak Test'
+  print '========='
+  print '{0:>5} {1:>8} {2:>6} {3:>7} {4:>8} {5:>8} {6:>9} {7:>7}'.format(
+    'Iter', 'Time (s)', 'Tests', 'Failed', 'p50', 'p99', 'RSS (MB)', 'Tasks')
+
+def print_soak_report(report):
+  print '\nSoak Drift ({0} iterations, {1:.1f}s)'.format(report['iterations'],
+    report['duration'])
+  print '=' * 50
+  print '{0:<14} {1:>14} {2:>10}'.format('Metric', 'Slope/iter', 'Drift')
+  for metric in DRIFT_METRICS:
+    drift = report['drift'][metric]
+    print '{0:<14} {1:>14} {2:>10}'.format(metric,
+      format_value(drift['slope'], '.3f'),
+      format_value(drift['percent'], '+.1f', suffix='%'))
+  if report['iterations'] < MIN_DRIFT_ITERATIONS:
+    print 'At least {0} iterations are needed to detect drift'.format(
+      MIN_DRIFT_ITERATIONS)
+  elif report['drifting']:
+    print 'Upward drift beyond {0:.1f}%: {1}'.format(
+      report['drift_threshold'], ', '.join(report['drifting']))
+  else:
+    print 'No upward drift beyond {0:.1f}%'.format(report['drift_threshold'])
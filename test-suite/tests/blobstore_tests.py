@@ -1,3 +1,4 @@
+import hashlib
 import json
 import urlparse
 from hawkeye_utils import HawkeyeTestCase, HawkeyeTestSuite
@@ -16,6 +17,9 @@ FILE2_DATA = 'AppScale Rocks!!!'
 FILE3_DATA = 'ASYNC FILE UPLOAD CONTENT'
 
 class UploadBlobTest(HawkeyeTestCase):
+  produces = [ 'uploads' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/url')
     self.assertEquals(response.status, 200)
@@ -44,18 +48,26 @@ class UploadBlobTest(HawkeyeTestCase):
     FILE_UPLOADS[FILE2] = blob_key
 
 class DownloadBlobTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'uploads' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/download/{0}'.format(
-      FILE_UPLOADS[FILE1]))
+      FILE_UPLOADS[FILE1]), stream=True)
     self.assertEquals(response.status, 200)
-    self.assertEquals(response.payload, FILE1_DATA)
+    self.assertEquals(response.content_length, len(FILE1_DATA))
+    self.assertEquals(response.md5, hashlib.md5(FILE1_DATA).hexdigest())
 
     response = self.http_get('/blobstore/download/{0}'.format(
-      FILE_UPLOADS[FILE2]))
+      FILE_UPLOADS[FILE2]), stream=True)
     self.assertEquals(response.status, 200)
-    self.assertEquals(response.payload, FILE2_DATA)
+    self.assertEquals(response.content_length, len(FILE2_DATA))
+    self.assertEquals(response.md5, hashlib.md5(FILE2_DATA).hexdigest())
 
 class QueryBlobByKeyTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'uploads' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/query?key={0}'.format(
       FILE_UPLOADS[FILE1]))
@@ -73,6 +85,9 @@ class QueryBlobByKeyTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class QueryBlobByPropertyTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'uploads' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/query?' \
                              'file=file1.txt'.format(FILE_UPLOADS[FILE1]))
@@ -95,6 +110,9 @@ class QueryBlobByPropertyTest(HawkeyeTestCase):
 
 
 class QueryBlobDataTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'uploads' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/query?key={0}&data=' \
                             'true&start=0&end=5'.format(FILE_UPLOADS[FILE1]))
@@ -107,6 +125,9 @@ class QueryBlobDataTest(HawkeyeTestCase):
     self.assertEquals(response.payload, 'AppSca')
 
 class DeleteBlobTest(HawkeyeTestCase):
+  produces = [ 'uploads' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_delete('/blobstore/query?key={0}'.format(
       FILE_UPLOADS[FILE1]))
@@ -129,6 +150,9 @@ class DeleteBlobTest(HawkeyeTestCase):
     self.assertTrue(response.status == 500 or response.status == 404)
 
 class AsyncUploadBlobTest(HawkeyeTestCase):
+  produces = [ 'async_uploads' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/url?async=true')
     self.assertEquals(response.status, 200)
@@ -144,6 +168,9 @@ class AsyncUploadBlobTest(HawkeyeTestCase):
     FILE_UPLOADS[FILE3] = blob_key
 
 class AsyncQueryBlobDataTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'async_uploads' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/blobstore/query?key={0}&data=true&'\
                              'start=0&end=5&async=true'.format(FILE_UPLOADS[FILE3]))
@@ -151,6 +178,9 @@ class AsyncQueryBlobDataTest(HawkeyeTestCase):
     self.assertEquals(response.payload, 'ASYNC ')
 
 class AsyncDeleteBlobTest(HawkeyeTestCase):
+  produces = [ 'async_uploads' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_delete('/blobstore/query?key={0}&' \
                                   'async=true'.format(FILE_UPLOADS[FILE3]))
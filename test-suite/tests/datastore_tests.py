@@ -1,6 +1,7 @@
 from hawkeye_utils import HawkeyeTestCase, HawkeyeConstants, HawkeyeTestSuite
+from hawkeye_utils import count_fixture_projects, wait_for
+import hawkeye_utils
 import json
-from time import sleep
 import uuid
 
 __author__ = 'hiranya'
@@ -9,15 +10,27 @@ ALL_PROJECTS = {}
 SYNAPSE_MODULES = {}
 
 class DataStoreCleanupTest(HawkeyeTestCase):
+  produces = [ 'projects', 'modules', 'counters' ]
+  consumes = []
+
   def run_hawkeye_test(self):
-    response = self.http_delete('/datastore/module')
-    self.assertEquals(response.status, 200)
-    response = self.http_delete('/datastore/project')
-    self.assertEquals(response.status, 200)
-    response = self.http_delete('/datastore/transactions')
-    self.assertEquals(response.status, 200)
+    if hawkeye_utils.FIXTURES.has_key('datastore'):
+      # Leave the fixture dataset in place
+      for name in (HawkeyeConstants.MOD_CORE, HawkeyeConstants.MOD_NHTTP):
+        self.assert_delete_all('/datastore/module?name_prefix=' + name)
+      for name in (HawkeyeConstants.PROJECT_SYNAPSE,
+                   HawkeyeConstants.PROJECT_XERCES,
+                   HawkeyeConstants.PROJECT_HADOOP):
+        self.assert_delete_all('/datastore/project?name_prefix=' + name)
+    else:
+      self.assert_delete_all('/datastore/module')
+      self.assert_delete_all('/datastore/project')
+    self.assert_delete_all('/datastore/transactions')
 
 class SimpleKindAwareInsertTest(HawkeyeTestCase):
+  produces = [ 'projects' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_post('/datastore/project',
       'name={0}&description=Mediation Engine&rating=8&license=L1'.format(
@@ -50,9 +63,22 @@ class SimpleKindAwareInsertTest(HawkeyeTestCase):
     ALL_PROJECTS[HawkeyeConstants.PROJECT_HADOOP] = project_id
 
     # Allow some time to eventual consistency to run its course
-    sleep(5)
+    wait_for(self.projects_visible, 5, 'datastore.projects')
+
+  def projects_visible(self):
+    response = self.http_get('/datastore/project')
+    if response.status != 200:
+      return False
+    visible = [ entity['project_id'] for entity in json.loads(response.payload) ]
+    for project_id in ALL_PROJECTS.values():
+      if project_id not in visible:
+        return False
+    return True
 
 class KindAwareInsertWithParentTest(HawkeyeTestCase):
+  produces = [ 'modules' ]
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     response = self.http_post('/datastore/module',
       'name={0}&description=Mediation Core&project_id={1}'.format(
@@ -77,7 +103,11 @@ class KindAwareInsertWithParentTest(HawkeyeTestCase):
     SYNAPSE_MODULES[HawkeyeConstants.MOD_NHTTP] = module_id
 
 class SimpleKindAwareQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
+    self.skip_with_fixtures('datastore')
     project_list = self.assert_and_get_list('/datastore/project')
     for entry in project_list:
       response = self.http_get('/datastore/project?id={0}'.
@@ -97,6 +127,9 @@ class SimpleKindAwareQueryTest(HawkeyeTestCase):
       self.assertEquals(mod_info['name'], entry['name'])
 
 class AncestorQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_modules?' \
       'project_id={0}'.format(ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
@@ -110,7 +143,11 @@ class AncestorQueryTest(HawkeyeTestCase):
     self.assertTrue(modules.index(HawkeyeConstants.MOD_NHTTP) != -1)
 
 class KindlessQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
+    self.skip_with_fixtures('datastore')
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?comparator=gt&project_id={0}'.format(
         ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
@@ -130,6 +167,9 @@ class KindlessQueryTest(HawkeyeTestCase):
     self.assertTrue(project_seen)
 
 class KindlessAncestorQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list(
       '/datastore/project_keys?ancestor=true&comparator=gt&project_id={0}'.
@@ -154,6 +194,9 @@ class KindlessAncestorQueryTest(HawkeyeTestCase):
     self.assertTrue(project_seen)
 
 class QueryByKeyNameTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
     response = self.http_get('/datastore/entity_names?project_name={0}'.
       format(HawkeyeConstants.PROJECT_SYNAPSE))
@@ -169,57 +212,74 @@ class QueryByKeyNameTest(HawkeyeTestCase):
       SYNAPSE_MODULES[HawkeyeConstants.MOD_CORE])
 
 class SinglePropertyBasedQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=10&comparator=eq')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('datastore', 10, 'eq'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=6&comparator=gt')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('datastore', 6, 'gt'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_XERCES)
 
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=6&comparator=ge')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('datastore', 6, 'ge'))
 
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=8&comparator=lt')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_XERCES)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('datastore', 8, 'lt'))
+    self.assertTrue(HawkeyeConstants.PROJECT_XERCES in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=8&comparator=le')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('datastore', 8, 'le'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=8&comparator=ne')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('datastore', 8, 'ne'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_SYNAPSE)
 
-    try:
-      self.assert_and_get_list('/datastore/project_ratings?'
-                               'rating=5&comparator=le')
-      self.fail('Returned an unexpected result')
-    except AssertionError:
-      pass
+    response = self.http_get('/datastore/project_ratings?'
+                             'rating=5&comparator=le')
+    self.assertEquals(response.status, 200)
+    self.assertEquals(len(json.loads(response.payload)),
+      count_fixture_projects('datastore', 5, 'le'))
 
 class OrderedResultQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=6&comparator=ge&desc=true')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('datastore', 6, 'ge'))
     last_rating = 100
     for entity in entity_list:
       self.assertTrue(entity['rating'], last_rating)
       last_rating = entity['rating']
 
 class LimitedResultQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_ratings?'
                                            'rating=6&comparator=ge&limit=2')
@@ -234,10 +294,14 @@ class LimitedResultQueryTest(HawkeyeTestCase):
       last_rating = entity['rating']
 
 class ProjectionQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_fields?'
                                            'fields=project_id,name')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('datastore'))
     for entity in entity_list:
       self.assertTrue(not entity.has_key('rating') or
                       entity['rating'] is None)
@@ -248,7 +312,8 @@ class ProjectionQueryTest(HawkeyeTestCase):
 
     entity_list = self.assert_and_get_list('/datastore/project_fields?'
                                            'fields=name,rating&rate_limit=8')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('datastore', 8, 'ge'))
     for entity in entity_list:
       self.assertTrue(entity['rating'] is not None)
       self.assertTrue(not entity.has_key('description') or
@@ -259,10 +324,14 @@ class ProjectionQueryTest(HawkeyeTestCase):
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_XERCES)
 
 class GQLProjectionQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_fields?'
                                            'fields=name,rating&gql=true')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('datastore'))
     for entity in entity_list:
       self.assertTrue(entity['rating'] is not None)
       self.assertTrue(not entity.has_key('description') or
@@ -271,25 +340,89 @@ class GQLProjectionQueryTest(HawkeyeTestCase):
                       entity['project_id'] is None)
       self.assertTrue(entity['name'] is not None)
 
+class BatchedQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
+  def run_hawkeye_test(self):
+    self.skip_with_fixtures('datastore')
+    expected = self.assert_and_get_list('/datastore/project')
+    for batch_size in (1, 2):
+      entity_list = self.assert_and_get_list(
+        '/datastore/project?batch_size={0}'.format(batch_size))
+      self.assertEquals(sorted(e['project_id'] for e in entity_list),
+        sorted(e['project_id'] for e in expected))
+
+class PagedQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
+  def run_hawkeye_test(self):
+    self.skip_with_fixtures('datastore')
+    for path, id_field in (('/datastore/project', 'project_id'),
+                           ('/datastore/module', 'module_id')):
+      expected = self.assert_and_get_list(path)
+      for page_size in (1, 2, 100):
+        entity_list, latencies, sizes = self.walk_pages(path, page_size)
+        self.assertEquals(sorted(e[id_field] for e in entity_list),
+          sorted(e[id_field] for e in expected))
+        # Every page but the last (short or empty) one is full
+        self.assertEquals(len(latencies), len(expected) // page_size + 1)
+        self.assertEquals(sizes[:-1], [ page_size ] * (len(sizes) - 1))
+
+class GQLQueryCacheTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
+  def run_hawkeye_test(self):
+    entity_list = self.assert_and_get_list('/datastore/project?name={0}'.format(
+      HawkeyeConstants.PROJECT_SYNAPSE))
+    self.assertEquals(len(entity_list), 1)
+    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_SYNAPSE)
+
+    # Bound parameters must not break on quotes
+    response = self.http_get("/datastore/project?name=Synapse's")
+    self.assertEquals(response.status, 200)
+    self.assertEquals(json.loads(response.payload), [])
+
+    response = self.http_get('/datastore/query_stats')
+    self.assertEquals(response.status, 200)
+    stats = json.loads(response.payload)
+    for name in ('hits', 'misses', 'hit_rate', 'parse_time',
+                 'saved_parse_time'):
+      self.assertTrue(stats.has_key(name))
+    self.assertTrue(0 <= stats['hit_rate'] <= 1)
+
 class CompositeQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/datastore/project_filter?'
                                            'license=L1&rate_limit=5')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('datastore', 5, 'ge', 'L1'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/datastore/project_filter?'
                                            'license=L1&rate_limit=8')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_SYNAPSE)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('datastore', 8, 'ge', 'L1'))
+    self.assertTrue(HawkeyeConstants.PROJECT_SYNAPSE in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/datastore/project_filter?'
                                            'license=L2&rate_limit=5')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('datastore', 5, 'ge', 'L2'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
 class SimpleTransactionTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'counters' ]
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     response = self.http_get('/datastore/transactions?' \
@@ -311,6 +444,9 @@ class SimpleTransactionTest(HawkeyeTestCase):
     self.assertEquals(entity['counter'], 2)
 
 class CrossGroupTransactionTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'counters' ]
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     response = self.http_get('/datastore/transactions?' \
@@ -335,7 +471,11 @@ class CrossGroupTransactionTest(HawkeyeTestCase):
     self.assertEquals(entity['backup'], 2)
 
 class QueryCursorTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
+    self.skip_with_fixtures('datastore')
     project1 = self.assert_and_get_list('/datastore/project_cursor')
     project2 = self.assert_and_get_list('/datastore/project_cursor?' \
                                         'cursor={0}'.format(project1['next']))
@@ -352,6 +492,9 @@ class QueryCursorTest(HawkeyeTestCase):
     self.assertTrue(project4['next'] is None)
 
 class JDOIntegrationTest(HawkeyeTestCase):
+  produces = [ 'jdo_projects' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_put('/datastore/jdo_project',
       'name=Cassandra&rating=10')
@@ -382,6 +525,9 @@ class JDOIntegrationTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class JPAIntegrationTest(HawkeyeTestCase):
+  produces = [ 'jpa_projects' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_put('/datastore/jpa_project',
       'name=Tomcat&rating=10')
@@ -412,6 +558,9 @@ class JPAIntegrationTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class ComplexQueryCursorTest(HawkeyeTestCase):
+  produces = [ 'employees' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_get('/datastore/complex_cursor')
     self.assertEquals(response.status, 200)
@@ -438,6 +587,9 @@ def suite(lang):
 
   if lang == 'python':
     suite.addTest(GQLProjectionQueryTest())
+    suite.addTest(BatchedQueryTest())
+    suite.addTest(GQLQueryCacheTest())
+    suite.addTest(PagedQueryTest())
   elif lang == 'java':
     suite.addTest(JDOIntegrationTest())
     suite.addTest(JPAIntegrationTest())
@@ -1,5 +1,4 @@
 import json
-from time import sleep
 from hawkeye_utils import HawkeyeTestCase
 import hawkeye_utils
 
@@ -22,7 +21,8 @@ class ImageUploadTest(HawkeyeTestCase):
     self.assertTrue(project_info['success'])
     self.assertTrue(project_info['project_id'] is not None)
     PROJECTS['appscale'] = project_info['project_id']
-    sleep(5)
+    hawkeye_utils.wait_for(lambda: self.http_get('/images/logo?project_id=' +
+      PROJECTS['appscale']).status == 200, 5, 'images.logo')
 
 class ImageLoadTest(HawkeyeTestCase):
   def run_hawkeye_test(self):
@@ -1,11 +1,13 @@
 import json
-from time import sleep
 import uuid
 from hawkeye_utils import HawkeyeTestCase, HawkeyeTestSuite
 
 __author__ = 'hiranya'
 
 class MemcacheAddTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -32,6 +34,9 @@ class MemcacheAddTest(HawkeyeTestCase):
     self.assertEquals(entry_info['value'], value)
 
 class MemcacheSetTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -58,6 +63,9 @@ class MemcacheSetTest(HawkeyeTestCase):
     self.assertEquals(entry_info['value'], 'foo')
 
 class MemcacheKeyExpiryTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -72,11 +80,13 @@ class MemcacheKeyExpiryTest(HawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info['value'], value)
 
-    sleep(8)
-    response = self.http_get('/memcache?key={0}'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(lambda: self.http_get('/memcache?key={0}'.format(
+      key)).status == 404, 8, 'memcache.expiry')
 
 class MemcacheAsyncAddTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -103,6 +113,9 @@ class MemcacheAsyncAddTest(HawkeyeTestCase):
     self.assertEquals(entry_info['value'], value)
 
 class MemcacheAsyncSetTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -129,6 +142,9 @@ class MemcacheAsyncSetTest(HawkeyeTestCase):
     self.assertEquals(entry_info['value'], 'foo')
 
 class MemcacheAsyncKeyExpiryTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -143,11 +159,13 @@ class MemcacheAsyncKeyExpiryTest(HawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info['value'], value)
 
-    sleep(8)
-    response = self.http_get('/memcache?key={0}&async=true'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(lambda: self.http_get('/memcache?key={0}&async=true'.
+      format(key)).status == 404, 8, 'memcache.async_expiry')
 
 class MemcacheDeleteTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -171,6 +189,9 @@ class MemcacheDeleteTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class MemcacheAsyncDeleteTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -194,6 +215,9 @@ class MemcacheAsyncDeleteTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class MemcacheMultiAddTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -226,6 +250,9 @@ class MemcacheMultiAddTest(HawkeyeTestCase):
     self.assertEquals(entry_info[key2], value2)
 
 class MemcacheMultiSetTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -259,6 +286,9 @@ class MemcacheMultiSetTest(HawkeyeTestCase):
     self.assertEquals(entry_info[key2], 'bar')
 
 class MemcacheMultiDeleteTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -290,6 +320,9 @@ class MemcacheMultiDeleteTest(HawkeyeTestCase):
     self.assertEquals(len(entry_info), 0)
 
 class MemcacheMultiAsyncAddTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -322,6 +355,9 @@ class MemcacheMultiAsyncAddTest(HawkeyeTestCase):
     self.assertEquals(entry_info[key2], value2)
 
 class MemcacheMultiAsyncSetTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -355,6 +391,9 @@ class MemcacheMultiAsyncSetTest(HawkeyeTestCase):
     self.assertEquals(entry_info[key2], 'bar')
 
 class MemcacheMultiAsyncDeleteTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key1 = str(uuid.uuid1())
     key2 = str(uuid.uuid1())
@@ -386,6 +425,9 @@ class MemcacheMultiAsyncDeleteTest(HawkeyeTestCase):
     self.assertEquals(len(entry_info), 0)
 
 class SimpleJCacheTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -412,6 +454,9 @@ class SimpleJCacheTest(HawkeyeTestCase):
     self.assertEquals(response.status, 404)
 
 class JCacheExpiryTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -426,11 +471,13 @@ class JCacheExpiryTest(HawkeyeTestCase):
     entry_info = json.loads(response.payload)
     self.assertEquals(entry_info[key], value)
 
-    sleep(8)
-    response = self.http_get('/memcache/jcache?key={0}&cache=expiring'.format(key))
-    self.assertEquals(response.status, 404)
+    self.wait_until(lambda: self.http_get('/memcache/jcache?key={0}&'
+      'cache=expiring'.format(key)).status == 404, 8, 'memcache.jcache_expiry')
 
 class JCacheAddPolicyTest(HawkeyeTestCase):
+  produces = []
+  consumes = []
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     value = str(uuid.uuid1())
@@ -1,6 +1,7 @@
 from hawkeye_utils import HawkeyeTestCase, HawkeyeConstants, HawkeyeTestSuite
+from hawkeye_utils import count_fixture_projects, wait_for
+import hawkeye_utils
 import json
-from time import sleep
 import uuid
 
 __author__ = 'hiranya'
@@ -9,15 +10,27 @@ NDB_ALL_PROJECTS = {}
 NDB_SYNAPSE_MODULES = {}
 
 class NDBCleanupTest(HawkeyeTestCase):
+  produces = [ 'projects', 'modules', 'counters' ]
+  consumes = []
+
   def run_hawkeye_test(self):
-    response = self.http_delete('/ndb/project')
-    self.assertEquals(response.status, 200)
-    response = self.http_delete('/ndb/module')
-    self.assertEquals(response.status, 200)
-    response = self.http_delete('/ndb/transactions')
-    self.assertEquals(response.status, 200)
+    if hawkeye_utils.FIXTURES.has_key('ndb'):
+      # Leave the fixture dataset in place
+      for name in (HawkeyeConstants.PROJECT_SYNAPSE,
+                   HawkeyeConstants.PROJECT_XERCES,
+                   HawkeyeConstants.PROJECT_HADOOP):
+        self.assert_delete_all('/ndb/project?name_prefix=' + name)
+      for name in (HawkeyeConstants.MOD_CORE, HawkeyeConstants.MOD_NHTTP):
+        self.assert_delete_all('/ndb/module?name_prefix=' + name)
+    else:
+      self.assert_delete_all('/ndb/project')
+      self.assert_delete_all('/ndb/module')
+    self.assert_delete_all('/ndb/transactions')
 
 class SimpleKindAwareNDBInsertTest(HawkeyeTestCase):
+  produces = [ 'projects' ]
+  consumes = []
+
   def run_hawkeye_test(self):
     response = self.http_post('/ndb/project',
       'name={0}&description=Mediation Engine&rating=8&license=L1'.format(
@@ -50,9 +63,22 @@ class SimpleKindAwareNDBInsertTest(HawkeyeTestCase):
     NDB_ALL_PROJECTS[HawkeyeConstants.PROJECT_HADOOP] = project_id
 
     # Allow some time to eventual consistency to run its course
-    sleep(2)
+    wait_for(self.projects_visible, 2, 'ndb.projects')
+
+  def projects_visible(self):
+    response = self.http_get('/ndb/project')
+    if response.status != 200:
+      return False
+    visible = [ entity['project_id'] for entity in json.loads(response.payload) ]
+    for project_id in NDB_ALL_PROJECTS.values():
+      if project_id not in visible:
+        return False
+    return True
 
 class KindAwareNDBInsertWithParentTest(HawkeyeTestCase):
+  produces = [ 'modules' ]
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     response = self.http_post('/ndb/module',
       'name={0}&description=Mediation Core&project_id={1}'.format(
@@ -77,7 +103,11 @@ class KindAwareNDBInsertWithParentTest(HawkeyeTestCase):
     NDB_SYNAPSE_MODULES[HawkeyeConstants.MOD_NHTTP] = module_id
 
 class SimpleKindAwareNDBQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
+    self.skip_with_fixtures('ndb')
     project_list = self.assert_and_get_list('/ndb/project')
     for entry in project_list:
       response = self.http_get('/ndb/project?id={0}'.
@@ -97,6 +127,9 @@ class SimpleKindAwareNDBQueryTest(HawkeyeTestCase):
       self.assertEquals(project_info['name'], entry['name'])
 
 class NDBAncestorQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_modules?' \
       'project_id={0}'.format(NDB_ALL_PROJECTS[HawkeyeConstants.PROJECT_SYNAPSE]))
@@ -110,56 +143,73 @@ class NDBAncestorQueryTest(HawkeyeTestCase):
     self.assertTrue(modules.index(HawkeyeConstants.MOD_NHTTP) != -1)
 
 class NDBSinglePropertyBasedQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=10&'
                                            'comparator=eq')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 10, 'eq'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=6&'
                                            'comparator=gt')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 6, 'gt'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_XERCES)
 
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=6&'
                                            'comparator=ge')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('ndb', 6, 'ge'))
 
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=8&'
                                            'comparator=lt')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_XERCES)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 8, 'lt'))
+    self.assertTrue(HawkeyeConstants.PROJECT_XERCES in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=8&'
                                            'comparator=le')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 8, 'le'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=8&'
                                            'comparator=ne')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 8, 'ne'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_SYNAPSE)
 
-    try:
-      self.assert_and_get_list('/ndb/project_ratings?rating=5&comparator=le')
-      self.fail('Returned an unexpected result')
-    except AssertionError:
-      pass
+    response = self.http_get('/ndb/project_ratings?rating=5&comparator=le')
+    self.assertEquals(response.status, 200)
+    self.assertEquals(len(json.loads(response.payload)),
+      count_fixture_projects('ndb', 5, 'le'))
 
 class NDBOrderedResultQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=6&'
                                            'comparator=ge&desc=true')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('ndb', 6, 'ge'))
     last_rating = 100
     for entity in entity_list:
       self.assertTrue(entity['rating'], last_rating)
       last_rating = entity['rating']
 
 class NDBLimitedResultQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_ratings?rating=6&'
                                            'comparator=ge&limit=2')
@@ -174,10 +224,14 @@ class NDBLimitedResultQueryTest(HawkeyeTestCase):
       last_rating = entity['rating']
 
 class NDBProjectionQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_fields?'
                                            'fields=name,description')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('ndb'))
     for entity in entity_list:
       self.assertTrue(entity['rating'] is None)
       self.assertTrue(entity['description'] is not None)
@@ -185,7 +239,8 @@ class NDBProjectionQueryTest(HawkeyeTestCase):
 
     entity_list = self.assert_and_get_list('/ndb/project_fields?'
                                            'fields=name,rating&rate_limit=8')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 8, 'ge'))
     for entity in entity_list:
       self.assertTrue(entity['rating'] is not None)
       self.assertTrue(entity['description'] is None)
@@ -193,67 +248,94 @@ class NDBProjectionQueryTest(HawkeyeTestCase):
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_XERCES)
 
 class NDBCompositeQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L1&rate_limit=5')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 5, 'ge', 'L1'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L1&rate_limit=8')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_SYNAPSE)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 8, 'ge', 'L1'))
+    self.assertTrue(HawkeyeConstants.PROJECT_SYNAPSE in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L2&rate_limit=5')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 5, 'ge', 'L2'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
 class NDBGQLTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L1&rate_limit=5&gql=true')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', 5, 'ge', 'L1'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L1&rate_limit=8&gql=true')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_SYNAPSE)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 8, 'ge', 'L1'))
+    self.assertTrue(HawkeyeConstants.PROJECT_SYNAPSE in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/ndb/project_filter?'
                                            'license=L2&rate_limit=5&gql=true')
-    self.assertEquals(len(entity_list), 1)
-    self.assertEquals(entity_list[0]['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', 5, 'ge', 'L2'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
 class NDBInQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
     entity_list = self.assert_and_get_list('/ndb/project_license_filter?'
                                            'licenses=L1')
-    self.assertEquals(len(entity_list), 2)
+    self.assertEquals(len(entity_list),
+      2 + count_fixture_projects('ndb', license='L1'))
     for entity in entity_list:
       self.assertNotEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
 
     entity_list = self.assert_and_get_list('/ndb/project_license_filter?'
                                            'licenses=L2')
-    self.assertEquals(len(entity_list), 1)
-    for entity in entity_list:
-      self.assertEquals(entity['name'], HawkeyeConstants.PROJECT_HADOOP)
+    self.assertEquals(len(entity_list),
+      1 + count_fixture_projects('ndb', license='L2'))
+    self.assertTrue(HawkeyeConstants.PROJECT_HADOOP in
+                    [ entity['name'] for entity in entity_list ])
 
     entity_list = self.assert_and_get_list('/ndb/project_license_filter?'
                                            'licenses=L1,L2')
-    self.assertEquals(len(entity_list), 3)
+    self.assertEquals(len(entity_list),
+      3 + count_fixture_projects('ndb', license='L1') +
+      count_fixture_projects('ndb', license='L2'))
 
-    try:
-      self.assert_and_get_list('/ndb/project_license_filter?licenses=L3,L4')
-      self.fail('Unexpected response')
-    except AssertionError:
-      pass
+    response = self.http_get('/ndb/project_license_filter?licenses=L3,L4')
+    self.assertEquals(response.status, 200)
+    self.assertEquals(len(json.loads(response.payload)),
+      count_fixture_projects('ndb', license='L3') +
+      count_fixture_projects('ndb', license='L4'))
 
 class NDBCursorTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects' ]
+
   def run_hawkeye_test(self):
+    self.skip_with_fixtures('ndb')
     project1 = self.assert_and_get_list('/ndb/project_cursor')
     project2 = self.assert_and_get_list('/ndb/project_cursor?cursor={0}'.
       format(project1['next']))
@@ -269,7 +351,27 @@ class NDBCursorTest(HawkeyeTestCase):
     self.assertTrue(project4['project'] is None)
     self.assertTrue(project4['next'] is None)
 
+class NDBPagedQueryTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'projects', 'modules' ]
+
+  def run_hawkeye_test(self):
+    self.skip_with_fixtures('ndb')
+    for path, id_field in (('/ndb/project', 'project_id'),
+                           ('/ndb/module', 'module_id')):
+      expected = self.assert_and_get_list(path)
+      for page_size in (1, 2, 100):
+        entity_list, latencies, sizes = self.walk_pages(path, page_size)
+        self.assertEquals(sorted(e[id_field] for e in entity_list),
+          sorted(e[id_field] for e in expected))
+        # Every page but the last (short or empty) one is full
+        self.assertEquals(len(latencies), len(expected) // page_size + 1)
+        self.assertEquals(sizes[:-1], [ page_size ] * (len(sizes) - 1))
+
 class SimpleNDBTransactionTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'counters' ]
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     response = self.http_get('/ndb/transactions?' \
@@ -294,6 +396,9 @@ class SimpleNDBTransactionTest(HawkeyeTestCase):
     self.assertEquals(entity['counter'], 2)
 
 class NDBCrossGroupTransactionTest(HawkeyeTestCase):
+  produces = []
+  consumes = [ 'counters' ]
+
   def run_hawkeye_test(self):
     key = str(uuid.uuid1())
     response = self.http_get('/ndb/transactions?' \
@@ -337,6 +442,7 @@ def suite(lang):
   suite.addTest(NDBGQLTest())
   suite.addTest(NDBInQueryTest())
   suite.addTest(NDBCursorTest())
+  suite.addTest(NDBPagedQueryTest())
   suite.addTest(SimpleNDBTransactionTest())
   suite.addTest(NDBCrossGroupTransactionTest())
   return suite
\ No newline at end of file
@@ -1,7 +1,5 @@
 import json
-from time import sleep
 import uuid
-import datetime
 from hawkeye_utils import HawkeyeTestCase, HawkeyeTestSuite
 
 __author__ = 'hiranya'
@@ -40,28 +38,23 @@ class PushQueueTest(HawkeyeTestCase):
     obtain the counter value from GAE datastore API. The returned value
     will be asserted against the provided expected value. This method
     is blocking in that it blocks until a valid response is received from
-    the backend service. If a valid response is not received within 10
-    minutes, this method will force the parent test case to fail.
+    the backend service. If a valid response is not received within 30
+    seconds, this method will force the parent test case to fail.
 
     Args:
       key A datastore key string
       expected  Expected integer value
     """
 
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 30)
-    while True:
+    def counter_updated():
       response = self.http_get('/taskqueue/counter?key={0}'.format(key))
       self.assertTrue(response.status == 200 or response.status == 404)
       if response.status == 200:
         task_info = json.loads(response.payload)
-        if task_info[key] == expected:
-          break
+        return task_info[key] == expected
+      return False
 
-      if datetime.datetime.now() > end:
-        self.fail('Push queue deadline exceeded with no result')
-      else:
-        sleep(2)
+    self.wait_until(counter_updated, 30, 'taskqueue.push')
 
 class DeferredTaskTest(PushQueueTest):
   def run_hawkeye_test(self):
@@ -129,18 +122,13 @@ class PullQueueTest(HawkeyeTestCase):
     self.assertEquals(response.status, 200)
     self.assertTrue(task_info['status'])
 
-    start = datetime.datetime.now()
-    end = start + datetime.timedelta(0, 30)
-    while True:
+    def task_leased():
       response = self.http_get('/taskqueue/pull')
       self.assertEquals(response.status, 200)
       task_info = json.loads(response.payload)
-      if len(task_info['tasks']) == 1 and key in task_info['tasks']:
-        break
-      if datetime.datetime.now() > end:
-        self.fail('Pull queue deadline exceeded with no result')
-      else:
-        sleep(2)
+      return len(task_info['tasks']) == 1 and key in task_info['tasks']
+
+    self.wait_until(task_leased, 30, 'taskqueue.pull')
 
 def suite(lang):
   suite = HawkeyeTestSuite('Task Queue Test Suite', 'taskqueue')